@@ -3,7 +3,10 @@ from django.contrib import admin
 from comics.tasks import (refresh_issue_task, refresh_arc_task,
                           refresh_creator_task, refresh_issue_credits_task)
 
-from .models import Arc, Creator, Credits, Issue, Publisher, Series, Settings
+from .models import (Arc, Creator, Credits, ImportRun, Issue,
+                     Publisher, Series, Settings)
+from .utils.counters import update_counters, update_issue_counters
+from .utils.utils import issue_sort_number
 
 
 UNREAD = 0
@@ -82,6 +85,15 @@ class RolesAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(ImportRun)
+class ImportRunAdmin(admin.ModelAdmin):
+    list_display = ('directory', 'status', 'file_count', 'imported_count',
+                    'started', 'finished')
+    list_filter = ('status',)
+    readonly_fields = ('directory', 'task_id', 'file_count', 'imported_count',
+                       'started', 'heartbeat', 'finished')
+
+
 @admin.register(Issue)
 class IssueAdmin(admin.ModelAdmin):
     search_fields = ('series__name',)
@@ -108,15 +120,34 @@ class IssueAdmin(admin.ModelAdmin):
         )
         return queryset
 
+    def save_model(self, request, obj, form, change):
+        obj.sort_number = issue_sort_number(obj.number)
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Recount where the issue was moved from as well as where it is.
+        update_issue_counters(Issue.objects.filter(id=form.instance.id))
+        if change:
+            update_counters(
+                series_ids=[form.initial.get('series')],
+                arc_ids=[arc.pk for arc in form.initial.get('arcs', [])])
+
     def mark_as_read(self, request, queryset):
+        # The changelist may be filtered by status, so keep hold of the ids.
+        issue_ids = list(queryset.values_list('id', flat=True))
         rows_updated = queryset.update(status=READ)
+        update_issue_counters(Issue.objects.filter(id__in=issue_ids))
         message_bit = create_msg(rows_updated)
         self.message_user(
             request, f"{message_bit} successfully marked as read.")
     mark_as_read.short_description = 'Mark selected issues as read'
 
     def mark_as_unread(self, request, queryset):
+        # The changelist may be filtered by status, so keep hold of the ids.
+        issue_ids = list(queryset.values_list('id', flat=True))
         rows_updated = queryset.update(status=UNREAD)
+        update_issue_counters(Issue.objects.filter(id__in=issue_ids))
         message_bit = create_msg(rows_updated)
         self.message_user(
             request, f"{message_bit} successfully marked as unread.")
@@ -166,13 +197,6 @@ class PublisherAdmin(admin.ModelAdmin):
         }),
     )
 
-    def get_queryset(self, request):
-        queryset = (
-            Publisher.objects
-            .prefetch_related('series_set')
-        )
-        return queryset
-
 
 @admin.register(Series)
 class SeriesAdmin(admin.ModelAdmin):
@@ -192,7 +216,6 @@ class SeriesAdmin(admin.ModelAdmin):
         queryset = (
             Series.objects
             .select_related('publisher')
-            .prefetch_related('issue_set')
         )
         return queryset
 
@@ -202,6 +225,7 @@ class SeriesAdmin(admin.ModelAdmin):
             issues_updated = Issue.objects.filter(
                 series=queryset[i]).update(status=READ)
             issues_count += issues_updated
+        update_issue_counters(Issue.objects.filter(series__in=queryset))
         message_bit = create_msg(issues_count)
         self.message_user(
             request, f"{message_bit} successfully marked as read.")
@@ -213,6 +237,7 @@ class SeriesAdmin(admin.ModelAdmin):
             issues_updated = Issue.objects.filter(
                 series=queryset[i]).update(status=UNREAD)
             issues_count += issues_updated
+        update_issue_counters(Issue.objects.filter(series__in=queryset))
         message_bit = create_msg(issues_count)
         self.message_user(
             request, f"{message_bit} successfully marked as unread.")
@@ -1,13 +1,16 @@
 from django.apps import AppConfig
-from django.db.models.signals import pre_delete
-
-from comics.signals import (pre_delete_image, pre_delete_issue)
+from django.db.models.signals import post_delete, pre_delete
 
 
 class ComicsConfig(AppConfig):
     name = 'comics'
 
     def ready(self):
+        # The signal handlers use the models, so import them once loaded.
+        from comics.signals import (post_delete_issue, post_delete_series,
+                                    pre_delete_image, pre_delete_issue,
+                                    pre_delete_series)
+
         arc = self.get_model('Arc')
         pre_delete.connect(pre_delete_image, sender=arc,
                            dispatch_uid='pre_delete_arc')
@@ -23,3 +26,11 @@ class ComicsConfig(AppConfig):
         issue = self.get_model('Issue')
         pre_delete.connect(pre_delete_issue, sender=issue,
                            dispatch_uid='pre_delete_issue')
+        post_delete.connect(post_delete_issue, sender=issue,
+                            dispatch_uid='post_delete_issue')
+
+        series = self.get_model('Series')
+        pre_delete.connect(pre_delete_series, sender=series,
+                           dispatch_uid='pre_delete_series')
+        post_delete.connect(post_delete_series, sender=series,
+                            dispatch_uid='post_delete_series')
@@ -0,0 +1,209 @@
+"""
+Asynchronous page and cover serving for the ASGI entry point.
+
+Readers spend most of their time waiting on slow links, so page and cover
+requests authenticated with a JWT are served here without tying up a
+worker for the whole transfer. Blocking work (archive reads, the page
+cache and the database) runs on a bounded thread pool, and responses are
+streamed in chunks. Every other request is passed to the Django
+application.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import QueryDict
+from rest_framework import exceptions
+from rest_framework_jwt.authentication import JSONWebTokenAuthentication
+
+from comics.models import Issue
+from comics.serializers import CoverOptionsSerializer, PageOptionsSerializer
+from comics.utils.hotcache import get_hot_cache
+from comics.utils.imageheader import IMAGE_EXTENSIONS
+from comics.utils.prefetch import get_prefetcher
+from comics.utils.reader import (PAGE_CHUNK_SIZE, ImageAPIHandler,
+                                 negotiate_page_options)
+from comics.utils.sidecar import get_sidecar
+from comics.utils.utils import negotiate_cover_format, select_cover_rendition
+
+
+PAGE_RE = re.compile(r'^/api/issue/(?P<slug>[-\w]+)/page/(?P<page>[0-9]+)/$')
+COVER_RE = re.compile(r'^/api/issue/(?P<slug>[-\w]+)/cover/$')
+
+
+class HttpError(Exception):
+
+    def __init__(self, status, message=''):
+        self.status = status
+        self.message = message
+
+
+class PageServingApplication(object):
+    """
+    An ASGI application serving pages and covers asynchronously, and
+    passing everything else to the fallback application.
+    """
+
+    def __init__(self, fallback, max_workers=None):
+        self.fallback = fallback
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.ASGI_PAGE_WORKERS,
+            thread_name_prefix='pages')
+        self.routes = ((PAGE_RE, self.page), (COVER_RE, self.cover))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            headers = dict(scope['headers'])
+            # Session and basic auth are left to Django.
+            if headers.get(b'authorization', b'').startswith(b'JWT '):
+                for regex, view in self.routes:
+                    match = regex.match(scope['path'])
+                    if match:
+                        return await self.handle(view, scope, send, headers,
+                                                 **match.groupdict())
+
+        return await self.fallback(scope, receive, send)
+
+    async def run(self, func, *args, **kwargs):
+        """ Runs blocking work on the thread pool """
+        def call():
+            try:
+                return func(*args, **kwargs)
+            finally:
+                # Each pool thread has its own connection, so drop any that
+                # have gone bad or outlived CONN_MAX_AGE.
+                close_old_connections()
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, call)
+
+    async def handle(self, view, scope, send, headers, **kwargs):
+        query = QueryDict(scope.get('query_string', b'').decode('latin-1'))
+        try:
+            await self.run(self.authenticate, headers)
+            await view(scope, send, query, headers, **kwargs)
+        except HttpError as e:
+            await self.send_response(send, e.status, e.message.encode('utf-8'),
+                                     'text/plain; charset=utf-8', scope)
+
+    def authenticate(self, headers):
+        request = SimpleNamespace(
+            META={'HTTP_AUTHORIZATION': headers[b'authorization']})
+        try:
+            if JSONWebTokenAuthentication().authenticate(request) is None:
+                raise HttpError(401, 'Authentication credentials were not provided.')
+        except exceptions.AuthenticationFailed as e:
+            raise HttpError(401, str(e.detail))
+
+    @staticmethod
+    def get_issue(slug):
+        try:
+            return (Issue.objects.only('id', 'slug', 'file', 'page_count',
+                                       'image', 'cover_hash')
+                    .get(slug=slug))
+        except Issue.DoesNotExist:
+            raise HttpError(404, 'Not found.')
+
+    @staticmethod
+    def validate(serializer_class, query):
+        options = serializer_class(data=query)
+        if not options.is_valid():
+            raise HttpError(400, str(options.errors))
+        return options.validated_data
+
+    @staticmethod
+    def read_page(issue, page, page_options):
+        # Extract the issue for the pages to come, as the page view does.
+        get_hot_cache().open_issue(issue)
+        # Pages already converted by convertpages skip the page cache.
+        path = get_sidecar().get_page_path(issue, page, **page_options)
+        if path is None:
+            return ImageAPIHandler().getPage(issue, page, **page_options)
+        with open(path, 'rb') as f:
+            return f.read(), f'image/{page_options["image_format"]}'
+
+    async def page(self, scope, send, query, headers, slug, page):
+        options = self.validate(PageOptionsSerializer, query)
+        page_options = negotiate_page_options(
+            options, headers.get(b'accept', b'').decode('latin-1'))
+        issue = await self.run(self.get_issue, slug)
+        try:
+            image_data, content_type = await self.run(
+                self.read_page, issue, page, page_options)
+        except OSError:
+            image_data = None
+        if image_data is None:
+            raise HttpError(404, 'Not found.')
+
+        get_prefetcher().page_requested(issue, page, **page_options)
+        await self.send_response(send, 200, image_data, content_type, scope,
+                                 cache_control='private, max-age=86400')
+
+    async def cover(self, scope, send, query, headers, slug):
+        options = self.validate(CoverOptionsSerializer, query)
+        image_format = negotiate_cover_format(
+            options.get('image_format'),
+            headers.get(b'accept', b'').decode('latin-1'))
+        issue = await self.run(self.get_issue, slug)
+        path = select_cover_rendition(issue, options.get('width'),
+                                      image_format)
+        if not path:
+            raise HttpError(404, 'Not found.')
+        path = os.path.join(settings.MEDIA_ROOT, path)
+
+        try:
+            f = await self.run(open, path, 'rb')
+        except OSError:
+            raise HttpError(404, 'Not found.')
+
+        try:
+            size = os.fstat(f.fileno()).st_size
+            ext = os.path.splitext(path)[1]
+            content_type = 'image/' + IMAGE_EXTENSIONS.get(ext, 'jpeg')
+            await self.send_start(send, 200, content_type, size, scope,
+                                  cache_control='private, max-age=86400')
+            if scope['method'] == 'HEAD':
+                chunk = b''
+            else:
+                chunk = await self.run(f.read, PAGE_CHUNK_SIZE)
+            while chunk:
+                next_chunk = await self.run(f.read, PAGE_CHUNK_SIZE)
+                await send({'type': 'http.response.body', 'body': chunk,
+                            'more_body': bool(next_chunk)})
+                chunk = next_chunk
+            if scope['method'] == 'HEAD' or size == 0:
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            f.close()
+
+    async def send_start(self, send, status, content_type, length, scope,
+                         cache_control=None):
+        headers = [
+            (b'content-type', content_type.encode('latin-1')),
+            (b'content-length', str(length).encode('latin-1')),
+        ]
+        if cache_control:
+            headers.append((b'cache-control', cache_control.encode('latin-1')))
+            # Cached responses depend on the formats the client accepts.
+            headers.append((b'vary', b'Accept'))
+        # The CORS middleware doesn't see these responses.
+        if settings.CORS_ORIGIN_ALLOW_ALL:
+            headers.append((b'access-control-allow-origin', b'*'))
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': headers})
+
+    async def send_response(self, send, status, body, content_type, scope,
+                            cache_control=None):
+        await self.send_start(send, status, content_type, len(body), scope,
+                              cache_control)
+        if scope['method'] == 'HEAD':
+            body = b''
+        # Send large bodies in chunks so slow clients apply back-pressure.
+        for start in range(0, max(len(body), 1), PAGE_CHUNK_SIZE):
+            chunk = body[start:start + PAGE_CHUNK_SIZE]
+            await send({'type': 'http.response.body', 'body': chunk,
+                        'more_body': start + PAGE_CHUNK_SIZE < len(body)})
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from comics.models import Issue
+from comics.utils.sidecar import convert_library, get_sidecar
+
+
+class Command(BaseCommand):
+    help = ('Converts the pages of every issue to web optimized copies, '
+            'which page requests are then served from.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-w', '--workers', type=int,
+            help='Number of worker processes, SIDECAR_WORKERS by default.')
+        parser.add_argument(
+            '-d', '--delay', type=float,
+            help='Seconds each worker pauses after each page, '
+                 'SIDECAR_PAGE_DELAY by default.')
+        parser.add_argument(
+            '-f', '--force', action='store_true',
+            help='Convert issues again even if they already are.')
+        parser.add_argument(
+            'issues', nargs='*', metavar='slug',
+            help='Only convert these issues.')
+
+    def handle(self, *args, **options):
+        issues = Issue.objects.only('id', 'file').order_by('id')
+        if options['issues']:
+            issues = issues.filter(slug__in=options['issues'])
+        else:
+            # Drop the copies of issues no longer in the library.
+            get_sidecar().prune(Issue.objects.values_list('id', flat=True))
+
+        converted = convert_library(issues.iterator(),
+                                    workers=options['workers'],
+                                    delay=options['delay'],
+                                    force=options['force'])
+        self.stdout.write(f'Converted the pages of {converted} issues.')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from comics.utils.hotqueries import HOT_QUERIES, explain_query
+
+
+class Command(BaseCommand):
+    help = ('Runs EXPLAIN ANALYZE on each of the hot queries the database '
+            'indexes are matched to, so plan regressions are visible.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-analyze', action='store_false', dest='analyze',
+            help="Only show the plans, without running the queries.")
+        parser.add_argument(
+            'queries', nargs='*', metavar='name',
+            help='Only explain these queries, out of: '
+                 f'{", ".join(HOT_QUERIES)}.')
+
+    def handle(self, *args, **options):
+        names = options['queries'] or list(HOT_QUERIES)
+        unknown = [name for name in names if name not in HOT_QUERIES]
+        if unknown:
+            raise CommandError(f'Unknown queries: {", ".join(unknown)}')
+
+        for name in names:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name}:'))
+            self.stdout.write(explain_query(name, options['analyze']))
+            self.stdout.write('')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from comics.utils.counters import recount_all
+
+
+class Command(BaseCommand):
+    help = ('Recounts the stored issue, read and series counts of every '
+            'series, story arc and publisher.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount_all()
+        self.stdout.write('Recounted every series, story arc and publisher.')
@@ -0,0 +1,60 @@
+# Generated by Django 2.2.28 on 2026-10-18 22:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comics', '0005_auto_20190515_1804'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportBatch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('files', models.TextField(blank=True)),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Done'), (2, 'Failed')], default=0, verbose_name='Status')),
+                ('imported_count', models.PositiveIntegerField(default=0)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Import Batches',
+                'ordering': ['run', 'number'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('directory', models.CharField(max_length=350, verbose_name='Comics Directory')),
+                ('task_id', models.CharField(blank=True, max_length=50, verbose_name='Task ID')),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'Running'), (1, 'Finished')], default=0, verbose_name='Status')),
+                ('file_count', models.PositiveIntegerField(default=0)),
+                ('imported_count', models.PositiveIntegerField(default=0)),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('heartbeat', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='importrun',
+            constraint=models.UniqueConstraint(condition=models.Q(status=0), fields=('directory',), name='unique_running_import'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='comics.ImportRun'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='importbatch',
+            unique_together={('run', 'number')},
+        ),
+    ]
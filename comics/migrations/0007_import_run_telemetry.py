@@ -0,0 +1,48 @@
+# Generated by Django 2.2.28 on 2026-10-18 22:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comics', '0006_import_runs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='comicvine_time',
+            field=models.FloatField(default=0, verbose_name='ComicVine Time'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='db_time',
+            field=models.FloatField(default=0, verbose_name='DB Time'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='image_time',
+            field=models.FloatField(default=0, verbose_name='Image Time'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='probe_time',
+            field=models.FloatField(default=0, verbose_name='Probe Time'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='processed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importrun',
+            name='walk_time',
+            field=models.FloatField(default=0, verbose_name='Walk Time'),
+        ),
+        migrations.AlterField(
+            model_name='importbatch',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (3, 'Running'), (1, 'Done'), (2, 'Failed')], default=0, verbose_name='Status'),
+        ),
+    ]
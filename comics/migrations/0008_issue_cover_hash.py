@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comics', '0007_import_run_telemetry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='cover_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40, verbose_name='Cover Hash'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 22:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comics', '0008_issue_cover_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='page_dimensions',
+            field=models.BinaryField(blank=True, default=b'', verbose_name='Page Dimensions'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-18 22:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comics', '0009_issue_page_dimensions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='arc',
+            name='image_blurhash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Image BlurHash'),
+        ),
+        migrations.AddField(
+            model_name='arc',
+            name='image_colors',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Image Colors'),
+        ),
+        migrations.AddField(
+            model_name='issue',
+            name='cover_blurhash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Cover BlurHash'),
+        ),
+        migrations.AddField(
+            model_name='issue',
+            name='cover_colors',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Cover Colors'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 2.2.28 on 2026-10-18 23:09
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count(queryset):
+    return Coalesce(Subquery(queryset.annotate(n=Count('pk')).values('n'),
+                             output_field=IntegerField()), Value(0))
+
+
+def issue_counters(issues):
+    return {
+        'issue_count': count(issues),
+        'read_count': count(issues.filter(status=2)),
+        'latest_issue_date': Subquery(issues.annotate(
+            latest=Max('date')).values('latest')),
+    }
+
+
+def count_issues(apps, schema_editor):
+    # The same counts as utils.counters.recount_all, with the models as of
+    # this migration.
+    Arc = apps.get_model('comics', 'Arc')
+    Issue = apps.get_model('comics', 'Issue')
+    Publisher = apps.get_model('comics', 'Publisher')
+    Series = apps.get_model('comics', 'Series')
+
+    Series.objects.update(**issue_counters(
+        Issue.objects.filter(series=OuterRef('pk'))
+        .order_by().values('series')))
+    Arc.objects.update(**issue_counters(
+        Issue.objects.filter(arcs=OuterRef('pk'))
+        .order_by().values('arcs')))
+    Publisher.objects.update(
+        series_count=count(Series.objects.filter(publisher=OuterRef('pk'))
+                           .order_by().values('publisher')),
+        **issue_counters(Issue.objects.filter(series__publisher=OuterRef('pk'))
+                         .order_by().values('series__publisher')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comics', '0010_cover_placeholders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='arc',
+            name='issue_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Issue Count'),
+        ),
+        migrations.AddField(
+            model_name='arc',
+            name='latest_issue_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Latest Issue Date'),
+        ),
+        migrations.AddField(
+            model_name='arc',
+            name='read_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Read Count'),
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='issue_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Issue Count'),
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='latest_issue_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Latest Issue Date'),
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='read_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Read Count'),
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='series_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Series Count'),
+        ),
+        migrations.AddField(
+            model_name='series',
+            name='issue_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Issue Count'),
+        ),
+        migrations.AddField(
+            model_name='series',
+            name='latest_issue_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Latest Issue Date'),
+        ),
+        migrations.AddField(
+            model_name='series',
+            name='read_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Read Count'),
+        ),
+        migrations.RunPython(count_issues, migrations.RunPython.noop),
+    ]
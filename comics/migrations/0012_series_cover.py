@@ -0,0 +1,39 @@
+# Generated by Django 2.2.28 on 2026-10-18 23:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def pick_covers(apps, schema_editor):
+    # The same rule as utils.counters, with the models as of this migration.
+    Issue = apps.get_model('comics', 'Issue')
+    Series = apps.get_model('comics', 'Series')
+
+    covers = (Issue.objects.filter(series=OuterRef('pk'))
+              .order_by('date', 'number', 'id'))
+    Series.objects.update(
+        cover=Subquery(covers.values('id')[:1]),
+        cover_image=Coalesce(Subquery(covers.values('image')[:1]), Value('')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comics', '0011_stored_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='series',
+            name='cover',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='comics.Issue'),
+        ),
+        migrations.AddField(
+            model_name='series',
+            name='cover_image',
+            field=models.ImageField(blank=True, editable=False, max_length=150, upload_to='', verbose_name='Cover Image'),
+        ),
+        migrations.RunPython(pick_covers, migrations.RunPython.noop),
+    ]
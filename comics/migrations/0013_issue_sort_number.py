@@ -0,0 +1,43 @@
+# Generated by Django 2.2.28 on 2026-10-18 23:16
+
+from django.db import migrations, models
+
+from comics.utils.utils import issue_sort_number
+
+
+# Kept well under SQLite's limit on query parameters.
+BATCH_SIZE = 500
+
+
+def set_sort_numbers(apps, schema_editor):
+    # Issue numbers repeat across series, so work out each distinct number
+    # once and set every issue sharing a sort key in one UPDATE.
+    Issue = apps.get_model('comics', 'Issue')
+    numbers = {}
+    for number in Issue.objects.order_by().values_list('number', flat=True).distinct():
+        numbers.setdefault(issue_sort_number(number), []).append(number)
+
+    for sort_number, group in numbers.items():
+        for i in range(0, len(group), BATCH_SIZE):
+            (Issue.objects.filter(number__in=group[i:i + BATCH_SIZE])
+             .update(sort_number=sort_number))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comics', '0012_series_cover'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='sort_number',
+            field=models.FloatField(default=0, editable=False, verbose_name='Sort Number'),
+        ),
+        migrations.RunPython(set_sort_numbers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['series', 'sort_number'], name='issue_series_sort_number_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 2.2.28 on 2026-10-18 23:18
+
+from django.db import migrations, models
+
+
+# Name searches use icontains, which is UPPER(name) LIKE '%...%' on
+# PostgreSQL, so only a trigram index on UPPER(name) can serve them. Django
+# can't declare expression indexes yet, so they're made here, and only on
+# PostgreSQL.
+TRIGRAM_INDEXES = (
+    ('series_name_trgm_idx', 'comics_series'),
+    ('arc_name_trgm_idx', 'comics_arc'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'USING gin (UPPER(name) gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comics', '0013_issue_sort_number'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='arc',
+            index=models.Index(fields=['name'], name='arc_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['series', 'date', 'sort_number'], name='issue_series_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(condition=models.Q(status=2), fields=['series'], name='issue_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['file'], name='issue_file_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['-import_date'], name='issue_import_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='series',
+            index=models.Index(fields=['sort_title', 'year'], name='series_sort_title_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 23:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comics', '0014_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='queued',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 23:37
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comics', '0015_importbatch_queued'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='issue',
+            options={'ordering': ['series_id', 'date', 'sort_number']},
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comics', '0016_issue_ordering'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='issue',
+            options={'ordering': ['series__name', 'date', 'number']},
+        ),
+        migrations.AddIndex(
+            model_name='series',
+            index=models.Index(fields=['name'], name='series_name_idx'),
+        ),
+    ]
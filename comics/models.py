@@ -3,6 +3,7 @@ import datetime
 from django.core.validators import RegexValidator
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.functional import cached_property
 from solo.models import SingletonModel
 
@@ -39,6 +40,11 @@ class Settings(SingletonModel):
 
 
 class Arc(models.Model):
+    # Comic Vine doesn't give the reading order of an arc, so its issues
+    # are read by date and then series title.
+    ISSUE_ORDERING = ('date', 'series__sort_title', 'series__year',
+                      'series_id', 'number')
+
     cvid = models.PositiveIntegerField('Comic Vine ID', blank=True,null=True,unique=True)
     cvurl = models.URLField('Comic Vine URL', max_length=200)
     name = models.CharField('Arc Name', max_length=200)
@@ -46,6 +52,19 @@ class Arc(models.Model):
     desc = models.TextField('Description', max_length=500, blank=True)
     image = models.ImageField(upload_to='images/arcs/%Y/%m/%d/',
                               max_length=150, blank=True)
+    # Placeholder for the image, made by utils.placeholder.
+    image_blurhash = models.CharField('Image BlurHash', max_length=64,
+                                      blank=True, editable=False)
+    image_colors = models.CharField('Image Colors', max_length=64,
+                                    blank=True, editable=False)
+
+    # Kept up to date by utils.counters.
+    issue_count = models.PositiveIntegerField(
+        'Issue Count', default=0, editable=False)
+    read_count = models.PositiveIntegerField(
+        'Read Count', default=0, editable=False)
+    latest_issue_date = models.DateField(
+        'Latest Issue Date', null=True, blank=True, editable=False)
 
     def get_absolute_url(self):
         return reverse('api:arc-detail', args=[self.slug])
@@ -53,26 +72,19 @@ class Arc(models.Model):
     def __str__(self):
         return self.name
 
-    @property
-    def issue_count(self):
-        return self.issue_set.all().count()
-
-    @cached_property
-    def read_issue_count(self):
-        if hasattr(self, '_prefetched_objects_cache'):
-            return len([x for x in self.issue_set.all() if x.status is 2])
-        return self.issue_set.filter(status=2).count()
-
     @property
     def percent_read(self):
         try:
-            percent = round((self.read_issue_count / self.issue_count) * 100)
+            percent = round((self.read_count / self.issue_count) * 100)
         except ZeroDivisionError:
             percent = 0
         return percent
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name'], name='arc_name_idx'),
+        ]
 
 
 class Creator(models.Model):
@@ -99,13 +111,19 @@ class Publisher(models.Model):
     desc = models.TextField('Description', max_length=500, blank=True)
     image = models.ImageField(upload_to='images/publishers/%Y/%m/%d/',
                               max_length=150, blank=True)
+    # Kept up to date by utils.counters.
+    series_count = models.PositiveIntegerField(
+        'Series Count', default=0, editable=False)
+    issue_count = models.PositiveIntegerField(
+        'Issue Count', default=0, editable=False)
+    read_count = models.PositiveIntegerField(
+        'Read Count', default=0, editable=False)
+    latest_issue_date = models.DateField(
+        'Latest Issue Date', null=True, blank=True, editable=False)
 
     def get_absolute_url(self):
         return reverse('api:publisher-detail', args=[self.slug])
 
-    def series_count(self):
-        return self.series_set.all().count()
-
     def __str__(self):
         return self.name
 
@@ -127,6 +145,20 @@ class Series(models.Model):
     year = models.PositiveSmallIntegerField(
         'year', choices=YEAR_CHOICES, default=datetime.datetime.now().year, blank=True)
     desc = models.TextField('Description', max_length=500, blank=True)
+    # Kept up to date by utils.counters.
+    issue_count = models.PositiveIntegerField(
+        'Issue Count', default=0, editable=False)
+    read_count = models.PositiveIntegerField(
+        'Read Count', default=0, editable=False)
+    latest_issue_date = models.DateField(
+        'Latest Issue Date', null=True, blank=True, editable=False)
+    # The earliest issue, whose cover stands for the series, and its image.
+    # Also kept up to date by utils.counters.
+    cover = models.ForeignKey(
+        'Issue', on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False, related_name='+')
+    cover_image = models.ImageField('Cover Image', max_length=150, blank=True,
+                                    editable=False)
 
     def get_absolute_url(self):
         return reverse('api:series-detail', args=[self.slug])
@@ -134,20 +166,10 @@ class Series(models.Model):
     def __str__(self):
         return self.name
 
-    @property
-    def issue_count(self):
-        return self.issue_set.all().count()
-
-    @cached_property
-    def read_issue_count(self):
-        if hasattr(self, '_prefetched_objects_cache') and 'issue_set' in self._prefetched_objects_cache:
-            return len([x for x in self.issue_set.all() if x.status is 2])
-        return self.issue_set.filter(status=2).count()
-
     @property
     def percent_read(self):
         try:
-            percent = round((self.read_issue_count / self.issue_count) * 100)
+            percent = round((self.read_count / self.issue_count) * 100)
         except ZeroDivisionError:
             percent = 0
         return percent
@@ -155,6 +177,11 @@ class Series(models.Model):
     class Meta:
         verbose_name_plural = "Series"
         ordering = ['sort_title', 'year']
+        indexes = [
+            models.Index(fields=['sort_title', 'year'],
+                         name='series_sort_title_idx'),
+            models.Index(fields=['name'], name='series_name_idx'),
+        ]
 
 
 class Issue(models.Model):
@@ -170,6 +197,8 @@ class Issue(models.Model):
     name = models.CharField('Issue Name', max_length=350, blank=True)
     slug = models.SlugField(max_length=350, unique=True)
     number = models.CharField('Issue Number', max_length=25)
+    # Numeric value of number, from utils.issue_sort_number.
+    sort_number = models.FloatField('Sort Number', default=0, editable=False)
     date = models.DateField('Cover Date', blank=True)
     desc = models.TextField('Description', max_length=500, blank=True)
     arcs = models.ManyToManyField(Arc, blank=True)
@@ -177,12 +206,22 @@ class Issue(models.Model):
     file = models.CharField('File Path', max_length=300)
     image = models.ImageField('Cover Image', upload_to='images/issues/%Y/%m/%d/',
                               max_length=150, blank=True)
+    cover_hash = models.CharField('Cover Hash', max_length=40, blank=True,
+                                  editable=False)
+    # Placeholder for the cover, made by utils.placeholder.
+    cover_blurhash = models.CharField('Cover BlurHash', max_length=64,
+                                      blank=True, editable=False)
+    cover_colors = models.CharField('Cover Colors', max_length=64,
+                                    blank=True, editable=False)
     status = models.PositiveSmallIntegerField(
         'Status', choices=STATUS_CHOICES, default=0, blank=True)
     leaf = models.PositiveSmallIntegerField(
         editable=False, default=0, blank=True)
     page_count = models.PositiveSmallIntegerField(
         editable=False, default=1, blank=True)
+    # Width and height of each page, packed by utils.imageheader.
+    page_dimensions = models.BinaryField(
+        'Page Dimensions', editable=False, default=b'', blank=True)
     mod_ts = models.DateTimeField()
     import_date = models.DateTimeField('Date Imported',
                                        auto_now_add=True)
@@ -212,7 +251,21 @@ class Issue(models.Model):
         return self.series.name + ' #' + str(self.number)
 
     class Meta:
+        # Lets the issue list walk series_name_idx, then each series'
+        # issues through issue_series_date_idx, rather than sort the table.
         ordering = ['series__name', 'date', 'number']
+        # Matched to the queries in utils.hotqueries, which the
+        # explainqueries command runs EXPLAIN ANALYZE on.
+        indexes = [
+            models.Index(fields=['series', 'sort_number'],
+                         name='issue_series_sort_number_idx'),
+            models.Index(fields=['series', 'date', 'sort_number'],
+                         name='issue_series_date_idx'),
+            models.Index(fields=['series'], condition=models.Q(status=2),
+                         name='issue_read_idx'),
+            models.Index(fields=['file'], name='issue_file_idx'),
+            models.Index(fields=['-import_date'], name='issue_import_date_idx'),
+        ]
 
 
 class Role(models.Model):
@@ -234,3 +287,114 @@ class Credits(models.Model):
         verbose_name_plural = "Credits"
         unique_together = ['creator', 'issue']
         ordering = ['creator__name']
+
+
+class ImportRun(models.Model):
+    RUNNING = 0
+    FINISHED = 1
+    STATUS_CHOICES = (
+        (RUNNING, 'Running'),
+        (FINISHED, 'Finished'),
+    )
+
+    directory = models.CharField('Comics Directory', max_length=350)
+    task_id = models.CharField('Task ID', max_length=50, blank=True)
+    status = models.PositiveSmallIntegerField(
+        'Status', choices=STATUS_CHOICES, default=RUNNING)
+    file_count = models.PositiveIntegerField(default=0)
+    imported_count = models.PositiveIntegerField(default=0)
+    started = models.DateTimeField(auto_now_add=True)
+    # Touched as files are imported, so a run whose worker died can be
+    # told apart from one that is still going.
+    heartbeat = models.DateTimeField(default=timezone.now)
+    finished = models.DateTimeField(null=True, blank=True)
+    walk_time = models.FloatField('Walk Time', default=0)
+
+    def touch(self):
+        ImportRun.objects.filter(id=self.id).update(heartbeat=timezone.now())
+
+    @cached_property
+    def batch_totals(self):
+        """ Sums the counters and phase timings of the run's batches. """
+        return self.importbatch_set.aggregate(
+            processed=models.Sum('processed_count'),
+            imported=models.Sum('imported_count'),
+            probe_time=models.Sum('probe_time'),
+            comicvine_time=models.Sum('comicvine_time'),
+            image_time=models.Sum('image_time'),
+            db_time=models.Sum('db_time'),
+            pending=models.Count(
+                'id', filter=models.Q(status=ImportBatch.PENDING)),
+            running=models.Count(
+                'id', filter=models.Q(status=ImportBatch.RUNNING)),
+            done=models.Count('id', filter=models.Q(status=ImportBatch.DONE)),
+            failed=models.Count(
+                'id', filter=models.Q(status=ImportBatch.FAILED)),
+        )
+
+    @property
+    def elapsed(self):
+        end = self.finished or timezone.now()
+        return (end - self.started).total_seconds()
+
+    @property
+    def files_per_sec(self):
+        try:
+            rate = (self.batch_totals['processed'] or 0) / self.elapsed
+        except ZeroDivisionError:
+            rate = 0
+        return round(rate, 2)
+
+    def __str__(self):
+        return f'{self.directory} ({self.started})'
+
+    class Meta:
+        ordering = ['-started']
+        constraints = [
+            models.UniqueConstraint(fields=['directory'],
+                                    condition=models.Q(status=0),
+                                    name='unique_running_import'),
+        ]
+
+
+class ImportBatch(models.Model):
+    PENDING = 0
+    DONE = 1
+    FAILED = 2
+    RUNNING = 3
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    run = models.ForeignKey(ImportRun, on_delete=models.CASCADE)
+    number = models.PositiveIntegerField()
+    files = models.TextField(blank=True)
+    status = models.PositiveSmallIntegerField(
+        'Status', choices=STATUS_CHOICES, default=PENDING)
+    imported_count = models.PositiveIntegerField(default=0)
+    processed_count = models.PositiveIntegerField(default=0)
+    # Set when the batch's task is sent, as the broker keeps it from then.
+    queued = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # Seconds spent in each phase of the import.
+    probe_time = models.FloatField('Probe Time', default=0)
+    comicvine_time = models.FloatField('ComicVine Time', default=0)
+    image_time = models.FloatField('Image Time', default=0)
+    db_time = models.FloatField('DB Time', default=0)
+
+    @property
+    def filelist(self):
+        if not self.files:
+            return []
+        return self.files.split('\n')
+
+    def __str__(self):
+        return f'{self.run} - batch {self.number}'
+
+    class Meta:
+        verbose_name_plural = "Import Batches"
+        ordering = ['run', 'number']
+        unique_together = ['run', 'number']
@@ -1,19 +1,54 @@
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
 
-from comics.models import (Arc, Credits, Issue, Publisher, Role, Series)
-from comics.utils.reader import ImageAPIHandler
+from comics.models import (Arc, Credits, ImportRun, Issue, Publisher, Role,
+                           Series)
+from comics.utils.reader import (ImageAPIHandler, get_page_formats,
+                                 get_page_manifest)
+from comics.utils.utils import cover_rendition_path, get_cover_formats
+
+
+def get_cover_srcset(cover_hash, request):
+    """ Returns a srcset string of the cover renditions for each format. """
+    if not cover_hash:
+        return None
+
+    srcset = {}
+    for ext in get_cover_formats():
+        urls = []
+        for width in settings.COVER_RENDITION_WIDTHS:
+            url = settings.MEDIA_URL + cover_rendition_path(cover_hash, width, ext)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls.append(f'{url} {width}w')
+        srcset[ext] = ', '.join(urls)
+    return srcset
+
+
+def get_placeholder(blurhash, colors):
+    """ Returns an image's BlurHash and dominant colors, if it has them. """
+    if not blurhash:
+        return None
+    return {'blurhash': blurhash,
+            'colors': colors.split(',') if colors else []}
 
 
 class ArcSerializer(serializers.ModelSerializer):
     issue_count = serializers.ReadOnlyField
     percent_read = serializers.ReadOnlyField
+    placeholder = serializers.SerializerMethodField()
 
     class Meta:
         model = Arc
-        fields = ('id', 'name', 'slug', 'image',
-                  'issue_count', 'percent_read', 'desc')
+        fields = ('id', 'name', 'slug', 'image', 'placeholder',
+                  'issue_count', 'read_count', 'percent_read',
+                  'latest_issue_date', 'desc')
         lookup_field = 'slug'
 
+    def get_placeholder(self, obj):
+        return get_placeholder(obj.image_blurhash, obj.image_colors)
+
 
 class ComicPageSerializer(serializers.ModelSerializer):
     page = serializers.SerializerMethodField(read_only=True)
@@ -26,7 +61,7 @@ class ComicPageSerializer(serializers.ModelSerializer):
     def get_page(self, obj):
         page_number = self.context.get("page_number")
         i = ImageAPIHandler()
-        data_uri = i.get_uri(obj.file, page_number)
+        data_uri = i.get_uri(obj, page_number)
         return data_uri
 
 
@@ -47,6 +82,41 @@ class CreditsSerializer(serializers.ModelSerializer):
         fields = ('id', 'creator', 'image', 'role')
 
 
+class ImportRunSerializer(serializers.ModelSerializer):
+    status = serializers.CharField(source='get_status_display')
+    processed_count = serializers.SerializerMethodField()
+    imported_count = serializers.SerializerMethodField()
+    elapsed = serializers.ReadOnlyField()
+    files_per_sec = serializers.ReadOnlyField()
+    timings = serializers.SerializerMethodField()
+    queue = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportRun
+        fields = ('id', 'directory', 'status', 'file_count', 'processed_count',
+                  'imported_count', 'started', 'finished', 'elapsed',
+                  'files_per_sec', 'timings', 'queue')
+
+    def get_processed_count(self, obj):
+        return obj.batch_totals['processed'] or 0
+
+    def get_imported_count(self, obj):
+        return obj.batch_totals['imported'] or 0
+
+    def get_timings(self, obj):
+        totals = obj.batch_totals
+        timings = {'walk': round(obj.walk_time, 3)}
+        for phase in ('probe', 'comicvine', 'image', 'db'):
+            timings[phase] = round(totals[f'{phase}_time'] or 0, 3)
+        return timings
+
+    def get_queue(self, obj):
+        """ Number of batches waiting in, or done with, each stage. """
+        totals = obj.batch_totals
+        return {stage: totals[stage]
+                for stage in ('pending', 'running', 'done', 'failed')}
+
+
 class IssueArcSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -60,16 +130,24 @@ class IssueSerializer(serializers.ModelSerializer):
     arcs = IssueArcSerializer(many=True, read_only=True)
     percent_read = serializers.ReadOnlyField
     leaf = serializers.IntegerField()
+    covers = serializers.SerializerMethodField()
+    placeholder = serializers.SerializerMethodField()
 
     class Meta:
         model = Issue
         fields = ('id', '__str__', 'slug', 'name', 'number', 'date', 'leaf',
                   'page_count', 'percent_read', 'status', 'desc', 'image',
-                  'arcs', 'credits')
+                  'covers', 'placeholder', 'arcs', 'credits')
         read_only_fields = ('id', '__str__', 'slug', 'cvurl', 'name',
                             'number', 'date', 'page_count', 'desc', 'image')
         lookup_field = 'slug'
 
+    def get_covers(self, obj):
+        return get_cover_srcset(obj.cover_hash, self.context.get('request'))
+
+    def get_placeholder(self, obj):
+        return get_placeholder(obj.cover_blurhash, obj.cover_colors)
+
 
 class PublisherSerializer(serializers.HyperlinkedModelSerializer):
 
@@ -79,6 +157,37 @@ class PublisherSerializer(serializers.HyperlinkedModelSerializer):
         lookup_field = 'slug'
 
 
+class PageOptionsSerializer(serializers.Serializer):
+    width = serializers.IntegerField(required=False, min_value=16,
+                                     max_value=4096)
+    quality = serializers.IntegerField(required=False, min_value=1,
+                                       max_value=95)
+    # Named image_format since DRF uses the format parameter itself.
+    image_format = serializers.ChoiceField(required=False, choices=())
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['image_format'].choices = get_page_formats()
+
+
+class TileOptionsSerializer(serializers.Serializer):
+    image_format = serializers.ChoiceField(required=False, choices=())
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['image_format'].choices = get_page_formats()
+
+
+class CoverOptionsSerializer(serializers.Serializer):
+    width = serializers.IntegerField(required=False, min_value=16,
+                                     max_value=4096)
+    image_format = serializers.ChoiceField(required=False, choices=())
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['image_format'].choices = get_cover_formats()
+
+
 class ReaderSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -86,35 +195,51 @@ class ReaderSerializer(serializers.ModelSerializer):
         fields = ('leaf', 'page_count', 'status')
 
 
-class SeriesImageSerializer(serializers.HyperlinkedModelSerializer):
-    image = serializers.ImageField(
-        max_length=None, use_url=True, allow_null=True, required=False)
+class ManifestSerializer(serializers.ModelSerializer):
+    pages = serializers.SerializerMethodField()
 
     class Meta:
         model = Issue
-        fields = ('image',)
-        lookup_field = 'slug'
+        fields = ('leaf', 'page_count', 'status', 'pages')
+
+    def get_pages(self, obj):
+        request = self.context.get('request')
+        pages = get_page_manifest(obj)
+        for page in pages:
+            url = reverse('api:issue-page',
+                          kwargs={'slug': obj.slug, 'page': page['index']})
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            page['url'] = url
+        return pages
 
 
 class SeriesSerializer(serializers.HyperlinkedModelSerializer):
     issue_count = serializers.ReadOnlyField
     percent_read = serializers.ReadOnlyField
-    image = SeriesImageSerializer(source='issue_set.first', many=False)
+    image = serializers.ImageField(
+        source='cover_image', max_length=None, use_url=True, read_only=True)
+    covers = serializers.SerializerMethodField()
+    placeholder = serializers.SerializerMethodField()
     publisher = serializers.HyperlinkedRelatedField(
         many=False, read_only=True, view_name='api:publisher-detail', lookup_field='slug')
 
     class Meta:
         model = Series
         fields = ('slug', 'cvurl', 'name', 'sort_title',
-                  'year', 'desc', 'issue_count', 'percent_read',
-                  'image','publisher')
+                  'year', 'desc', 'issue_count', 'read_count', 'percent_read',
+                  'latest_issue_date', 'image', 'covers', 'placeholder',
+                  'publisher')
         lookup_field = 'slug'
 
-    def to_representation(self, obj):
-        """ Move image field from Issue to Series representation. """
-        representation = super().to_representation(obj)
-        issue_representation = representation.pop('image')
-        for key in issue_representation:
-            representation[key] = issue_representation[key]
-
-        return representation
+    def get_covers(self, obj):
+        if obj.cover is None:
+            return None
+        return get_cover_srcset(obj.cover.cover_hash,
+                                self.context.get('request'))
+
+    def get_placeholder(self, obj):
+        if obj.cover is None:
+            return None
+        return get_placeholder(obj.cover.cover_blurhash,
+                               obj.cover.cover_colors)
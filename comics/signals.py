@@ -1,3 +1,20 @@
+import threading
+
+from comics.utils.counters import update_counters
+from comics.utils.utils import delete_issue_cover
+
+
+# The series this thread is deleting, each with the arcs to recount once
+# it's gone. Its issues are deleted first, and recounting the series and
+# its publisher after each of them would be wasted on a series about to go.
+_local = threading.local()
+
+
+def deleting_series():
+    if not hasattr(_local, 'series'):
+        _local.series = {}
+    return _local.series
+
 
 def pre_delete_image(sender, instance, **kwargs):
     if (instance.image):
@@ -5,11 +22,37 @@ def pre_delete_image(sender, instance, **kwargs):
 
 
 def pre_delete_issue(sender, instance, **kwargs):
-    if (instance.image):
-        instance.image.delete(False)
+    # A series delete signals its issues before the series itself, so an
+    # entry here is left by a series delete that failed. Drop it, or this
+    # issue would never be recounted.
+    deleting_series().pop(instance.series_id, None)
+    delete_issue_cover(instance)
 
     # Delete related arc if this is the only
     # issue related to that arc.
+    arc_ids = []
     for arc in instance.arcs.all():
         if arc.issue_set.count() == 1:
             arc.delete()
+        else:
+            arc_ids.append(arc.id)
+    # The arcs are gone by post_delete, so note which to recount.
+    instance.counter_arc_ids = arc_ids
+
+
+def post_delete_issue(sender, instance, **kwargs):
+    arc_ids = getattr(instance, 'counter_arc_ids', ())
+    series = deleting_series()
+    if instance.series_id in series:
+        series[instance.series_id].update(arc_ids)
+        return
+    update_counters(series_ids=[instance.series_id], arc_ids=arc_ids)
+
+
+def pre_delete_series(sender, instance, **kwargs):
+    deleting_series()[instance.id] = set()
+
+
+def post_delete_series(sender, instance, **kwargs):
+    arc_ids = deleting_series().pop(instance.id, ())
+    update_counters(arc_ids=arc_ids, publisher_ids=[instance.publisher_id])
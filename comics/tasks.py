@@ -1,14 +1,235 @@
-from celery import shared_task
+from datetime import timedelta
+import logging
 
+from celery import chord, group, shared_task
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ImportBatch, ImportRun, Issue
+from .utils import utils
 from .utils.comicimporter import ComicImporter
 from .utils.comicimporter_no_vine import ComicImporterNoVine
+from .utils.sidecar import get_sidecar
 
-@shared_task
-def import_comic_files_task():
+
+logger = logging.getLogger('thwip')
+
+
+def acquire_import_run(directory, task_id):
+    """
+    Returns the import run to work on, resuming an interrupted run for the
+    directory if there is one. Returns None if another import is running.
+    """
+    stale = timezone.now() - timedelta(seconds=settings.IMPORT_LOCK_TIMEOUT)
+    with transaction.atomic():
+        run = (
+            ImportRun.objects
+            .select_for_update()
+            .filter(directory=directory, status=ImportRun.RUNNING)
+            .first()
+        )
+        if run is None:
+            try:
+                with transaction.atomic():
+                    return ImportRun.objects.create(directory=directory,
+                                                    task_id=task_id)
+            except IntegrityError:
+                # Another import grabbed the lock first.
+                return None
+
+        if run.heartbeat > stale:
+            return None
+
+        # The worker running this import went away, so take it over.
+        logger.info(f'Resuming interrupted import run {run.id}.')
+        run.task_id = task_id
+        run.heartbeat = timezone.now()
+        run.save()
+
+    return run
+
+
+def create_import_batches(run, filelist):
+    batches = utils.create_import_batches(filelist, settings.IMPORT_BATCH_SIZE)
+    ImportBatch.objects.bulk_create([
+        ImportBatch(run=run, number=number, files='\n'.join(batch))
+        for number, batch in enumerate(batches)
+    ])
+    run.file_count = len(filelist)
+    run.save()
+
+
+def start_import_chord(importer, task_id, batch_task):
+    run = acquire_import_run(importer.directory_path, task_id)
+    if run is None:
+        logger.info('An import is already running... skipping.')
+        return 0
+
+    # A resumed run already has its batches, so skip the directory walk.
+    if not run.importbatch_set.exists():
+        with importer.timer:
+            filelist = importer.getImportFileList()
+        run.walk_time = importer.timer.timings['walk']
+        create_import_batches(run, filelist)
+
+    # Batches still queued stay in the broker when a worker dies, so only
+    # send those never sent and those the dead worker was running. Batches
+    # queued longer than the lock timeout were lost from the broker, and
+    # importing is idempotent, so send those again too.
+    stale = timezone.now() - timedelta(seconds=settings.IMPORT_LOCK_TIMEOUT)
+    outstanding = run.importbatch_set.filter(
+        status__in=(ImportBatch.PENDING, ImportBatch.RUNNING))
+    batch_ids = list(
+        outstanding.filter(Q(queued__isnull=True) | Q(queued__lt=stale) |
+                           Q(status=ImportBatch.RUNNING))
+        .values_list('id', flat=True))
+    if not batch_ids:
+        if not outstanding.exists():
+            finalize_import_task([], run.id)
+        return 0
+
+    # Fan the batches out to a task each, and reconcile the counts once
+    # every batch has finished.
+    ImportBatch.objects.filter(id__in=batch_ids).update(queued=timezone.now())
+    header = [batch_task.s(batch_id) for batch_id in batch_ids]
+    chord(header)(finalize_import_task.s(run.id))
+    logger.info(f'Importing {run.file_count} files in {len(batch_ids)} batches.')
+
+    return len(batch_ids)
+
+
+BATCH_PHASES = ('probe', 'comicvine', 'image', 'db')
+
+
+def run_import_batch(task, importer_class, batch_id):
+    batch = ImportBatch.objects.select_related('run').get(id=batch_id)
+    filelist = batch.filelist
+    ImportBatch.objects.filter(id=batch.id).update(status=ImportBatch.RUNNING)
+
+    ci = importer_class()
+    processed = 0
+
+    def checkpoint():
+        # Record progress after each file so it can be followed through
+        # the progress endpoint or the task state.
+        nonlocal processed
+        processed += 1
+        ImportBatch.objects.filter(id=batch.id).update(
+            processed_count=processed, **ci.timer.fields(*BATCH_PHASES))
+        batch.run.touch()
+        if not task.request.is_eager:
+            task.update_state(state='PROGRESS',
+                              meta={'run': batch.run_id, 'batch': batch.number,
+                                    'processed': processed,
+                                    'files': len(filelist)})
+
+    try:
+        with ci.timer:
+            imported = ci.importFileList(filelist, callback=checkpoint)
+    except Exception as exc:
+        if task.request.retries < task.max_retries:
+            raise task.retry(exc=exc)
+        # Out of retries, so record the failure and return as usual. A
+        # failed header task would stop the chord from finalizing the run.
+        logger.error(f'Unable to import {batch} - {exc}')
+        ImportBatch.objects.filter(id=batch.id).update(
+            status=ImportBatch.FAILED, finished=timezone.now())
+        batch.run.touch()
+        return 0
+
+    # Files imported by an earlier, interrupted attempt are skipped by
+    # the importer, so add to the batch count instead of replacing it.
+    batch.imported_count += imported
+    batch.processed_count = len(filelist)
+    batch.status = ImportBatch.DONE
+    batch.finished = timezone.now()
+    for field, value in ci.timer.fields(*BATCH_PHASES).items():
+        setattr(batch, field, value)
+    batch.save()
+    batch.run.touch()
+
+    return imported
+
+
+@shared_task(bind=True)
+def import_comic_files_task(self):
     ci = ComicImporter()
-    success = ci.import_comic_files()
 
-    return success
+    return start_import_chord(ci, self.request.id, import_comic_batch_task)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def import_comic_batch_task(self, batch_id):
+    return run_import_batch(self, ComicImporter, batch_id)
+
+
+# Wait for batches queued before a resume for up to twice the lock timeout.
+FINALIZE_MAX_RETRIES = 2 * settings.IMPORT_LOCK_TIMEOUT // 60
+
+
+@shared_task(bind=True, max_retries=FINALIZE_MAX_RETRIES,
+             default_retry_delay=60)
+def finalize_import_task(self, results, run_id):
+    run = ImportRun.objects.get(id=run_id)
+    batches = run.importbatch_set.all()
+    # A resumed run's chord only covers the batches it sent again, so wait
+    # for any still queued from before.
+    outstanding = batches.filter(status__in=(ImportBatch.PENDING,
+                                             ImportBatch.RUNNING))
+    if outstanding.exists():
+        if self.request.retries < self.max_retries:
+            raise self.retry()
+        # Out of retries, so the stragglers were lost. Fail them rather
+        # than hold the run, and with it every later import, forever.
+        logger.error(f'Import batches of run {run.id} never finished.')
+        outstanding.update(status=ImportBatch.FAILED, finished=timezone.now())
+    run.imported_count = sum(b.imported_count for b in batches)
+    run.status = ImportRun.FINISHED
+    run.finished = timezone.now()
+    run.save()
+
+    skipped = run.file_count - run.imported_count
+    failed = batches.filter(status=ImportBatch.FAILED).count()
+    logger.info(
+        f'Finished importing: {run.imported_count} added, {skipped} skipped.')
+    if failed:
+        logger.warning(f'{failed} import batches failed.')
+
+    return {'files': run.file_count, 'imported': run.imported_count,
+            'skipped': skipped, 'failed': failed}
+
+
+@shared_task
+def convert_library_pages_task(force=False):
+    """
+    Converts the pages of every issue not converted yet, a task per issue.
+    Celery's worker processes are the pool here, since they can't start
+    pools of their own, and the rate limit is the throttle.
+    """
+    issue_ids = list(Issue.objects.values_list('id', flat=True))
+    sidecar = get_sidecar()
+    sidecar.prune(issue_ids)
+
+    if not force:
+        issue_ids = [issue.id for issue in Issue.objects.only('id', 'file')
+                     if not sidecar.has_issue(issue)]
+    group(convert_issue_pages_task.s(issue_id)
+          for issue_id in issue_ids).apply_async()
+    logger.info(f'Converting the pages of {len(issue_ids)} issues.')
+
+    return len(issue_ids)
+
+
+@shared_task(rate_limit=settings.SIDECAR_TASK_RATE_LIMIT)
+def convert_issue_pages_task(issue_id):
+    issue = Issue.objects.only('id', 'file').filter(id=issue_id).first()
+    if issue is None:
+        return False
+    get_sidecar().convert(issue, settings.SIDECAR_PAGE_DELAY)
+
+    return True
 
 
 @shared_task
@@ -45,10 +266,14 @@ def refresh_issue_credits_task(cvid):
 
 #tasks with out using vine but getting info from ComicRack xml in comic archive file
 
-@shared_task
-def import_comic_files_novine_task():
+@shared_task(bind=True)
+def import_comic_files_novine_task(self):
     ci = ComicImporterNoVine()
-    success = ci.import_comic_files()
 
-    return success
+    return start_import_chord(ci, self.request.id,
+                              import_comic_batch_novine_task)
+
 
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def import_comic_batch_novine_task(self, batch_id):
+    return run_import_batch(self, ComicImporterNoVine, batch_id)
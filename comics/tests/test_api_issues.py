@@ -1,3 +1,10 @@
+import io
+import os
+import tempfile
+import zipfile
+
+from django.test.utils import override_settings
+from PIL import Image
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
@@ -8,6 +15,10 @@ from rest_framework_jwt.compat import get_user_model
 
 from comics.models import Arc, Issue, Publisher, Series
 from comics.serializers import IssueSerializer, ReaderSerializer
+from comics.utils.hotcache import get_hot_cache
+from comics.utils.imageheader import pack_dimensions
+from comics.utils.sidecar import get_sidecar
+from comics.utils.tiles import get_tile_cache, tile_key
 
 
 issue_date = timezone.now().date()
@@ -54,6 +65,18 @@ class GetAllIssueTest(APITestCase):
                                     format='json')
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
 
+    def test_issue_list_by_series_name(self):
+        # Created after Superman, but listed first by name.
+        aquaman = Series.objects.create(cvid='4444', name='Aquaman',
+                                        slug='aquaman')
+        Issue.objects.create(cvid='4444', slug='aquaman-1', file='/home/c.cbz',
+                             mod_ts=mod_time, date=issue_date, number='1',
+                             series=aquaman)
+        resp = self.csrf_client.get(reverse('api:issue-list'),
+                                    HTTP_AUTHORIZATION=get_auth(self.user),
+                                    format='json')
+        self.assertEqual(resp.data['results'][0]['slug'], 'aquaman-1')
+
     def test_recent_issue_list(self):
         resp = self.csrf_client.get(reverse('api:issue-recent'),
                                     HTTP_AUTHORIZATION=get_auth(self.user),
@@ -139,3 +162,377 @@ class GetSingleIssueTest(APITestCase):
                                                 kwargs={'slug': 'airboy-001'}),
                                         HTTP_AUTHORIZATION=get_auth(self.user), format='json')
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class IssueCoversTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        series_obj = Series.objects.create(
+            cvid='1234', cvurl='http://1.com', name='Superman', slug='superman')
+        cls.superman = Issue.objects.create(cvid='1234', cvurl='http://1.com', slug='superman-1',
+                                            file='/home/a.cbz', mod_ts=mod_time, date=issue_date,
+                                            number='1', series=series_obj, cover_hash='ab12',
+                                            cover_blurhash='LEHV6nWB2yk8pyo0adR*.7kCMdnj',
+                                            cover_colors='#ff0000,#0000ff')
+
+    @override_settings(COVER_RENDITION_WIDTHS=(160, 320),
+                       COVER_RENDITION_FORMATS=('jpg',))
+    def test_issue_covers_srcset(self):
+        serializer = IssueSerializer(self.superman)
+        self.assertEqual(serializer.data['covers'], {
+            'jpg': '/media/images/covers/ab/ab12-160.jpg 160w, '
+                   '/media/images/covers/ab/ab12-320.jpg 320w'})
+
+    def test_issue_placeholder(self):
+        serializer = IssueSerializer(self.superman)
+        self.assertEqual(serializer.data['placeholder'], {
+            'blurhash': 'LEHV6nWB2yk8pyo0adR*.7kCMdnj',
+            'colors': ['#ff0000', '#0000ff']})
+
+        self.superman.cover_blurhash = ''
+        self.assertIsNone(IssueSerializer(self.superman).data['placeholder'])
+
+
+def create_test_archive(directory, page_count=3, size=(800, 1200)):
+    path = os.path.join(directory, 'test.cbz')
+    with zipfile.ZipFile(path, 'w') as zf:
+        for n in range(page_count):
+            page = io.BytesIO()
+            Image.new('RGB', size, 'blue').save(page, 'JPEG')
+            zf.writestr(f'{n:03}.jpg', page.getvalue())
+    return path
+
+
+class IssuePageTest(APITestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.user = User.objects.create_user('brian', 'brian@test.com')
+        series_obj = Series.objects.create(
+            cvid='1234', cvurl='http://1.com', name='Superman', slug='superman')
+        self.issue = Issue.objects.create(cvid='1234', cvurl='http://1.com', slug='superman-1',
+                                          file=create_test_archive(self.tmp.name),
+                                          mod_ts=mod_time, date=issue_date, number='1',
+                                          series=series_obj, page_count=3)
+        # Prefetching and hot issue extraction have their own tests, and
+        # would otherwise still be reading the archive when it's cleaned up.
+        cache_settings = override_settings(
+            PAGE_CACHE_DIR=os.path.join(self.tmp.name, 'cache'),
+            TILE_CACHE_DIR=os.path.join(self.tmp.name, 'tiles'),
+            PAGE_PREFETCH_COUNT=0, HOT_CACHE_MAX_BYTES=0)
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def get_page(self, page, HTTP_ACCEPT='*/*', **params):
+        return self.client.get(reverse('api:issue-page',
+                                       kwargs={'slug': self.issue.slug, 'page': page}),
+                               params, HTTP_AUTHORIZATION=get_auth(self.user),
+                               HTTP_ACCEPT=HTTP_ACCEPT)
+
+    def test_original_page(self):
+        resp = self.get_page(1)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp['Content-Type'], 'image/jpeg')
+        self.assertEqual(Image.open(io.BytesIO(resp.content)).size, (800, 1200))
+
+    def test_extracted_page(self):
+        with override_settings(HOT_CACHE_DIR=os.path.join(self.tmp.name, 'hot'),
+                               HOT_CACHE_MAX_BYTES=1024 ** 2):
+            get_hot_cache().extract(self.issue)
+            resp = self.get_page(1)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertEqual(resp['Content-Type'], 'image/jpeg')
+            # Sent straight from the extracted file.
+            self.assertTrue(resp.streaming)
+            resp.close()
+
+    def test_resized_page(self):
+        resp = self.get_page(1, width=400, image_format='webp')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp['Content-Type'], 'image/webp')
+        img = Image.open(io.BytesIO(resp.content))
+        self.assertEqual(img.size, (400, 600))
+        self.assertEqual(img.format, 'WEBP')
+
+        # The second request is served from the page cache.
+        self.assertEqual(self.get_page(1, width=400, image_format='webp').content,
+                         resp.content)
+
+    def test_negotiated_page(self):
+        resp = self.get_page(1, width=400, HTTP_ACCEPT='image/webp,*/*;q=0.8')
+        self.assertEqual(resp['Content-Type'], 'image/webp')
+        self.assertIn('Accept', resp['Vary'])
+        self.assertEqual(Image.open(io.BytesIO(resp.content)).size, (400, 600))
+
+        # Pages that aren't resized or re-encoded are served as stored.
+        chrome = 'image/avif,image/webp,image/apng,image/*,*/*;q=0.8'
+        resp = self.get_page(1, HTTP_ACCEPT=chrome)
+        self.assertEqual(resp['Content-Type'], 'image/jpeg')
+        # WebP is encoded far quicker than AVIF, so it's preferred.
+        resp = self.get_page(1, quality=70, HTTP_ACCEPT=chrome)
+        self.assertEqual(resp['Content-Type'], 'image/webp')
+
+        # Wildcards get the page as it is in the archive.
+        resp = self.get_page(1, HTTP_ACCEPT='image/*,*/*;q=0.8')
+        self.assertEqual(resp['Content-Type'], 'image/jpeg')
+        self.assertIn('Accept', resp['Vary'])
+
+        # So does an explicit format.
+        resp = self.get_page(1, image_format='jpeg', HTTP_ACCEPT='image/webp')
+        self.assertEqual(resp['Content-Type'], 'image/jpeg')
+
+    def test_invalid_page_options(self):
+        resp = self.get_page(1, image_format='tiff')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_missing_page(self):
+        resp = self.get_page(10)
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_converted_page(self):
+        with override_settings(SIDECAR_DIR=os.path.join(self.tmp.name, 'sidecar'),
+                               SIDECAR_PAGE_WIDTHS=(400,),
+                               SIDECAR_PAGE_FORMATS=('webp',)):
+            get_sidecar().convert(self.issue)
+            resp = self.get_page(1, width=400, image_format='webp')
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertEqual(resp['Content-Type'], 'image/webp')
+            # Sent straight from the converted file.
+            self.assertTrue(resp.streaming)
+            img = Image.open(io.BytesIO(b''.join(resp.streaming_content)))
+            self.assertEqual(img.size, (400, 600))
+
+            # Other renditions are still converted on request.
+            resp = self.get_page(1, width=300, image_format='webp')
+            self.assertFalse(resp.streaming)
+
+    def get_tile(self, page, level, column, row, image_format='jpeg'):
+        return self.client.get(reverse('api:issue-page-tile', kwargs={
+            'slug': self.issue.slug, 'page': page, 'level': level,
+            'column': column, 'row': row, 'image_format': image_format}),
+            HTTP_AUTHORIZATION=get_auth(self.user), HTTP_ACCEPT='image/*')
+
+    def test_page_dzi(self):
+        resp = self.client.get(reverse('api:issue-page-dzi',
+                                       kwargs={'slug': self.issue.slug, 'page': 1}),
+                               {'image_format': 'webp'},
+                               HTTP_AUTHORIZATION=get_auth(self.user))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        dzi = resp.data['Image']
+        self.assertEqual(dzi['Format'], 'webp')
+        self.assertEqual(dzi['TileSize'], '254')
+        self.assertEqual(dzi['Overlap'], '1')
+        self.assertEqual(dzi['Size'], {'Width': '800', 'Height': '1200'})
+        self.assertTrue(dzi['Url'].endswith(
+            f'/api/issue/{self.issue.slug}/page/1/tiles/'))
+
+        resp = self.client.get(reverse('api:issue-page-dzi',
+                                       kwargs={'slug': self.issue.slug, 'page': 10}),
+                               HTTP_AUTHORIZATION=get_auth(self.user))
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_tiles(self):
+        # The full size level of an 800 x 1200 page is 11, 4 x 5 tiles.
+        resp = self.get_tile(1, 11, 1, 1)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp['Content-Type'], 'image/jpeg')
+        # Inner tiles overlap their neighbours on each side.
+        self.assertEqual(Image.open(io.BytesIO(resp.content)).size, (256, 256))
+
+        # The rest of the level was cut at the same time.
+        mtime = os.path.getmtime(self.issue.file)
+        for column in range(4):
+            for row in range(5):
+                key = tile_key(self.issue, 1, 11, column, row, 'jpeg', mtime)
+                self.assertIsNotNone(get_tile_cache().get(key))
+
+        # Edge tiles only overlap inwards.
+        resp = self.get_tile(1, 11, 3, 4)
+        self.assertEqual(Image.open(io.BytesIO(resp.content)).size, (39, 185))
+
+        resp = self.get_tile(1, 8, 0, 0, 'webp')
+        self.assertEqual(resp['Content-Type'], 'image/webp')
+        self.assertEqual(Image.open(io.BytesIO(resp.content)).size, (100, 150))
+
+    def test_missing_tiles(self):
+        for tile in ((1, 12, 0, 0), (1, 11, 4, 0), (1, 11, 0, 5), (10, 0, 0, 0)):
+            self.assertEqual(self.get_tile(*tile).status_code,
+                             status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.get_tile(1, 0, 0, 0, 'tiff').status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_page_cache_stats(self):
+        self.get_page(1)
+        self.get_page(1)
+        resp = self.client.get(reverse('api:issue-page-cache-stats'),
+                               HTTP_AUTHORIZATION=get_auth(self.user))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(resp.data['memory']['hits'], 1)
+        self.assertEqual(set(resp.data['shared']),
+                         {'hits', 'misses', 'evictions'})
+
+    def test_missing_archive(self):
+        os.remove(self.issue.file)
+        urls = [reverse('api:issue-page',
+                        kwargs={'slug': self.issue.slug, 'page': 1}),
+                reverse('api:issue-get-page',
+                        kwargs={'slug': self.issue.slug, 'page': 1}),
+                reverse('api:issue-manifest', kwargs={'slug': self.issue.slug}),
+                reverse('api:issue-page-dzi',
+                        kwargs={'slug': self.issue.slug, 'page': 1}),
+                reverse('api:issue-pages',
+                        kwargs={'slug': self.issue.slug, 'start': 0,
+                                'end': 2})]
+        for url in urls:
+            resp = self.client.get(url, HTTP_AUTHORIZATION=get_auth(self.user),
+                                   HTTP_ACCEPT='*/*')
+            self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND, url)
+        self.assertEqual(self.get_tile(1, 0, 0, 0).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_corrupt_archive(self):
+        self.issue.page_dimensions = pack_dimensions([(800, 1200)] * 3)
+        self.issue.save()
+        with open(self.issue.file, 'wb') as f:
+            f.write(b'Not a zip file')
+        urls = [reverse('api:issue-manifest', kwargs={'slug': self.issue.slug}),
+                reverse('api:issue-page-dzi',
+                        kwargs={'slug': self.issue.slug, 'page': 1}),
+                reverse('api:issue-pages',
+                        kwargs={'slug': self.issue.slug, 'start': 0,
+                                'end': 2})]
+        for url in urls:
+            resp = self.client.get(url, HTTP_AUTHORIZATION=get_auth(self.user),
+                                   HTTP_ACCEPT='*/*')
+            self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND, url)
+
+    def test_manifest(self):
+        resp = self.client.get(reverse('api:issue-manifest',
+                                       kwargs={'slug': self.issue.slug}),
+                               HTTP_AUTHORIZATION=get_auth(self.user))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['page_count'], 3)
+
+        pages = resp.data['pages']
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(pages[0]['type'], 'FrontCover')
+        self.assertEqual(pages[1]['type'], 'Story')
+        self.assertEqual((pages[1]['width'], pages[1]['height']), (800, 1200))
+        self.assertFalse(pages[1]['spread'])
+        self.assertGreater(pages[1]['size'], 0)
+        self.assertTrue(pages[2]['url'].endswith(
+            reverse('api:issue-page', kwargs={'slug': self.issue.slug, 'page': 2})))
+
+    def test_manifest_stored_dimensions(self):
+        self.issue.page_dimensions = pack_dimensions([(800, 1200), (1600, 1200),
+                                                      (800, 1200)])
+        self.issue.save()
+        resp = self.client.get(reverse('api:issue-manifest',
+                                       kwargs={'slug': self.issue.slug}),
+                               HTTP_AUTHORIZATION=get_auth(self.user))
+        pages = resp.data['pages']
+        self.assertEqual((pages[1]['width'], pages[1]['height']), (1600, 1200))
+        self.assertTrue(pages[1]['spread'])
+
+    def get_pages(self, start, end, **params):
+        return self.client.get(reverse('api:issue-pages',
+                                       kwargs={'slug': self.issue.slug,
+                                               'start': start, 'end': end}),
+                               params, HTTP_AUTHORIZATION=get_auth(self.user))
+
+    def read_parts(self, resp):
+        boundary = resp['Content-Type'].split('boundary=')[1].encode('ascii')
+        body = b''.join(resp.streaming_content)
+        self.assertTrue(body.endswith(b'--' + boundary + b'--\r\n'))
+        parts = []
+        for part in body.split(b'--' + boundary)[1:-1]:
+            headers, data = part.split(b'\r\n\r\n', 1)
+            headers = dict(line.split(b': ', 1)
+                           for line in headers.strip().split(b'\r\n'))
+            self.assertEqual(int(headers[b'Content-Length']), len(data) - 2)
+            parts.append((headers, Image.open(io.BytesIO(data[:-2]))))
+        return parts
+
+    def test_page_range(self):
+        resp = self.get_pages(1, 5)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp['Content-Type'].startswith('multipart/mixed'))
+
+        # The range stops at the last page.
+        parts = self.read_parts(resp)
+        self.assertEqual([h[b'X-Page'] for h, img in parts], [b'1', b'2'])
+        self.assertEqual(parts[0][0][b'Content-Type'], b'image/jpeg')
+        self.assertEqual(parts[0][1].size, (800, 1200))
+
+    def test_resized_page_range(self):
+        parts = self.read_parts(self.get_pages(0, 2, width=400))
+        self.assertEqual([img.size for h, img in parts], [(400, 600)] * 3)
+
+    def test_page_range_archive_removed(self):
+        resp = self.get_pages(0, 2, width=400)
+        content = iter(resp.streaming_content)
+        first = next(content)
+        os.remove(self.issue.file)
+
+        # The stream ends after the pages already read.
+        body = first + b''.join(content)
+        self.assertIn(b'X-Page: 0', body)
+        self.assertNotIn(b'X-Page: 1', body)
+
+    def test_invalid_page_range(self):
+        self.assertEqual(self.get_pages(2, 1).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get_pages(0, 100).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get_pages(3, 4).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def download(self, **headers):
+        return self.client.get(reverse('api:issue-download',
+                                       kwargs={'slug': self.issue.slug}),
+                               HTTP_AUTHORIZATION=get_auth(self.user), **headers)
+
+    def test_download(self):
+        with open(self.issue.file, 'rb') as f:
+            archive = f.read()
+
+        resp = self.download()
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(resp.streaming_content), archive)
+        self.assertEqual(resp['Content-Type'], 'application/vnd.comicbook+zip')
+        self.assertEqual(resp['Accept-Ranges'], 'bytes')
+        self.assertEqual(int(resp['Content-Length']), len(archive))
+        self.assertIn('attachment', resp['Content-Disposition'])
+        etag = resp['ETag']
+
+        resp = self.download(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(resp.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(resp.streaming_content), archive[100:200])
+        self.assertEqual(resp['Content-Range'], f'bytes 100-199/{len(archive)}')
+
+        # Resuming a download, and fetching the end of the archive.
+        resp = self.download(HTTP_RANGE='bytes=100-', HTTP_IF_RANGE=etag)
+        self.assertEqual(b''.join(resp.streaming_content), archive[100:])
+        resp = self.download(HTTP_RANGE='bytes=-50')
+        self.assertEqual(b''.join(resp.streaming_content), archive[-50:])
+
+        # A changed archive is sent in full rather than resumed.
+        resp = self.download(HTTP_RANGE='bytes=100-', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        resp = self.download(HTTP_RANGE=f'bytes={len(archive)}-')
+        self.assertEqual(resp.status_code,
+                         status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+        resp = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_cover(self):
+        resp = self.client.get(reverse('api:issue-cover',
+                                       kwargs={'slug': self.issue.slug}),
+                               HTTP_AUTHORIZATION=get_auth(self.user))
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
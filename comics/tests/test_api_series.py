@@ -1,4 +1,12 @@
+import datetime
+import io
+import shutil
+import tempfile
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
@@ -7,8 +15,12 @@ from rest_framework.test import APIRequestFactory, APIClient
 from rest_framework_jwt import utils
 from rest_framework_jwt.compat import get_user_model
 
-from comics.models import Series, Publisher, Issue
+from PIL import Image
+
+from comics.models import Arc, Series, Publisher, Issue
 from comics.serializers import SeriesSerializer
+from comics.utils.counters import update_issue_counters
+from comics.utils.utils import create_cover_renditions, issue_sort_number
 
 
 issue_date = timezone.now().date()
@@ -108,3 +120,203 @@ class GetSingleSeriesTest(TestCase):
                                                 kwargs={'slug': 'airboy'}),
                                         HTTP_AUTHORIZATION=get_auth(self.user), format='json')
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SeriesListQueriesTest(TestCase):
+
+    def setUp(self):
+        self.csrf_client = APIClient(enforce_csrf_checks=True)
+        self.user = User.objects.create_user('brian', 'brian@test.com')
+        self.publisher = Publisher.objects.create(name='DC Comics',
+                                                  slug='dc-comics')
+        self.arc = Arc.objects.create(cvid=1001, name='Blackest Night',
+                                      slug='blackest-night')
+
+    def add_series(self, count):
+        for n in range(Series.objects.count(), Series.objects.count() + count):
+            series = Series.objects.create(
+                cvid=n, name=f'Series {n}', slug=f'series-{n}',
+                publisher=self.publisher)
+            # Created latest first, so the cover isn't just the lowest id.
+            for number in (3, 2, 1):
+                issue = Issue.objects.create(
+                    cvid=str(n * 10 + number), slug=f'series-{n}-{number}',
+                    file=f'/home/{n}-{number}.cbz', mod_ts=mod_time,
+                    date=datetime.date(2019, number, 1), number=str(number),
+                    series=series, image=f'images/issues/{n}-{number}.jpg')
+                issue.arcs.add(self.arc)
+        update_issue_counters(Issue.objects.all())
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.csrf_client.get(
+                url, HTTP_AUTHORIZATION=get_auth(self.user), format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_constant_queries(self):
+        urls = (reverse('api:series-list'),
+                reverse('api:publisher-series-list',
+                        kwargs={'slug': self.publisher.slug}),
+                reverse('api:arc-list'),
+                reverse('api:publisher-list'))
+        self.add_series(1)
+        counts = [self.count_queries(url) for url in urls]
+        self.add_series(20)
+        self.assertEqual([self.count_queries(url) for url in urls], counts)
+
+    def test_series_cover(self):
+        self.add_series(2)
+        resp = self.csrf_client.get(reverse('api:series-list'),
+                                    HTTP_AUTHORIZATION=get_auth(self.user),
+                                    format='json')
+        for result in resp.data['results']:
+            self.assertTrue(result['image'].endswith(
+                f'/images/issues/{result["slug"][7:]}-1.jpg'))
+            series = Series.objects.get(slug=result['slug'])
+            serializer = SeriesSerializer(
+                series, context={'request': resp.wsgi_request})
+            self.assertEqual(result, serializer.data)
+
+    def test_issue_list_order(self):
+        series = Series.objects.create(cvid=99, name='Odd', slug='odd')
+        for cvid, number in enumerate(('010', '002', '001/2', 'Annual 1',
+                                       '-001', '010.5')):
+            Issue.objects.create(
+                cvid=1000 + cvid, slug=f'odd-{cvid}', file=f'/home/odd-{cvid}.cbz',
+                mod_ts=mod_time, date=datetime.date(2019, 1, 1), number=number,
+                sort_number=issue_sort_number(number), series=series)
+        resp = self.csrf_client.get(reverse('api:series-issue-list',
+                                            kwargs={'slug': series.slug}),
+                                    HTTP_AUTHORIZATION=get_auth(self.user),
+                                    format='json')
+        self.assertEqual([issue['number'] for issue in resp.data['results']],
+                         ['-001', '001/2', '002', '010', '010.5', 'Annual 1'])
+
+    def test_series_without_issues(self):
+        Series.objects.create(cvid=99, name='Empty', slug='empty')
+        resp = self.csrf_client.get(reverse('api:series-detail',
+                                            kwargs={'slug': 'empty'}),
+                                    HTTP_AUTHORIZATION=get_auth(self.user),
+                                    format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertIsNone(resp.data['image'])
+
+
+def create_cover(color):
+    page = io.BytesIO()
+    Image.new('RGB', (200, 300), color).save(page, 'PNG')
+    return create_cover_renditions(page.getvalue(), 64, 96)
+
+
+@override_settings(COVER_RENDITION_WIDTHS=(32, 64),
+                   COVER_RENDITION_FORMATS=('jpg',))
+class SeriesSpriteTest(TestCase):
+
+    def setUp(self):
+        self.csrf_client = APIClient(enforce_csrf_checks=True)
+        self.user = User.objects.create_user('brian', 'brian@test.com')
+
+        self.media_root = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root,
+                                              SPRITE_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.superman = Series.objects.create(
+            cvid='1234', cvurl='http://1.com', name='Superman', slug='superman')
+        batman = Series.objects.create(
+            cvid='4321', cvurl='http://2.com', name='Batman', slug='batman')
+        Series.objects.create(
+            cvid='5678', cvurl='http://3.com', name='Flash', slug='flash')
+        for number, color in enumerate(('red', 'blue'), 1):
+            Issue.objects.create(cvid=str(number), cvurl='http://1.com',
+                                 slug=f'superman-{number}', file='/home/a.cbz',
+                                 mod_ts=mod_time, date=issue_date,
+                                 number=str(number), series=self.superman,
+                                 cover_hash=create_cover(color))
+        Issue.objects.create(cvid='3', cvurl='http://2.com', slug='batman-1',
+                             file='/home/b.cbz', mod_ts=mod_time, date=issue_date,
+                             number='1', series=batman,
+                             cover_hash=create_cover('green'))
+        update_issue_counters(Issue.objects.all())
+
+    def get_sprite(self, url, **params):
+        resp = self.csrf_client.get(url, params,
+                                    HTTP_AUTHORIZATION=get_auth(self.user))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data
+
+    def get_image(self, sprite):
+        resp = self.csrf_client.get(sprite['image'],
+                                    HTTP_AUTHORIZATION=get_auth(self.user))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp['Content-Type'], 'image/jpeg')
+        return Image.open(io.BytesIO(b''.join(resp.streaming_content)))
+
+    def test_series_sprite(self):
+        sprite = self.get_sprite(reverse('api:series-sprite'))
+
+        # Flash has no issues, so no cover in the map.
+        self.assertEqual(sprite['covers'], [
+            {'slug': 'superman', 'x': 0, 'y': 0},
+            {'slug': 'batman', 'x': 32, 'y': 0},
+        ])
+        self.assertEqual((sprite['width'], sprite['height']), (96, 48))
+        self.assertEqual((sprite['tile_width'], sprite['tile_height']),
+                         (32, 48))
+
+        image = self.get_image(sprite)
+        self.assertEqual(image.size, (96, 48))
+        # Each series is shown by its first issue.
+        red, green, blue = image.convert('RGB').getpixel((16, 24))
+        self.assertGreater(red, 200)
+        self.assertLess(blue, 50)
+        red, green, blue = image.convert('RGB').getpixel((48, 24))
+        self.assertGreater(green, 80)
+        self.assertLess(red, 50)
+
+    def test_series_sprite_search(self):
+        sprite = self.get_sprite(reverse('api:series-sprite'), search='bat')
+        self.assertEqual(sprite['covers'], [
+            {'slug': 'batman', 'x': 0, 'y': 0}])
+
+    def test_issue_list_sprite(self):
+        url = reverse('api:series-issue-sprite', kwargs={'slug': 'superman'})
+        sprite = self.get_sprite(url, width=64)
+
+        self.assertEqual(sprite['covers'], [
+            {'slug': 'superman-1', 'x': 0, 'y': 0},
+            {'slug': 'superman-2', 'x': 64, 'y': 0},
+        ])
+        self.assertEqual(self.get_image(sprite).size, (128, 96))
+
+    def test_sprite_cached(self):
+        url = reverse('api:series-issue-sprite', kwargs={'slug': 'superman'})
+        first = self.get_sprite(url)
+        self.assertEqual(self.get_sprite(url)['image'], first['image'])
+
+        # A new cover is new content, so a new sprite.
+        issue = Issue.objects.get(slug='superman-2')
+        issue.cover_hash = create_cover('yellow')
+        issue.save()
+        self.assertNotEqual(self.get_sprite(url)['image'], first['image'])
+
+        # As are other renditions.
+        self.assertNotEqual(self.get_sprite(url, width=64)['image'],
+                            first['image'])
+
+    def test_missing_sprite(self):
+        resp = self.csrf_client.get(
+            reverse('api:sprite-detail', kwargs={'pk': 'a' * 40}),
+            HTTP_AUTHORIZATION=get_auth(self.user))
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_sprite_options(self):
+        resp = self.csrf_client.get(reverse('api:series-sprite'),
+                                    {'width': 'big'},
+                                    HTTP_AUTHORIZATION=get_auth(self.user))
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
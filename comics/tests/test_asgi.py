@@ -0,0 +1,128 @@
+import asyncio
+import io
+import os
+import tempfile
+
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework_jwt.compat import get_user_model
+
+from comics.asgi import PageServingApplication
+from comics.models import Issue, Series
+from comics.tests.test_api_issues import create_test_archive, get_auth
+from comics.utils.hotcache import get_hot_cache
+from comics.utils.utils import create_cover_renditions
+
+
+User = get_user_model()
+
+
+async def fallback(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 418, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'django'})
+
+
+class TestPageServingApplication(TransactionTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        settings = override_settings(
+            MEDIA_ROOT=os.path.join(self.tmp.name, 'media'),
+            PAGE_CACHE_DIR=os.path.join(self.tmp.name, 'cache'),
+            PAGE_PREFETCH_COUNT=0,
+            HOT_CACHE_MAX_BYTES=0,
+            COVER_RENDITION_WIDTHS=(160, 320),
+            COVER_RENDITION_FORMATS=('jpg',))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create_user('brian', 'brian@test.com')
+        series = Series.objects.create(
+            cvid='1234', cvurl='http://1.com', name='Superman', slug='superman')
+        cover = io.BytesIO()
+        Image.new('RGB', (640, 960), 'red').save(cover, 'JPEG')
+        self.issue = Issue.objects.create(
+            cvid='1234', cvurl='http://1.com', slug='superman-1',
+            file=create_test_archive(self.tmp.name), mod_ts=timezone.now(),
+            date=timezone.now().date(), number='1', series=series,
+            page_count=3,
+            cover_hash=create_cover_renditions(cover.getvalue(), 320, 480))
+        self.app = PageServingApplication(fallback, max_workers=2)
+
+    def tearDown(self):
+        self.app.executor.shutdown()
+        self.tmp.cleanup()
+
+    def request(self, path, query=b'', auth=True, method='GET'):
+        headers = [(b'host', b'testserver')]
+        if auth:
+            headers.append((b'authorization', get_auth(self.user).encode()))
+        scope = {'type': 'http', 'method': method, 'path': path,
+                 'query_string': query, 'headers': headers}
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(self.app(scope, receive, send))
+        start = messages[0]
+        self.assertFalse(messages[-1].get('more_body', False))
+        body = b''.join(m.get('body', b'') for m in messages[1:])
+        return start['status'], dict(start['headers']), body
+
+    def test_page(self):
+        status, headers, body = self.request('/api/issue/superman-1/page/1/',
+                                             b'width=400')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'content-type'], b'image/jpeg')
+        self.assertEqual(int(headers[b'content-length']), len(body))
+        self.assertEqual(Image.open(io.BytesIO(body)).size, (400, 600))
+
+    def test_page_extracts_issue(self):
+        with override_settings(HOT_CACHE_DIR=os.path.join(self.tmp.name, 'hot'),
+                               HOT_CACHE_MAX_BYTES=1024 ** 2):
+            status, headers, body = self.request(
+                '/api/issue/superman-1/page/1/')
+            self.assertEqual(status, 200)
+            # Wait for the extraction in the background to finish.
+            hot_cache = get_hot_cache()
+            hot_cache.shutdown()
+            self.assertIsNotNone(hot_cache.get_page_path(self.issue, 1))
+
+    def test_page_errors(self):
+        status, headers, body = self.request('/api/issue/superman-1/page/9/')
+        self.assertEqual(status, 404)
+        status, headers, body = self.request('/api/issue/batman-1/page/0/')
+        self.assertEqual(status, 404)
+        status, headers, body = self.request('/api/issue/superman-1/page/0/',
+                                             b'image_format=tiff')
+        self.assertEqual(status, 400)
+
+    def test_bad_token(self):
+        self.user.is_active = False
+        self.user.save()
+        status, headers, body = self.request('/api/issue/superman-1/page/0/')
+        self.assertEqual(status, 401)
+
+    def test_cover(self):
+        status, headers, body = self.request('/api/issue/superman-1/cover/',
+                                             b'width=200')
+        self.assertEqual(status, 200)
+        self.assertEqual(Image.open(io.BytesIO(body)).size, (320, 480))
+
+        status, headers, body = self.request('/api/issue/superman-1/cover/',
+                                             method='HEAD')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'')
+        self.assertGreater(int(headers[b'content-length']), 0)
+
+    def test_fallback(self):
+        # Anything else, or requests without a JWT, go to Django.
+        self.assertEqual(self.request('/api/issue/')[0], 418)
+        self.assertEqual(
+            self.request('/api/issue/superman-1/page/0/', auth=False)[0], 418)
@@ -1,9 +1,10 @@
 import os
+import tempfile
 
 from django.conf import settings
 from django.test import SimpleTestCase
 
-from comics.utils.comicapi.comicarchive import ComicArchive
+from comics.utils.comicapi.comicarchive import ComicArchive, ZipArchiver
 
 TEST_DATA = settings.BASE_DIR + os.sep + \
     'comics/fixtures/Captain Atom #078 (1965).cbz'
@@ -35,3 +36,9 @@ class TestComicArchive(SimpleTestCase):
         ca = ComicArchive(TEST_DATA)
         md = ca.readCIX()
         self.assertIsNotNone(md)
+
+    def test_archive_file_sizes_bad_zip(self):
+        with tempfile.NamedTemporaryFile(suffix='.cbz') as f:
+            f.write(b'not a zip file')
+            f.flush()
+            self.assertEqual(ZipArchiver(f.name).getArchiveFileSizes(), {})
@@ -0,0 +1,150 @@
+import datetime
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models.signals import post_delete
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_jwt.compat import get_user_model
+
+from comics.models import Arc, Issue, Publisher, Series
+from comics.tests.test_api_series import get_auth
+from comics.utils.counters import (recount_all, update_counters,
+                                   update_issue_counters)
+
+
+mod_time = timezone.now()
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+
+    def setUp(self):
+        self.dc = Publisher.objects.create(name='DC Comics', slug='dc-comics')
+        self.superman = Series.objects.create(
+            cvid='1234', name='Superman', slug='superman', publisher=self.dc)
+        self.batman = Series.objects.create(
+            cvid='4321', name='Batman', slug='batman', publisher=self.dc)
+        self.arc = Arc.objects.create(
+            cvid=1001, name='Blackest Night', slug='blackest-night')
+        self.issues = []
+        for number in range(1, 4):
+            issue = Issue.objects.create(
+                cvid=str(number), slug=f'superman-{number}',
+                file=f'/home/superman-{number}.cbz', mod_ts=mod_time,
+                date=datetime.date(2019, number, 1), number=str(number),
+                series=self.superman, status=2 if number == 1 else 0,
+                image=f'images/issues/superman-{number}.jpg')
+            issue.arcs.add(self.arc)
+            self.issues.append(issue)
+        Issue.objects.create(cvid='9', slug='batman-1', file='/home/batman-1.cbz',
+                             mod_ts=mod_time, date=datetime.date(2018, 1, 1),
+                             number='1', series=self.batman)
+        update_issue_counters(Issue.objects.all())
+
+    def assertCounts(self, obj, issue_count, read_count):
+        obj.refresh_from_db()
+        self.assertEqual(obj.issue_count, issue_count)
+        self.assertEqual(obj.read_count, read_count)
+
+    def test_update_issue_counters(self):
+        self.assertCounts(self.superman, 3, 1)
+        self.assertCounts(self.batman, 1, 0)
+        self.assertCounts(self.arc, 3, 1)
+        self.assertCounts(self.dc, 4, 1)
+        self.assertEqual(self.dc.series_count, 2)
+        self.assertEqual(self.superman.latest_issue_date,
+                         datetime.date(2019, 3, 1))
+        self.assertEqual(self.superman.percent_read, 33)
+
+    def test_update_counters_without_issues(self):
+        self.batman.issue_set.all().delete()
+        update_counters(series_ids=[self.batman.id])
+        self.assertCounts(self.batman, 0, 0)
+        self.assertIsNone(self.batman.latest_issue_date)
+        self.assertEqual(self.batman.percent_read, 0)
+
+    def test_series_cover(self):
+        self.superman.refresh_from_db()
+        self.assertEqual(self.superman.cover, self.issues[0])
+        self.assertEqual(self.superman.cover_image.name,
+                         'images/issues/superman-1.jpg')
+
+    def test_delete_cover(self):
+        self.issues[0].delete()
+        self.superman.refresh_from_db()
+        self.assertEqual(self.superman.cover, self.issues[1])
+        self.assertEqual(self.superman.cover_image.name,
+                         'images/issues/superman-2.jpg')
+
+        self.batman.issue_set.all().delete()
+        self.batman.refresh_from_db()
+        self.assertIsNone(self.batman.cover)
+        self.assertEqual(self.batman.cover_image.name, '')
+
+    def test_status_update(self):
+        user = User.objects.create_user('brian', 'brian@test.com')
+        resp = APIClient().patch(
+            reverse('api:issue-detail', kwargs={'slug': 'superman-2'}),
+            {'status': 2}, HTTP_AUTHORIZATION=get_auth(user), format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertCounts(self.superman, 3, 2)
+        self.assertCounts(self.arc, 3, 2)
+        self.assertCounts(self.dc, 4, 2)
+
+    def test_delete_issue(self):
+        self.issues[0].delete()
+        self.assertCounts(self.superman, 2, 0)
+        self.assertCounts(self.arc, 2, 0)
+        self.assertCounts(self.dc, 3, 0)
+
+    def test_delete_series(self):
+        self.batman.delete()
+        self.assertCounts(self.dc, 3, 1)
+        self.assertEqual(self.dc.series_count, 1)
+
+    def test_delete_series_recounts_once(self):
+        batman_2 = Issue.objects.create(
+            cvid='10', slug='batman-2', file='/home/batman-2.cbz',
+            mod_ts=mod_time, date=datetime.date(2018, 2, 1), number='2',
+            series=self.batman)
+        batman_2.arcs.add(self.arc)
+        with CaptureQueriesContext(connection) as queries:
+            self.superman.delete()
+        recounts = [q for q in queries.captured_queries
+                    if '"issue_count" =' in q['sql']]
+        # One recount of the arc and one of the publisher.
+        self.assertEqual(len(recounts), 2)
+        self.assertCounts(self.arc, 1, 0)
+        self.assertCounts(self.dc, 2, 0)
+        self.assertEqual(self.dc.series_count, 1)
+
+    def test_failed_series_delete(self):
+        def fail(**kwargs):
+            raise DatabaseError('Gone away')
+
+        post_delete.connect(fail, sender=Issue, dispatch_uid='test_fail')
+        try:
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic():
+                    self.superman.delete()
+        finally:
+            post_delete.disconnect(sender=Issue, dispatch_uid='test_fail')
+
+        # The failed delete doesn't stop its issues being recounted later.
+        self.issues[0].delete()
+        self.assertCounts(self.superman, 2, 0)
+
+    def test_recount_all(self):
+        Series.objects.update(issue_count=0, read_count=0)
+        Arc.objects.update(issue_count=0, read_count=0)
+        Publisher.objects.update(issue_count=0, read_count=0, series_count=0)
+        recount_all()
+        self.assertCounts(self.superman, 3, 1)
+        self.assertCounts(self.arc, 3, 1)
+        self.assertCounts(self.dc, 4, 1)
+        self.assertEqual(self.dc.series_count, 2)
@@ -0,0 +1,81 @@
+from collections import namedtuple
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from comics.tests.test_api_issues import create_test_archive
+from comics.utils.hotcache import HotIssueCache
+
+
+FakeIssue = namedtuple('FakeIssue', ('id', 'file'))
+
+
+class TestHotIssueCache(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = HotIssueCache(os.path.join(self.tmp.name, 'hot'), 10 ** 6)
+        self.issue = FakeIssue(1, create_test_archive(self.tmp.name))
+
+    def tearDown(self):
+        self.cache.shutdown()
+        self.tmp.cleanup()
+
+    def test_extract(self):
+        self.assertIsNone(self.cache.get_page_path(self.issue, 0))
+        self.cache.open_issue(self.issue).result()
+
+        path = self.cache.get_page_path(self.issue, 2)
+        self.assertTrue(path.endswith('00002.jpg'))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), self.cache.page_reader(self.issue)(2))
+        self.assertIsNone(self.cache.get_page_path(self.issue, 3))
+
+        # Nothing to do once the issue is extracted.
+        self.assertIsNone(self.cache.open_issue(self.issue))
+
+    def test_changed_archive(self):
+        old_path = self.cache.extract(self.issue)
+        st = os.stat(self.issue.file)
+        os.utime(self.issue.file, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+        self.assertIsNone(self.cache.get_page_path(self.issue, 0))
+        self.cache.extract(self.issue)
+        self.assertIsNotNone(self.cache.get_page_path(self.issue, 0))
+        self.assertFalse(os.path.exists(old_path))
+
+    def test_evicts_least_recently_read(self):
+        # Each issue gets its own archive.
+        issues = []
+        for n in range(3):
+            directory = os.path.join(self.tmp.name, str(n))
+            os.makedirs(directory)
+            issues.append(FakeIssue(n, create_test_archive(directory)))
+
+        paths = [self.cache.extract(issue) for issue in issues[:2]]
+        size = sum(e[1] for e in self.cache.entries())
+        self.cache.max_bytes = size
+        # Reading the first issue makes the second the least recently read.
+        for n, path in enumerate(paths):
+            os.utime(os.path.join(path, 'index.json'), (n, n))
+        self.cache.get_page_path(issues[0], 0)
+
+        self.cache.extract(issues[2])
+        self.assertIsNotNone(self.cache.get_page_path(issues[0], 0))
+        self.assertIsNone(self.cache.get_page_path(issues[1], 0))
+        self.assertIsNotNone(self.cache.get_page_path(issues[2], 0))
+
+    def test_removes_stale_tmp(self):
+        os.makedirs(self.cache.directory)
+        stale = os.path.join(self.cache.directory, '.tmp-stale')
+        running = os.path.join(self.cache.directory, '.tmp-running')
+        for path in (stale, running):
+            os.makedirs(path)
+            with open(os.path.join(path, '00000.jpg'), 'wb') as f:
+                f.write(b'x' * 100)
+        os.utime(stale, (0, 0))
+
+        self.cache.extract(self.issue)
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(running))
@@ -0,0 +1,40 @@
+import datetime
+import io
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+
+from comics.models import Issue, Series
+from comics.utils.hotqueries import HOT_QUERIES, explain_query
+
+
+class HotQueriesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        series = Series.objects.create(cvid=1, name='Superman', slug='superman')
+        Issue.objects.create(cvid=1, slug='superman-1', file='/home/a.cbz',
+                             mod_ts=timezone.now(), number='001',
+                             date=datetime.date(2019, 1, 1), series=series)
+
+    def test_explain_query(self):
+        for name in HOT_QUERIES:
+            self.assertTrue(explain_query(name))
+
+    def test_uses_indexes(self):
+        self.assertIn('issue_file_idx', explain_query('reconcile'))
+        self.assertIn('issue_read_idx', explain_query('read-count'))
+        self.assertIn('issue_import_date_idx', explain_query('recent'))
+
+    def test_explainqueries(self):
+        out = io.StringIO()
+        call_command('explainqueries', 'recent', 'reconcile', stdout=out)
+        self.assertIn('recent:', out.getvalue())
+        self.assertIn('reconcile:', out.getvalue())
+        self.assertNotIn('series-list:', out.getvalue())
+
+    def test_unknown_query(self):
+        with self.assertRaises(CommandError):
+            call_command('explainqueries', 'nope', stdout=io.StringIO())
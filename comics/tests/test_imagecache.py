@@ -0,0 +1,36 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from comics.utils.imagecache import DiskCache
+
+
+class TestDiskCache(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(self.tmp.name, 100)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_get_set(self):
+        key = self.cache.make_key('/home/a.cbz', 1, 'jpeg')
+        self.assertIsNone(self.cache.get(key))
+        self.cache.set(key, b'page')
+        self.assertEqual(self.cache.get(key), b'page')
+
+    def test_evicts_least_recently_used(self):
+        keys = [self.cache.make_key(n) for n in range(3)]
+        for n, key in enumerate(keys):
+            self.cache.set(key, b'x' * 30)
+            # Make sure the entries have distinct access times.
+            os.utime(self.cache.path(key), (n, n))
+        # Reading the oldest entry makes it the most recently used.
+        self.cache.get(keys[0])
+        self.cache.set(self.cache.make_key('new'), b'x' * 30)
+
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertLessEqual(self.cache.scan_size(), 100)
@@ -0,0 +1,87 @@
+import io
+import tempfile
+
+from django.test import SimpleTestCase
+from PIL import Image, features
+
+from comics.tests.test_api_issues import create_test_archive
+from comics.utils.imageheader import (get_image_size, get_image_type,
+                                      image_type_from_name, pack_dimensions,
+                                      read_page_dimensions, unpack_dimensions)
+
+
+class CountingReader(io.BytesIO):
+    ''' Records how far into the image the parser read '''
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read = self.tell()
+        return data
+
+
+def save_image(fmt, size=(321, 654), mode='RGB', **params):
+    output = io.BytesIO()
+    Image.new(mode, size, 'red').save(output, fmt, **params)
+    return output.getvalue()
+
+
+class TestImageHeader(SimpleTestCase):
+
+    def assertSize(self, data, size=(321, 654)):
+        f = CountingReader(data)
+        self.assertEqual(get_image_size(f), size)
+        return f.bytes_read
+
+    def test_jpeg(self):
+        data = save_image('JPEG')
+        self.assertLess(self.assertSize(data), 1024)
+
+    def test_jpeg_progressive(self):
+        self.assertSize(save_image('JPEG', progressive=True))
+
+    def test_jpeg_with_exif(self):
+        # A large EXIF segment before the frame is skipped over.
+        exif = Image.Exif()
+        exif[0x010E] = 'x' * 20000
+        self.assertSize(save_image('JPEG', exif=exif.tobytes()))
+
+    def test_png(self):
+        self.assertEqual(self.assertSize(save_image('PNG')), 32)
+
+    def test_gif(self):
+        self.assertSize(save_image('GIF', mode='P'))
+
+    def test_webp(self):
+        if not features.check('webp'):
+            self.skipTest('Pillow was built without WebP support')
+        self.assertSize(save_image('WEBP'))
+        self.assertSize(save_image('WEBP', lossless=True))
+        self.assertSize(save_image('WEBP', mode='RGBA'))
+
+    def test_unknown(self):
+        self.assertIsNone(get_image_size(io.BytesIO(b'not an image')))
+        self.assertIsNone(get_image_size(io.BytesIO(b'\xff\xd8\xff\xda')))
+
+    def test_image_type(self):
+        self.assertEqual(get_image_type(save_image('JPEG')[:16]), 'jpeg')
+        self.assertEqual(get_image_type(save_image('PNG')[:16]), 'png')
+        self.assertEqual(get_image_type(save_image('GIF', mode='P')[:16]), 'gif')
+        self.assertIsNone(get_image_type(b'not an image'))
+        self.assertEqual(image_type_from_name('Batman/001.JPG'), 'jpeg')
+        self.assertIsNone(image_type_from_name('ComicInfo.xml'))
+
+    def test_pack_dimensions(self):
+        dimensions = [(800, 1200), (1600, 1200), (0, 0)]
+        data = pack_dimensions(dimensions)
+        self.assertEqual(len(data), 12)
+        self.assertEqual(unpack_dimensions(data), dimensions)
+        self.assertEqual(unpack_dimensions(b''), [])
+
+    def test_read_page_dimensions(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = create_test_archive(tmp, page_count=2, size=(640, 480))
+            self.assertEqual(read_page_dimensions(path, ['000.jpg', '001.jpg']),
+                             [(640, 480), (640, 480)])
+            # Missing pages don't stop the rest being read.
+            self.assertEqual(read_page_dimensions(path, ['missing.jpg']),
+                             [(0, 0)])
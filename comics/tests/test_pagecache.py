@@ -0,0 +1,78 @@
+import tempfile
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from comics.utils.imagecache import DiskCache
+from comics.utils.pagecache import (MemoryCache, PageCache, RedisCache,
+                                    get_page_cache)
+
+
+class TestMemoryCache(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = MemoryCache(100)
+
+    def test_evicts_least_recently_used(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, b'x' * 30)
+        # Reading the oldest entry makes it the most recently used.
+        self.cache.get('a')
+        self.cache.set('d', b'x' * 30)
+
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.size, 90)
+        self.assertEqual(self.cache.stats.as_dict(),
+                         {'hits': 2, 'misses': 1, 'evictions': 1})
+
+    def test_skips_oversized_entries(self):
+        self.cache.set('a', b'x' * 101)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.size, 0)
+
+    def test_replace_entry(self):
+        self.cache.set('a', b'x' * 30)
+        self.cache.set('a', b'x' * 20)
+        self.assertEqual(self.cache.size, 20)
+
+
+class TestPageCache(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.shared = DiskCache(self.tmp.name, 1000)
+        self.cache = PageCache(MemoryCache(100), self.shared)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key(self):
+        key = self.cache.make_key(1, 2, 'original', 1558000000.0)
+        self.assertNotEqual(key, self.cache.make_key(1, 2, 'original',
+                                                     1558000001.0))
+        self.assertNotEqual(key, self.cache.make_key(1, 2, '400-q80.jpeg',
+                                                     1558000000.0))
+
+    def test_shared_hits_fill_memory(self):
+        key = self.cache.make_key(1, 0, 'original', 0)
+        self.assertIsNone(self.cache.get(key))
+        self.shared.set(key, b'page')
+
+        self.assertEqual(self.cache.get(key), b'page')
+        self.assertEqual(self.cache.memory.get(key), b'page')
+        stats = self.cache.stats()
+        self.assertEqual(stats['memory']['misses'], 2)
+        self.assertEqual(stats['shared'],
+                         {'hits': 1, 'misses': 1, 'evictions': 0})
+
+    def test_set_fills_both_tiers(self):
+        key = self.cache.make_key(1, 0, 'original', 0)
+        self.cache.set(key, b'page')
+        self.assertEqual(self.cache.memory.get(key), b'page')
+        self.assertEqual(self.shared.get(key), b'page')
+
+    @override_settings(PAGE_CACHE_BACKEND='redis')
+    def test_redis_backend(self):
+        # The Redis client connects lazily, so no server is needed here.
+        self.assertIsInstance(get_page_cache().shared, RedisCache)
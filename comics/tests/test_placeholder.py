@@ -0,0 +1,92 @@
+import os
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from PIL import Image
+
+from comics.utils.placeholder import (BASE83_CHARS, blurhash_encode,
+                                      create_cover_placeholder,
+                                      create_placeholder, dominant_colors)
+from comics.utils.utils import create_cover_renditions
+
+
+def decode83(text):
+    value = 0
+    for char in text:
+        value = value * 83 + BASE83_CHARS.index(char)
+    return value
+
+
+class TestPlaceholder(SimpleTestCase):
+
+    def test_blurhash_solid_color(self):
+        pixels = np.full((8, 6, 3), (200, 40, 10), dtype=np.uint8)
+        blurhash = blurhash_encode(pixels, 4, 3)
+
+        # Size flag, max AC value, DC color, then two characters per AC.
+        self.assertEqual(len(blurhash), 1 + 1 + 4 + 2 * 11)
+        self.assertEqual(decode83(blurhash[0]), 3 + 2 * 9)
+        self.assertEqual(decode83(blurhash[2:6]), (200 << 16) + (40 << 8) + 10)
+
+    def test_blurhash_detail(self):
+        pixels = np.zeros((8, 8, 3), dtype=np.uint8)
+        pixels[:, 4:] = 255
+        blurhash = blurhash_encode(pixels, 2, 1)
+
+        self.assertEqual(len(blurhash), 8)
+        # The left to right change shows up in the first horizontal AC.
+        self.assertNotEqual(decode83(blurhash[6:8]), 9 * 19 * 19 + 9 * 19 + 9)
+
+    def test_dominant_colors(self):
+        pixels = np.zeros((10, 10, 3), dtype=np.uint8)
+        pixels[:7] = (250, 0, 0)
+        pixels[7:, :6] = (0, 0, 250)
+        pixels[7:, 6:] = (250, 250, 250)
+
+        self.assertEqual(dominant_colors(pixels, 3),
+                         ['#fa0000', '#0000fa', '#fafafa'])
+
+    def test_dominant_colors_single_color(self):
+        pixels = np.full((4, 4, 3), 128, dtype=np.uint8)
+        self.assertEqual(dominant_colors(pixels, 3), ['#808080'])
+
+    def test_create_placeholder(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cover.jpg')
+            Image.new('RGB', (400, 600), (0, 128, 255)).save(path)
+
+            blurhash, colors = create_placeholder(path)
+
+        self.assertTrue(blurhash)
+        self.assertLessEqual(len(blurhash), 64)
+        self.assertEqual(len(colors.split(',')), 1)
+        self.assertLessEqual(len(colors), 64)
+
+    def test_create_placeholder_bad_image(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cover.jpg')
+            with open(path, 'wb') as f:
+                f.write(b'not an image')
+
+            self.assertEqual(create_placeholder(path), ('', ''))
+            self.assertEqual(create_placeholder(path + '.missing'), ('', ''))
+
+    @override_settings(COVER_RENDITION_WIDTHS=(32, 64),
+                       COVER_RENDITION_FORMATS=('jpg',))
+    def test_create_cover_placeholder(self):
+        image = Image.new('RGB', (200, 300), (255, 255, 0))
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                path = os.path.join(media_root, 'page.png')
+                image.save(path)
+                with open(path, 'rb') as f:
+                    cover_hash = create_cover_renditions(f.read(), 64, 96)
+
+                blurhash, colors = create_cover_placeholder(cover_hash)
+
+                self.assertEqual(create_cover_placeholder(''), ('', ''))
+
+        self.assertTrue(blurhash)
+        self.assertEqual(colors, '#ffff00')
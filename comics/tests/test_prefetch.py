@@ -0,0 +1,104 @@
+from collections import namedtuple
+import os
+import tempfile
+import threading
+from concurrent.futures import wait
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from comics.tests.test_api_issues import create_test_archive
+from comics.utils.prefetch import PagePrefetcher
+from comics.utils.pagecache import get_page_cache
+from comics.utils.reader import page_rendition
+
+
+FakeIssue = namedtuple('FakeIssue', ('id', 'file', 'page_count'))
+ISSUE_A = FakeIssue(1, '/a.cbz', 20)
+ISSUE_B = FakeIssue(2, '/b.cbz', 20)
+
+
+class TestPagePrefetcher(SimpleTestCase):
+
+    def setUp(self):
+        self.warmed = []
+        self.prefetcher = PagePrefetcher(3, 1, warm=self.warm)
+
+    def tearDown(self):
+        self.prefetcher.shutdown()
+
+    def warm(self, issue, page, **options):
+        self.warmed.append((issue.file, page, options))
+
+    def test_warms_next_pages(self):
+        futures = self.prefetcher.page_requested(ISSUE_A, 4, width=400)
+        wait(futures)
+        self.assertEqual(self.warmed, [('/a.cbz', 5, {'width': 400}),
+                                       ('/a.cbz', 6, {'width': 400}),
+                                       ('/a.cbz', 7, {'width': 400})])
+
+    def test_stops_at_last_page(self):
+        wait(self.prefetcher.page_requested(ISSUE_A, 18))
+        self.assertEqual([p for f, p, o in self.warmed], [19])
+
+    def test_tracks_reading_direction(self):
+        wait(self.prefetcher.page_requested(ISSUE_A, 10))
+        self.warmed.clear()
+        # Paging backwards warms the previous pages instead.
+        wait(self.prefetcher.page_requested(ISSUE_A, 9))
+        self.assertEqual([p for f, p, o in self.warmed], [8, 7, 6])
+
+        # Each issue keeps its own direction.
+        self.warmed.clear()
+        wait(self.prefetcher.page_requested(ISSUE_B, 9))
+        self.assertEqual([p for f, p, o in self.warmed], [10, 11, 12])
+
+    def test_cancels_stale_prefetches(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def warm(issue, page, **options):
+            started.set()
+            release.wait(5)
+            self.warmed.append(page)
+
+        self.prefetcher.warm = warm
+
+        # The first page blocks the only worker, so the rest stay queued.
+        stale = self.prefetcher.page_requested(ISSUE_A, 0)
+        started.wait(5)
+        current = self.prefetcher.page_requested(ISSUE_A, 10)
+        release.set()
+        wait(stale + current)
+
+        self.assertTrue(all(f.cancelled() for f in stale[1:]))
+        # The page already being read when the reader jumped ahead still
+        # finishes, but nothing else from the stale request is warmed.
+        self.assertEqual(sorted(self.warmed), [1, 11, 12, 13])
+
+    def test_disabled(self):
+        self.prefetcher.count = 0
+        self.assertEqual(self.prefetcher.page_requested(ISSUE_A, 0), [])
+
+
+class TestWarmPage(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.prefetcher = PagePrefetcher(2, 2)
+
+    def tearDown(self):
+        self.prefetcher.shutdown()
+        self.tmp.cleanup()
+
+    def test_warms_page_cache(self):
+        issue = FakeIssue(1, create_test_archive(self.tmp.name, page_count=3), 3)
+        cache_dir = os.path.join(self.tmp.name, 'cache')
+        with override_settings(PAGE_CACHE_DIR=cache_dir):
+            wait(self.prefetcher.page_requested(issue, 0, width=200))
+            cache = get_page_cache()
+            rendition = page_rendition(200, 80, 'jpeg')
+            for page in (1, 2):
+                key = cache.make_key(issue.id, page, rendition,
+                                     os.path.getmtime(issue.file))
+                self.assertIsNotNone(cache.shared.get(key))
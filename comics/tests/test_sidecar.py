@@ -0,0 +1,130 @@
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from PIL import Image
+
+from comics.models import Issue, Series
+from comics.tasks import convert_library_pages_task
+from comics.tests.test_api_issues import create_test_archive
+from comics.utils.sidecar import PageSidecar, convert_library, get_sidecar
+from thwip.celery import app as celery_app
+
+
+class TestPageSidecar(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.issue = SimpleNamespace(id=1, file=create_test_archive(self.tmp.name))
+        self.sidecar = PageSidecar(os.path.join(self.tmp.name, 'sidecar'),
+                                   (400, 1600), ('jpeg', 'webp'))
+
+    def test_convert(self):
+        self.assertFalse(self.sidecar.has_issue(self.issue))
+        self.sidecar.convert(self.issue)
+        self.assertTrue(self.sidecar.has_issue(self.issue))
+
+        path = self.sidecar.get_page_path(self.issue, 2, width=400,
+                                          image_format='webp')
+        img = Image.open(path)
+        self.assertEqual(img.format, 'WEBP')
+        self.assertEqual(img.size, (400, 600))
+
+        # Pages are never upscaled, as with the page endpoint.
+        path = self.sidecar.get_page_path(self.issue, 0, width=1600,
+                                          image_format='jpeg')
+        self.assertEqual(Image.open(path).size, (800, 1200))
+
+    def test_unconverted_renditions(self):
+        self.sidecar.convert(self.issue)
+        for options in ({'width': 800, 'image_format': 'jpeg'},
+                        {'width': 400, 'image_format': 'avif'},
+                        {'width': 400, 'quality': 50, 'image_format': 'jpeg'},
+                        {'width': None, 'image_format': None}):
+            self.assertIsNone(self.sidecar.get_page_path(self.issue, 0, **options))
+        self.assertIsNone(self.sidecar.get_page_path(self.issue, 3, width=400,
+                                                     image_format='jpeg'))
+
+    def test_changed_archive(self):
+        self.sidecar.convert(self.issue)
+        first = self.sidecar.issue_dir(self.issue)
+
+        st = os.stat(self.issue.file)
+        os.utime(self.issue.file, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        self.assertFalse(self.sidecar.has_issue(self.issue))
+
+        self.sidecar.convert(self.issue)
+        self.assertFalse(os.path.exists(first))
+        self.assertEqual(os.listdir(self.sidecar.directory),
+                         [os.path.basename(self.sidecar.issue_dir(self.issue))])
+
+    def test_prune(self):
+        self.sidecar.convert(self.issue)
+        self.sidecar.convert(SimpleNamespace(id=2, file=self.issue.file))
+        self.sidecar.prune([2])
+
+        self.assertFalse(self.sidecar.has_issue(self.issue))
+        self.assertTrue(self.sidecar.has_issue(SimpleNamespace(id=2, file=self.issue.file)))
+
+    def test_failed_convert_removes_tmp(self):
+        with mock.patch.object(PageSidecar, 'convert_page',
+                               side_effect=ValueError('Bad page')):
+            with self.assertRaises(ValueError):
+                self.sidecar.convert(self.issue)
+        self.assertEqual(os.listdir(self.sidecar.directory), [])
+
+    def test_prune_stale_tmp(self):
+        os.makedirs(self.sidecar.directory)
+        stale = os.path.join(self.sidecar.directory, '.tmp-stale')
+        running = os.path.join(self.sidecar.directory, '.tmp-running')
+        os.makedirs(stale)
+        os.makedirs(running)
+        os.utime(stale, (0, 0))
+        self.sidecar.prune([])
+
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(running))
+
+    def test_convert_library(self):
+        issues = [self.issue, SimpleNamespace(id=2, file=self.issue.file),
+                  SimpleNamespace(id=3, file=os.path.join(self.tmp.name, 'missing.cbz'))]
+        with override_settings(SIDECAR_DIR=self.sidecar.directory,
+                               SIDECAR_PAGE_WIDTHS=(400,)):
+            self.assertEqual(convert_library(issues, workers=1, delay=0), 2)
+            self.assertTrue(get_sidecar().has_issue(self.issue))
+
+            # Converted issues are skipped, unless forced.
+            self.assertEqual(convert_library(issues[:2], workers=1), 0)
+            self.assertEqual(convert_library(issues[:2], workers=1, force=True), 2)
+
+
+class TestConvertPagesTask(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        series = Series.objects.create(cvid='1', cvurl='http://1.com',
+                                       name='Superman', slug='superman')
+        self.issue = Issue.objects.create(cvid='1', cvurl='http://1.com', slug='superman-1',
+                                          file=create_test_archive(self.tmp.name),
+                                          mod_ts=timezone.now(), date=timezone.now().date(),
+                                          number='1', series=series, page_count=3)
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+
+    def test_convert_library_pages_task(self):
+        with override_settings(SIDECAR_DIR=os.path.join(self.tmp.name, 'sidecar'),
+                               SIDECAR_PAGE_WIDTHS=(400,)):
+            os.makedirs(os.path.join(self.tmp.name, 'sidecar', '999-1'))
+            self.assertEqual(convert_library_pages_task(), 1)
+            self.assertTrue(get_sidecar().has_issue(self.issue))
+            # Issues no longer in the library are dropped.
+            self.assertFalse(os.path.exists(
+                os.path.join(self.tmp.name, 'sidecar', '999-1')))
+
+            self.assertEqual(convert_library_pages_task(), 0)
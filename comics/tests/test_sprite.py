@@ -0,0 +1,25 @@
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from comics.utils.sprite import sprite_layout, sprite_tile_size
+
+
+class TestSprite(SimpleTestCase):
+
+    @override_settings(COVER_RENDITION_WIDTHS=(160, 320, 640))
+    def test_sprite_tile_size(self):
+        self.assertEqual(sprite_tile_size(), (160, 240))
+        self.assertEqual(sprite_tile_size(200), (320, 480))
+        self.assertEqual(sprite_tile_size(1000), (640, 960))
+
+    def test_sprite_layout(self):
+        size, offsets = sprite_layout(12, (10, 15))
+        self.assertEqual(size, (100, 30))
+        self.assertEqual(offsets[0], (0, 0))
+        self.assertEqual(offsets[9], (90, 0))
+        self.assertEqual(offsets[11], (10, 15))
+
+    def test_sprite_layout_short_page(self):
+        self.assertEqual(sprite_layout(3, (10, 15)),
+                         ((30, 15), [(0, 0), (10, 0), (20, 0)]))
+        self.assertEqual(sprite_layout(0, (10, 15)), ((10, 15), []))
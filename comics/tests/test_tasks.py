@@ -1,13 +1,22 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
+from types import SimpleNamespace
+from unittest import mock
 
+from celery.exceptions import Retry
 from django.conf import settings
 from django.test import TestCase
 from django.test.utils import override_settings
+from django.utils import timezone
 from django.utils.text import slugify
 
-from comics.models import Issue, Settings, Publisher, Creator
-from comics.tasks import import_comic_files_task
+from comics.models import (Creator, ImportBatch, ImportRun, Issue,
+                           Publisher, Settings)
+from comics.serializers import ImportRunSerializer
+from comics.tasks import (acquire_import_run, finalize_import_task,
+                          import_comic_batch_task, import_comic_files_task,
+                          start_import_chord)
+from thwip.celery import app as celery_app
 
 
 class TestTasks(TestCase):
@@ -18,6 +27,13 @@ class TestTasks(TestCase):
         cls. settings = Settings.objects.create(comics_directory=test_data_dir,
                                                 api_key='27431e6787042105bd3e47e169a624521f89f3a4')
 
+    def setUp(self):
+        # Run the import chord in-process instead of through the broker.
+        celery_app.conf.task_always_eager = True
+
+    def tearDown(self):
+        celery_app.conf.task_always_eager = False
+
     @override_settings(CELERY_EAGER_PROPAGATES_EXCEPTIONS=True,
                        CELERY_ALWAYS_EAGER=True,
                        BROKER_BACKEND='memory')
@@ -50,3 +66,169 @@ class TestTasks(TestCase):
 
         publisher = Publisher.objects.get(slug='charlton')
         publisher.delete()
+
+
+class TestImportRuns(TestCase):
+
+    def test_acquire_import_run(self):
+        run = acquire_import_run('/comics', 'task-1')
+        self.assertEqual(run.status, ImportRun.RUNNING)
+        self.assertEqual(run.task_id, 'task-1')
+
+    def test_acquire_import_run_locked(self):
+        acquire_import_run('/comics', 'task-1')
+        self.assertIsNone(acquire_import_run('/comics', 'task-2'))
+        # A different library isn't blocked.
+        self.assertIsNotNone(acquire_import_run('/other', 'task-3'))
+
+    def test_acquire_import_run_resumes_stale_run(self):
+        run = acquire_import_run('/comics', 'task-1')
+        ImportRun.objects.filter(id=run.id).update(
+            heartbeat=timezone.now() - timedelta(hours=1))
+
+        resumed = acquire_import_run('/comics', 'task-2')
+        self.assertEqual(resumed.id, run.id)
+        self.assertEqual(resumed.task_id, 'task-2')
+
+    def test_finalize_import(self):
+        run = ImportRun.objects.create(directory='/comics', file_count=3)
+        ImportBatch.objects.create(run=run, number=0, imported_count=1,
+                                   status=ImportBatch.DONE)
+        ImportBatch.objects.create(run=run, number=1, imported_count=1,
+                                   status=ImportBatch.DONE)
+
+        result = finalize_import_task([1, 1], run.id)
+        run.refresh_from_db()
+
+        self.assertEqual(result['skipped'], 1)
+        self.assertEqual(run.imported_count, 2)
+        self.assertEqual(run.status, ImportRun.FINISHED)
+        # The lock is released once the run is finished.
+        self.assertIsNotNone(acquire_import_run('/comics', 'task-2'))
+
+    def test_import_run_progress(self):
+        run = ImportRun.objects.create(directory='/comics', file_count=4)
+        ImportBatch.objects.create(run=run, number=0, processed_count=2,
+                                   imported_count=2, probe_time=1.5,
+                                   db_time=0.5, status=ImportBatch.DONE)
+        ImportBatch.objects.create(run=run, number=1, processed_count=1,
+                                   probe_time=0.5, status=ImportBatch.RUNNING)
+
+        data = ImportRunSerializer(run).data
+        self.assertEqual(data['processed_count'], 3)
+        self.assertEqual(data['imported_count'], 2)
+        self.assertEqual(data['timings']['probe'], 2.0)
+        self.assertEqual(data['timings']['db'], 0.5)
+        self.assertEqual(data['queue'], {'pending': 0, 'running': 1,
+                                         'done': 1, 'failed': 0})
+
+    @mock.patch('comics.tasks.ComicImporter')
+    def test_failed_batch(self, importer_class):
+        importer_class().importFileList.side_effect = OSError('Unreadable')
+        run = ImportRun.objects.create(directory='/comics', file_count=1)
+        batch = ImportBatch.objects.create(run=run, number=0, files='/a.cbz')
+
+        result = import_comic_batch_task.apply(
+            args=(batch.id,), retries=import_comic_batch_task.max_retries)
+        batch.refresh_from_db()
+
+        self.assertEqual(result.get(), 0)
+        self.assertEqual(batch.status, ImportBatch.FAILED)
+
+    @mock.patch('comics.tasks.ComicImporter')
+    def test_failed_batch_finalizes_run(self, importer_class):
+        importer_class().importFileList.side_effect = OSError('Unreadable')
+        run = ImportRun.objects.create(
+            directory='/comics', file_count=2,
+            heartbeat=timezone.now() - timedelta(hours=1))
+        ImportBatch.objects.create(run=run, number=0, files='/a.cbz')
+        ImportBatch.objects.create(run=run, number=1, files='/b.cbz')
+
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+        start_import_chord(SimpleNamespace(directory_path='/comics'),
+                           'task-2', import_comic_batch_task)
+        run.refresh_from_db()
+
+        # Every batch ran out of retries, but the run was still finished,
+        # so it no longer holds the lock.
+        self.assertEqual(run.status, ImportRun.FINISHED)
+        self.assertEqual(run.importbatch_set.filter(
+            status=ImportBatch.FAILED).count(), 2)
+
+    def create_stale_run(self):
+        return ImportRun.objects.create(
+            directory='/comics', file_count=3,
+            heartbeat=timezone.now() - timedelta(hours=1))
+
+    @mock.patch('comics.tasks.chord')
+    def test_resume_skips_queued_batches(self, chord):
+        run = self.create_stale_run()
+        ImportBatch.objects.create(run=run, number=0, status=ImportBatch.DONE,
+                                   queued=timezone.now())
+        running = ImportBatch.objects.create(
+            run=run, number=1, status=ImportBatch.RUNNING,
+            queued=timezone.now())
+        ImportBatch.objects.create(run=run, number=2, queued=timezone.now())
+
+        batch_task = mock.Mock()
+        sent = start_import_chord(SimpleNamespace(directory_path='/comics'),
+                                  'task-2', batch_task)
+
+        # The queued batch is still in the broker, so only the batch the
+        # dead worker was running is sent again.
+        self.assertEqual(sent, 1)
+        batch_task.s.assert_called_once_with(running.id)
+
+    @mock.patch('comics.tasks.chord')
+    def test_resume_waits_for_queued_batches(self, chord):
+        run = self.create_stale_run()
+        ImportBatch.objects.create(run=run, number=0, queued=timezone.now())
+
+        sent = start_import_chord(SimpleNamespace(directory_path='/comics'),
+                                  'task-2', mock.Mock())
+        run.refresh_from_db()
+
+        self.assertEqual(sent, 0)
+        chord.assert_not_called()
+        self.assertEqual(run.status, ImportRun.RUNNING)
+
+    @mock.patch('comics.tasks.chord')
+    def test_resume_resends_lost_batches(self, chord):
+        run = self.create_stale_run()
+        lost = ImportBatch.objects.create(
+            run=run, number=0, queued=timezone.now() - timedelta(hours=1))
+
+        batch_task = mock.Mock()
+        sent = start_import_chord(SimpleNamespace(directory_path='/comics'),
+                                  'task-2', batch_task)
+
+        # Queued longer than the lock timeout, so gone from the broker.
+        self.assertEqual(sent, 1)
+        batch_task.s.assert_called_once_with(lost.id)
+
+    def test_finalize_waits_for_outstanding_batches(self):
+        run = ImportRun.objects.create(directory='/comics', file_count=2)
+        ImportBatch.objects.create(run=run, number=0, status=ImportBatch.DONE)
+        ImportBatch.objects.create(run=run, number=1, queued=timezone.now())
+
+        with self.assertRaises(Retry):
+            finalize_import_task([1], run.id)
+        run.refresh_from_db()
+        self.assertEqual(run.status, ImportRun.RUNNING)
+
+    def test_finalize_fails_lost_batches(self):
+        run = ImportRun.objects.create(directory='/comics', file_count=2)
+        ImportBatch.objects.create(run=run, number=0, status=ImportBatch.DONE,
+                                   imported_count=1)
+        lost = ImportBatch.objects.create(run=run, number=1,
+                                          queued=timezone.now())
+
+        result = finalize_import_task.apply(
+            args=([1], run.id), retries=finalize_import_task.max_retries)
+        run.refresh_from_db()
+        lost.refresh_from_db()
+
+        self.assertEqual(result.get()['failed'], 1)
+        self.assertEqual(lost.status, ImportBatch.FAILED)
+        self.assertEqual(run.status, ImportRun.FINISHED)
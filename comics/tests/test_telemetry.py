@@ -0,0 +1,37 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from comics.utils.telemetry import PhaseTimer, get_current_timer, timed
+
+
+@timed('comicvine')
+def fake_request():
+    pass
+
+
+class TestPhaseTimer(SimpleTestCase):
+
+    @mock.patch('comics.utils.telemetry.time.monotonic')
+    def test_nested_phases(self, monotonic):
+        monotonic.side_effect = [0, 2, 5, 6]
+        timer = PhaseTimer()
+        with timer:
+            timer.start('db')
+            # The ComicVine time shouldn't also count as DB time.
+            fake_request()
+            timer.stop()
+
+        self.assertEqual(timer.timings['db'], 3)
+        self.assertEqual(timer.timings['comicvine'], 3)
+
+    def test_timer_only_active_in_context(self):
+        timer = PhaseTimer()
+        with timer:
+            self.assertIs(get_current_timer(), timer)
+        self.assertIsNone(get_current_timer())
+
+    def test_fields(self):
+        timer = PhaseTimer()
+        self.assertEqual(timer.fields('probe', 'db'),
+                         {'probe_time': 0.0, 'db_time': 0.0})
@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase
+
+from comics.utils.tiles import level_grid, level_size, max_level, tile_box
+
+
+class TestTiles(SimpleTestCase):
+
+    def test_max_level(self):
+        self.assertEqual(max_level(1, 1), 0)
+        self.assertEqual(max_level(2, 1), 1)
+        self.assertEqual(max_level(800, 1200), 11)
+        self.assertEqual(max_level(2048, 1024), 11)
+        self.assertEqual(max_level(2049, 1024), 12)
+
+    def test_level_size(self):
+        self.assertEqual(level_size(800, 1200, 11), (800, 1200))
+        self.assertEqual(level_size(800, 1200, 10), (400, 600))
+        # Odd sizes round up, and nothing goes below a pixel.
+        self.assertEqual(level_size(801, 1201, 10), (401, 601))
+        self.assertEqual(level_size(800, 1200, 0), (1, 1))
+
+    def test_level_grid(self):
+        self.assertEqual(level_grid((800, 1200)), (4, 5))
+        self.assertEqual(level_grid((254, 254)), (1, 1))
+        self.assertEqual(level_grid((255, 1)), (2, 1))
+
+    def test_tile_box(self):
+        self.assertEqual(tile_box((800, 1200), 0, 0), (0, 0, 255, 255))
+        self.assertEqual(tile_box((800, 1200), 1, 1), (253, 253, 509, 509))
+        self.assertEqual(tile_box((800, 1200), 3, 4), (761, 1015, 800, 1200))
+        self.assertEqual(tile_box((100, 150), 0, 0), (0, 0, 100, 150))
@@ -1,6 +1,16 @@
+import io
+import os
+import tempfile
+
 from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from PIL import Image
 
-from comics.utils.utils import create_series_sortname
+from comics.utils.utils import (cover_rendition_path, create_cover_renditions,
+                                create_import_batches, create_series_sortname,
+                                issue_sort_number, negotiate_cover_format,
+                                negotiate_image_format, parse_accept,
+                                UNNUMBERED_SORT_NUMBER)
 
 
 class UtilTest(SimpleTestCase):
@@ -8,3 +18,59 @@ class UtilTest(SimpleTestCase):
     def test_create_series_sortname(self):
         sort_name = create_series_sortname('The Avengers')
         self.assertEqual('Avengers, The', sort_name)
+
+    def test_issue_sort_number(self):
+        numbers = ['Annual 1', '010.5', '002', '-001', '001/2', '½', '010']
+        self.assertEqual(sorted(numbers, key=issue_sort_number),
+                         ['-001', '001/2', '½', '002', '010', '010.5',
+                          'Annual 1'])
+        self.assertEqual(issue_sort_number(''), UNNUMBERED_SORT_NUMBER)
+
+    def test_create_import_batches(self):
+        filelist = ['/comics/a/1.cbz', '/comics/a/2.cbz', '/comics/b/1.cbz',
+                    '/comics/c/1.cbz', '/comics/c/2.cbz']
+        batches = create_import_batches(filelist, 2)
+        self.assertEqual(batches, [['/comics/a/1.cbz', '/comics/a/2.cbz'],
+                                   ['/comics/b/1.cbz'],
+                                   ['/comics/c/1.cbz', '/comics/c/2.cbz']])
+
+    @override_settings(COVER_RENDITION_WIDTHS=(32, 64),
+                       COVER_RENDITION_FORMATS=('jpg',))
+    def test_create_cover_renditions(self):
+        page = io.BytesIO()
+        Image.new('RGB', (1200, 1900), 'red').save(page, 'JPEG')
+
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                cover_hash = create_cover_renditions(page.getvalue(), 64, 96)
+            for width, height in ((32, 48), (64, 96)):
+                path = cover_rendition_path(cover_hash, width, 'jpg')
+                cover = Image.open(os.path.join(media_root, path))
+                self.assertEqual(cover.size, (width, height))
+                self.assertEqual(cover.format, 'JPEG')
+
+    def test_create_cover_renditions_bad_image(self):
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                cover_hash = create_cover_renditions(b'not an image', 64, 96)
+        self.assertEqual(cover_hash, '')
+
+    def test_parse_accept(self):
+        self.assertEqual(parse_accept('image/avif,image/webp;q=0.9, */*;q=0'),
+                         {'image/avif': 1.0, 'image/webp': 0.9, '*/*': 0.0})
+        self.assertEqual(parse_accept(None), {})
+
+    def test_negotiate_image_format(self):
+        formats = ('avif', 'webp')
+        self.assertEqual(negotiate_image_format('image/webp,image/avif', formats),
+                         'avif')
+        self.assertEqual(negotiate_image_format('image/avif;q=0,image/webp', formats),
+                         'webp')
+        self.assertIsNone(negotiate_image_format('image/*,*/*', formats))
+
+    @override_settings(COVER_RENDITION_FORMATS=('jpg', 'webp'))
+    def test_negotiate_cover_format(self):
+        self.assertEqual(negotiate_cover_format(None, 'image/avif,image/webp'),
+                         'webp')
+        self.assertEqual(negotiate_cover_format(None, '*/*'), 'jpg')
+        self.assertEqual(negotiate_cover_format('jpg', 'image/webp'), 'jpg')
@@ -0,0 +1,88 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from comics.models import Arc, Issue, Series
+from comics.utils.utils import issue_sort_number
+from comics.utils.warmup import get_next_issues, warm_next_issues
+from comics.views import ArcViewSet
+
+
+def create_issue(series, number, date, **kwargs):
+    return Issue.objects.create(
+        cvid=int(f'{series.id}{number}'), cvurl='http://1.com',
+        slug=f'{series.slug}-{number}', file=f'/home/{series.slug}-{number}.cbz',
+        mod_ts=timezone.now(), date=date, number=number,
+        sort_number=issue_sort_number(number), series=series,
+        page_count=20, **kwargs)
+
+
+@override_settings(PAGE_WARMUP_THRESHOLD=0.8)
+class TestWarmup(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        superman = Series.objects.create(
+            cvid='1', cvurl='http://1.com', name='Superman', slug='superman')
+        batman = Series.objects.create(
+            cvid='2', cvurl='http://1.com', name='Batman', slug='batman')
+        jan = datetime.date(2019, 1, 1)
+        feb = datetime.date(2019, 2, 1)
+        cls.superman_1 = create_issue(superman, '001', jan)
+        cls.superman_2 = create_issue(superman, '002', jan)
+        cls.superman_3 = create_issue(superman, '003', feb)
+        cls.batman_1 = create_issue(batman, '001', jan)
+
+        arc = Arc.objects.create(cvid='1', cvurl='http://1.com',
+                                 name='Crossover', slug='crossover')
+        for issue in (cls.superman_1, cls.batman_1, cls.superman_3):
+            issue.arcs.add(arc)
+
+    def test_next_in_series(self):
+        self.assertEqual(get_next_issues(self.superman_2), [self.superman_3])
+        self.assertEqual(get_next_issues(self.superman_3), [])
+
+    def test_next_in_arc(self):
+        # The arc is ordered by date, then series, then number.
+        self.assertEqual(get_next_issues(self.superman_1),
+                         [self.superman_2, self.batman_1])
+        self.assertEqual(get_next_issues(self.batman_1), [self.superman_3])
+
+    def test_next_in_arc_by_title(self):
+        # Series created in reverse title order, so ids and titles disagree.
+        jan = datetime.date(2019, 1, 1)
+        arc = Arc.objects.create(cvid='2', cvurl='http://1.com',
+                                 name='Titles', slug='titles')
+        issues = []
+        for cvid, name in ((3, 'Zatanna'), (4, 'Aquaman')):
+            series = Series.objects.create(
+                cvid=cvid, cvurl='http://1.com', name=name, slug=name.lower(),
+                sort_title=name)
+            issue = create_issue(series, '001', jan)
+            issue.arcs.add(arc)
+            issues.append(issue)
+        zatanna, aquaman = issues
+
+        self.assertEqual(list(ArcViewSet().get_issue_queryset(arc)),
+                         [aquaman, zatanna])
+        self.assertEqual(get_next_issues(aquaman), [zatanna])
+        self.assertEqual(get_next_issues(zatanna), [])
+
+    @mock.patch('comics.utils.warmup.get_prefetcher')
+    def test_warms_past_threshold(self, get_prefetcher):
+        issue = self.superman_2
+        issue.leaf = 15
+        self.assertEqual(len(warm_next_issues(issue, 10, 1)), 1)
+        get_prefetcher().prefetch_issue.assert_called_once_with(self.superman_3)
+
+        # Only the update that crosses the threshold warms the next issue.
+        get_prefetcher().prefetch_issue.reset_mock()
+        issue.leaf = 17
+        self.assertEqual(warm_next_issues(issue, 15, 1), [])
+        issue.leaf = 5
+        self.assertEqual(warm_next_issues(issue, 2, 1), [])
+        issue.status = 2
+        self.assertEqual(len(warm_next_issues(issue, 2, 1)), 1)
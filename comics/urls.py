@@ -1,11 +1,11 @@
 from django.conf import settings
 from django.conf.urls.static import static
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework import routers
 from rest_framework_jwt.views import obtain_jwt_token
 
-from comics.views import (ArcViewSet, IssueViewSet,
-                          PublisherViewSet, SeriesViewSet)
+from comics.views import (BINARY_RENDERERS, ArcViewSet, IssueViewSet,
+                          PublisherViewSet, SeriesViewSet, SpriteViewSet)
 
 
 router = routers.DefaultRouter()
@@ -13,9 +13,18 @@ router.register('arc', ArcViewSet)
 router.register('issue', IssueViewSet)
 router.register('publisher', PublisherViewSet)
 router.register('series', SeriesViewSet)
+router.register('sprite', SpriteViewSet, basename='sprite')
 
 app_name = 'api'
 urlpatterns = [
+    # Deep Zoom viewers add the tile path to the descriptor's Url as is,
+    # so tiles have no trailing slash, unlike the router's routes.
+    re_path(r'^api/issue/(?P<slug>[-\w]+)/page/(?P<page>[0-9]+)/tiles/'
+            r'(?P<level>[0-9]+)/(?P<column>[0-9]+)_(?P<row>[0-9]+)'
+            r'\.(?P<image_format>\w+)$',
+            IssueViewSet.as_view({'get': 'page_tile'},
+                                 renderer_classes=BINARY_RENDERERS),
+            name='issue-page-tile'),
     path('api/', include(router.urls)),
     path('api-token-auth/', obtain_jwt_token)
 ]
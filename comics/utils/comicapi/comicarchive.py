@@ -66,6 +66,17 @@ class ZipArchiver:
                 e, self.path)
             return []
 
+    def getArchiveFileSizes(self):
+        try:
+            zf = zipfile.ZipFile(self.path, "r")
+            sizes = {info.filename: info.file_size for info in zf.infolist()}
+            zf.close()
+            return sizes
+        except Exception as e:
+            print(u"Unable to get zipfile sizes [{0}]: {1}".format(
+                e, self.path), file=sys.stderr)
+            return {}
+
 
 class UnknownArchiver:
 
@@ -80,6 +91,9 @@ class UnknownArchiver:
     def getArchiveFilenameList(self):
         return []
 
+    def getArchiveFileSizes(self):
+        return {}
+
 
 class ComicArchive:
     logo_data = None
@@ -167,26 +181,37 @@ class ComicArchive:
         if self.page_list is None:
             # get the list file names in the archive, and sort
             files = self.archiver.getArchiveFilenameList()
-
-            # seems like some archive creators are on  Windows, and don't know
-            # about case-sensitivity!
-            if sort_list:
-                def keyfunc(k):
-                    return k.lower()
-                files = natsorted(files, key=keyfunc)
-
-            # make a sub-list of image files
-            self.page_list = []
-            for name in files:
-                if (name[-4:].lower() in [".jpg",
-                                          "jpeg",
-                                          ".png",
-                                          ".gif",
-                                          "webp"] and os.path.basename(name)[0] != "."):
-                    self.page_list.append(name)
+            self.page_list = self.pageNamesFromList(files, sort_list)
 
         return self.page_list
 
+    @staticmethod
+    def pageNamesFromList(files, sort_list=True):
+        """ Returns the image files of an archive's file list, in page order """
+        # seems like some archive creators are on  Windows, and don't know
+        # about case-sensitivity!
+        if sort_list:
+            def keyfunc(k):
+                return k.lower()
+            files = natsorted(files, key=keyfunc)
+
+        # make a sub-list of image files
+        page_list = []
+        for name in files:
+            if (name[-4:].lower() in [".jpg",
+                                      "jpeg",
+                                      ".png",
+                                      ".gif",
+                                      "webp"] and os.path.basename(name)[0] != "."):
+                page_list.append(name)
+
+        return page_list
+
+    def getPageSizeList(self):
+        """ Returns the uncompressed size of each page """
+        sizes = self.archiver.getArchiveFileSizes()
+        return [sizes.get(name, 0) for name in self.getPageNameList()]
+
     def getNumberOfPages(self):
 
         if self.page_count is None:
@@ -21,6 +21,10 @@ from comics.models import (Arc, Creator, Issue, Publisher,
 from . import utils
 from .comicapi.comicarchive import MetaDataStyle, ComicArchive
 from .comicapi.issuestring import IssueString
+from .counters import update_counters, update_issue_counters
+from .imageheader import pack_dimensions, read_page_dimensions
+from .placeholder import create_cover_placeholder, create_image_placeholder
+from .telemetry import PhaseTimer, timed
 
 
 today = date.today()
@@ -86,6 +90,8 @@ class ComicImporter(object):
         self.issue_fields += ',name,site_detail_url,story_arc_credits,volume,person_credits'
         # Initial Comic Book info to search
         self.style = MetaDataStyle.CIX
+        # Time spent in each phase of an import
+        self.timer = PhaseTimer()
 
     def checkIfRemovedOrModified(self, comic, pathlist):
         remove = False
@@ -114,7 +120,7 @@ class ComicImporter(object):
 
         if remove:
             series = Series.objects.get(id=comic.series.id)
-            s_count = series.issue_count
+            s_count = series.issue_set.count()
             # If this is the only issue for a series, delete the series.
             if s_count == 1:
                 series.delete()
@@ -122,6 +128,7 @@ class ComicImporter(object):
             else:
                 comic.delete()
 
+    @timed('comicvine')
     def getCVObjectData(self, response):
         '''
         Gathers object data from a response and tests each value to make sure
@@ -192,6 +199,7 @@ class ComicImporter(object):
 
         return data
 
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def refreshCreatorData(self, cvid):
@@ -231,6 +239,7 @@ class ComicImporter(object):
 
         return True
 
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def refreshIssueData(self, cvid):
@@ -255,33 +264,32 @@ class ComicImporter(object):
         issue_obj = Issue.objects.get(cvid=cvid)
 
         # Clear any arcs the issue might have.
+        arc_ids = list(issue_obj.arcs.values_list('id', flat=True))
         issue_obj.arcs.clear()
 
         # Add any story arcs.
         self.addIssueStoryArcs(cvid, resp['results']['story_arc_credits'])
+        arc_ids += issue_obj.arcs.values_list('id', flat=True)
 
         # TODO: Makes sense to move the image refresh into a
         #       separate function but for now let's leave it here.
-        if data['image'] != '
+        if data['image']:
             # Delete the existing image before adding the new one.
-            if (issue_obj.image):
-                issue_obj.image.delete()
-            # Resize the image and save the new image then
-            # remove the original.
-            issue_obj.image = utils.resize_images(data['image'],
-                                                  ISSUES_FOLDER,
-                                                  NORMAL_IMG_WIDTH,
-                                                  NORMAL_IMG_HEIGHT)
-            os.remove(data['image'])
+            utils.delete_issue_cover(issue_obj)
+            # Create the cover renditions then remove the original.
+            self.setIssueCover(issue_obj, data['image'])
 
         issue_obj.desc = data['desc']
         issue_obj.name = data['name']
         issue_obj.save()
+        # The new cover may be the series' cover.
+        update_counters(series_ids=[issue_obj.series_id], arc_ids=arc_ids)
 
         self.logger.info(f'Refreshed metadata for: {issue_obj}')
 
         return True
 
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def refreshIssueCreditsData(self, cvid):
@@ -313,6 +321,7 @@ class ComicImporter(object):
 
         return True
 
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def refreshSeriesData(self, cvid):
@@ -342,6 +351,7 @@ class ComicImporter(object):
 
         return True
 
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def refreshPublisherData(self, cvid):
@@ -375,6 +385,7 @@ class ComicImporter(object):
 
         return True
 
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def refreshArcData(self, cvid):
@@ -407,6 +418,8 @@ class ComicImporter(object):
                                                 ARCS_FOLDER,
                                                 NORMAL_IMG_WIDTH,
                                                 NORMAL_IMG_HEIGHT)
+            (arc_obj.image_blurhash,
+             arc_obj.image_colors) = create_image_placeholder(arc_obj.image)
             os.remove(data['image'])
 
         arc_obj.desc = data['desc']
@@ -415,6 +428,7 @@ class ComicImporter(object):
 
         return True
 
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def getIssue(self, issue_cvid):
@@ -439,19 +453,27 @@ class ComicImporter(object):
         data = self.getCVObjectData(issue_response['results'])
 
         issue = Issue.objects.get(cvid=issue_cvid)
-        if data['image'] != '' or None:
-            img = utils.resize_images(data['image'],
-                                      ISSUES_FOLDER,
-                                      NORMAL_IMG_WIDTH,
-                                      NORMAL_IMG_HEIGHT)
-            if img:
-                issue.image = img
-            os.remove(data['image'])
+        if data['image']:
+            self.setIssueCover(issue, data['image'])
         issue.desc = data['desc']
         issue.save()
 
         return True
 
+    def setIssueCover(self, issue, image_path):
+        with open(image_path, 'rb') as f:
+            cover_hash = utils.create_cover_renditions(f.read(),
+                                                       NORMAL_IMG_WIDTH,
+                                                       NORMAL_IMG_HEIGHT)
+        if cover_hash:
+            issue.cover_hash = cover_hash
+            issue.image = utils.cover_rendition_path(cover_hash,
+                                                     NORMAL_IMG_WIDTH, 'jpg')
+            (issue.cover_blurhash,
+             issue.cover_colors) = create_cover_placeholder(cover_hash)
+        os.remove(image_path)
+
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def getSeriesDetail(self, api_url):
@@ -472,6 +494,7 @@ class ComicImporter(object):
 
         return data
 
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def getPublisherData(self, response_issue):
@@ -507,6 +530,7 @@ class ComicImporter(object):
 
         return data
 
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def getDetailInfo(self, db_obj, fields, api_url):
@@ -678,6 +702,8 @@ class ComicImporter(object):
         old_image_path = settings.MEDIA_ROOT + '/images/' + base_name
         db_obj.image = utils.resize_images(db_obj.image, img_dir,
                                            NORMAL_IMG_WIDTH, NORMAL_IMG_HEIGHT)
+        (db_obj.image_blurhash,
+         db_obj.image_colors) = create_image_placeholder(db_obj.image)
         db_obj.save()
         os.remove(old_image_path)
 
@@ -744,6 +770,7 @@ class ComicImporter(object):
 
         return new_slug
 
+    @timed('probe')
     def getComicMetadata(self, path):
         # TODO: Need to fix the default image path
         ca = ComicArchive(path, default_image_path=None)
@@ -759,11 +786,14 @@ class ComicImporter(object):
                 md = ca.readMetadata(style)
                 md.path = ca.path
                 md.page_count = ca.page_count
+                md.page_dimensions = pack_dimensions(
+                    read_page_dimensions(ca.path, ca.getPageNameList()))
                 md.mod_ts = datetime.utcfromtimestamp(os.path.getmtime(ca.path))
 
                 return md
         return None
 
+    @timed('db')
     def addComicFromMetadata(self, md):
         if not md.isEmpty:
             # Let's get the issue Comic Vine id from the archive's metadata
@@ -806,8 +836,10 @@ class ComicImporter(object):
                     name=str(md.title),
                     slug=issue_slug,
                     number=fixed_number,
+                    sort_number=utils.issue_sort_number(fixed_number),
                     date=pub_date,
                     page_count=md.page_count,
+                    page_dimensions=md.page_dimensions,
                     cvurl=md.webLink,
                     cvid=int(cvID),
                     mod_ts=tz,
@@ -835,11 +867,22 @@ class ComicImporter(object):
  
             return True
 
-    def commitMetadataList(self, md_list):
+    def commitMetadataList(self, md_list, callback=None):
+        added = 0
         for md in md_list:
-            self.addComicFromMetadata(md)
-
-    def import_comic_files(self):
+            if self.addComicFromMetadata(md):
+                added += 1
+            if callback is not None:
+                callback()
+
+        return added
+
+    @timed('walk')
+    def getImportFileList(self):
+        """
+        Walks the comics directory, removes any missing or modified
+        issues from the database and returns the files still to import.
+        """
         filelist = get_recursive_filelist(self.directory_path)
         filelist = sorted(filelist, key=os.path.getmtime)
 
@@ -852,37 +895,52 @@ class ComicImporter(object):
 
         comics_list = None
 
-        # Load the issue table again to take into account any
-        # issues remove from the database
-        c_list = Issue.objects.all()
-
-        # Make a list of all path string in issue table
-        db_pathlist = []
-        for comic in c_list:
-            db_pathlist.append(comic.file)
-
-        c_list = None
+        # Make a set of all path strings in the issue table, taking
+        # into account any issues removed from the database above.
+        db_pathlist = set(Issue.objects.order_by()
+                          .values_list('file', flat=True))
 
         # Now let's remove any existing files in the database
         # from the directory list of files.
-        for f in db_pathlist:
-            if f in filelist:
-                filelist.remove(f)
-        db_pathlist = None
-
+        return [f for f in filelist if f not in db_pathlist]
+
+    def importFileList(self, filelist, callback=None):
+        """
+        Imports a list of comic archives and returns the number added.
+        Files already in the database are skipped, so a batch can safely
+        be retried after a failure. The optional callback is called after
+        each archive is committed.
+        """
+        existing = set(Issue.objects.filter(file__in=filelist)
+                       .order_by().values_list('file', flat=True))
+
+        added = 0
         md_list = []
         self.read_count = 0
         for filename in filelist:
+            if filename in existing:
+                continue
+
             md = self.getComicMetadata(filename)
             if md is not None:
                 md_list.append(md)
 
             if self.read_count % 100 == 0 and self.read_count != 0:
                 if len(md_list) > 0:
-                    self.commitMetadataList(md_list)
+                    added += self.commitMetadataList(md_list, callback)
                     md_list = []
 
         if len(md_list) > 0:
-            self.commitMetadataList(md_list)
+            added += self.commitMetadataList(md_list, callback)
+
+        if added:
+            update_issue_counters(Issue.objects.filter(file__in=filelist))
+
+        return added
+
+    def import_comic_files(self):
+        with self.timer:
+            filelist = self.getImportFileList()
+            self.importFileList(filelist)
 
         self.logger.info('Finished importing..')
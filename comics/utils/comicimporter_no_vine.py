@@ -21,6 +21,10 @@ from comics.models import (Arc, Creator, Issue, Publisher,
 from . import utils
 from .comicapi.comicarchive import MetaDataStyle, ComicArchive
 from .comicapi.issuestring import IssueString
+from .counters import update_issue_counters
+from .imageheader import pack_dimensions, read_page_dimensions
+from .placeholder import create_cover_placeholder, create_image_placeholder
+from .telemetry import PhaseTimer, timed
 from .comicapi.comicarchive import ComicArchive
 
 
@@ -87,6 +91,8 @@ class ComicImporterNoVine(object):
         self.issue_fields += ',name,site_detail_url,story_arc_credits,volume,person_credits'
         # Initial Comic Book info to search
         self.style = MetaDataStyle.CIX
+        # Time spent in each phase of an import
+        self.timer = PhaseTimer()
 
     def checkIfRemovedOrModified(self, comic, pathlist):
         remove = False
@@ -115,7 +121,7 @@ class ComicImporterNoVine(object):
 
         if remove:
             series = Series.objects.get(id=comic.series.id)
-            s_count = series.issue_count
+            s_count = series.issue_set.count()
             # If this is the only issue for a series, delete the series.
             if s_count == 1:
                 series.delete()
@@ -123,6 +129,7 @@ class ComicImporterNoVine(object):
             else:
                 comic.delete()
     
+    @timed('db')
     def getComicDataFromArchive(self,md):
         self.logger.debug('Start getComicDataFromArchive')
         
@@ -179,15 +186,14 @@ class ComicImporterNoVine(object):
                     pub_date, fixed_number, series_obj.name)
             ca = ComicArchive(md.path)
             image_data = ca.getPage(int(0))
-            import uuid
-            filename = settings.MEDIA_ROOT + '/images/' + str(uuid.uuid4()) + '.jpg'
-            with open(filename, 'wb')  as outfile:  
-                outfile.write(image_data)
-            img = utils.resize_images(filename,
-                                        ISSUES_FOLDER,
-                                        NORMAL_IMG_WIDTH,
-                                        NORMAL_IMG_HEIGHT)
-            os.remove(filename)
+            cover_hash = utils.create_cover_renditions(image_data,
+                                                       NORMAL_IMG_WIDTH,
+                                                       NORMAL_IMG_HEIGHT)
+            img = ''
+            if cover_hash:
+                img = utils.cover_rendition_path(cover_hash,
+                                                 NORMAL_IMG_WIDTH, 'jpg')
+            blurhash, colors = create_cover_placeholder(cover_hash)
     
             try:
                 # Create the issue
@@ -196,14 +202,19 @@ class ComicImporterNoVine(object):
                     name=str(md.title),
                     slug=issue_slug,
                     number=fixed_number,
+                    sort_number=utils.issue_sort_number(fixed_number),
                     date=pub_date,
                     page_count=md.page_count,
+                    page_dimensions=md.page_dimensions,
                     cvurl=md.webLink,
                     cvid=int(cvID),
                     mod_ts=tz,
                     series=series_obj,
                     desc='*' + str(md.comments),
-                    image = img
+                    image = img,
+                    cover_hash=cover_hash,
+                    cover_blurhash=blurhash,
+                    cover_colors=colors,
                     )
             except IntegrityError as e:
                 self.logger.error(f'Attempting to create issue in db - {e}')
@@ -232,6 +243,9 @@ class ComicImporterNoVine(object):
                             arc_obj.save()
                             issue_obj.arcs.add(arc_obj)
 
+            return True
+
+    @timed('comicvine')
     def getCVObjectData(self, response):
         '''
         Gathers object data from a response and tests each value to make sure
@@ -303,6 +317,7 @@ class ComicImporterNoVine(object):
         return data
 
    
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def getIssue(self, issue_cvid):
@@ -335,12 +350,15 @@ class ComicImporterNoVine(object):
                                       NORMAL_IMG_HEIGHT)
             if img:
                 issue.image = img
+                (issue.cover_blurhash,
+                 issue.cover_colors) = create_image_placeholder(img)
             os.remove(data['image'])
         issue.desc = data['desc']
         issue.save()
 
         return True
 
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def getSeriesDetail(self, api_url):
@@ -361,6 +379,7 @@ class ComicImporterNoVine(object):
 
         return data
 
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def getPublisherData(self, response_issue):
@@ -396,6 +415,7 @@ class ComicImporterNoVine(object):
 
         return data
 
+    @timed('comicvine')
     @sleep_and_retry
     @limits(calls=7, period=ONE_MINUTE)
     def getDetailInfo(self, db_obj, fields, api_url):
@@ -568,6 +588,8 @@ class ComicImporterNoVine(object):
         old_image_path = settings.MEDIA_ROOT + '/images/' + base_name
         db_obj.image = utils.resize_images(db_obj.image, img_dir,
                                            NORMAL_IMG_WIDTH, NORMAL_IMG_HEIGHT)
+        (db_obj.image_blurhash,
+         db_obj.image_colors) = create_image_placeholder(db_obj.image)
         db_obj.save()
         os.remove(old_image_path)
 
@@ -634,6 +656,7 @@ class ComicImporterNoVine(object):
 
         return new_slug
 
+    @timed('probe')
     def getComicMetadata(self, path):
         # TODO: Need to fix the default image path
         ca = ComicArchive(path, default_image_path=None)
@@ -649,6 +672,8 @@ class ComicImporterNoVine(object):
                 md = ca.readMetadata(style)
                 md.path = ca.path
                 md.page_count = ca.page_count
+                md.page_dimensions = pack_dimensions(
+                    read_page_dimensions(ca.path, ca.getPageNameList()))
                 md.mod_ts = datetime.utcfromtimestamp(os.path.getmtime(ca.path))
 
                 return md
@@ -696,8 +721,10 @@ class ComicImporterNoVine(object):
                     name=str(md.title),
                     slug=issue_slug,
                     number=fixed_number,
+                    sort_number=utils.issue_sort_number(fixed_number),
                     date=pub_date,
                     page_count=md.page_count,
+                    page_dimensions=md.page_dimensions,
                     cvurl=md.webLink,
                     cvid=int(cvID),
                     mod_ts=tz,
@@ -725,11 +752,22 @@ class ComicImporterNoVine(object):
 
             return True
 
-    def commitMetadataList(self, md_list):
+    def commitMetadataList(self, md_list, callback=None):
+        added = 0
         for md in md_list:
-            self.getComicDataFromArchive(md)
-
-    def import_comic_files(self):
+            if self.getComicDataFromArchive(md):
+                added += 1
+            if callback is not None:
+                callback()
+
+        return added
+
+    @timed('walk')
+    def getImportFileList(self):
+        """
+        Walks the comics directory, removes any missing or modified
+        issues from the database and returns the files still to import.
+        """
         filelist = get_recursive_filelist(self.directory_path)
         filelist = sorted(filelist, key=os.path.getmtime)
 
@@ -742,37 +780,52 @@ class ComicImporterNoVine(object):
 
         comics_list = None
 
-        # Load the issue table again to take into account any
-        # issues remove from the database
-        c_list = Issue.objects.all()
-
-        # Make a list of all path string in issue table
-        db_pathlist = []
-        for comic in c_list:
-            db_pathlist.append(comic.file)
-
-        c_list = None
+        # Make a set of all path strings in the issue table, taking
+        # into account any issues removed from the database above.
+        db_pathlist = set(Issue.objects.order_by()
+                          .values_list('file', flat=True))
 
         # Now let's remove any existing files in the database
         # from the directory list of files.
-        for f in db_pathlist:
-            if f in filelist:
-                filelist.remove(f)
-        db_pathlist = None
-
+        return [f for f in filelist if f not in db_pathlist]
+
+    def importFileList(self, filelist, callback=None):
+        """
+        Imports a list of comic archives and returns the number added.
+        Files already in the database are skipped, so a batch can safely
+        be retried after a failure. The optional callback is called after
+        each archive is committed.
+        """
+        existing = set(Issue.objects.filter(file__in=filelist)
+                       .order_by().values_list('file', flat=True))
+
+        added = 0
         md_list = []
         self.read_count = 0
         for filename in filelist:
+            if filename in existing:
+                continue
+
             md = self.getComicMetadata(filename)
             if md is not None:
                 md_list.append(md)
 
             if self.read_count % 100 == 0 and self.read_count != 0:
                 if len(md_list) > 0:
-                    self.commitMetadataList(md_list)
+                    added += self.commitMetadataList(md_list, callback)
                     md_list = []
 
         if len(md_list) > 0:
-            self.commitMetadataList(md_list)
+            added += self.commitMetadataList(md_list, callback)
+
+        if added:
+            update_issue_counters(Issue.objects.filter(file__in=filelist))
+
+        return added
+
+    def import_comic_files(self):
+        with self.timer:
+            filelist = self.getImportFileList()
+            self.importFileList(filelist)
 
         self.logger.info('Finished importing..')
@@ -0,0 +1,96 @@
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from comics.models import Arc, Issue, Publisher, Series
+
+
+READ = 2
+
+
+def _count(queryset):
+    return Coalesce(Subquery(queryset.annotate(n=Count('pk')).values('n'),
+                             output_field=IntegerField()), Value(0))
+
+
+def _issue_counters(issues):
+    '''
+    Returns the counter updates for rows whose issues are given, grouped
+    by the row. Each counter is a subquery, so a whole table can be
+    counted in a single UPDATE.
+    '''
+    return {
+        'issue_count': _count(issues),
+        'read_count': _count(issues.filter(status=READ)),
+        'latest_issue_date': Subquery(issues.annotate(
+            latest=Max('date')).values('latest')),
+    }
+
+
+def _series_cover(covers):
+    '''
+    Returns the updates that point series at the cover of their earliest
+    issue, by cover date and then number.
+    '''
+    covers = covers.order_by('date', 'sort_number', 'number', 'id')
+    return {
+        'cover': Subquery(covers.values('id')[:1]),
+        'cover_image': Coalesce(Subquery(covers.values('image')[:1]),
+                                Value('')),
+    }
+
+
+def series_counters():
+    issues = (Issue.objects.filter(series=OuterRef('pk'))
+              .order_by().values('series'))
+    return dict(_issue_counters(issues),
+                **_series_cover(Issue.objects.filter(series=OuterRef('pk'))))
+
+
+def arc_counters():
+    issues = (Issue.objects.filter(arcs=OuterRef('pk'))
+              .order_by().values('arcs'))
+    return _issue_counters(issues)
+
+
+def publisher_counters():
+    issues = (Issue.objects.filter(series__publisher=OuterRef('pk'))
+              .order_by().values('series__publisher'))
+    series = (Series.objects.filter(publisher=OuterRef('pk'))
+              .order_by().values('publisher'))
+    return dict(_issue_counters(issues), series_count=_count(series))
+
+
+def update_counters(series_ids=(), arc_ids=(), publisher_ids=()):
+    '''
+    Recounts the issues of the given series, arcs and publishers, along
+    with the publishers of the series, and picks the series' covers.
+    '''
+    series_ids = {i for i in series_ids if i is not None}
+    arc_ids = {i for i in arc_ids if i is not None}
+    publisher_ids = {i for i in publisher_ids if i is not None}
+
+    if series_ids:
+        publisher_ids.update(
+            Series.objects.filter(id__in=series_ids, publisher__isnull=False)
+            .values_list('publisher', flat=True))
+        Series.objects.filter(id__in=series_ids).update(**series_counters())
+    if arc_ids:
+        Arc.objects.filter(id__in=arc_ids).update(**arc_counters())
+    if publisher_ids:
+        Publisher.objects.filter(id__in=publisher_ids).update(
+            **publisher_counters())
+
+
+def update_issue_counters(issues):
+    ''' Recounts the series, arcs and publishers of a queryset of issues '''
+    update_counters(
+        series_ids=issues.order_by().values_list('series', flat=True).distinct(),
+        arc_ids=(Arc.objects.filter(issue__in=issues.order_by().values('id'))
+                 .values_list('id', flat=True).distinct()))
+
+
+def recount_all():
+    ''' Recounts every series, arc and publisher, a table at a time '''
+    Series.objects.update(**series_counters())
+    Arc.objects.update(**arc_counters())
+    Publisher.objects.update(**publisher_counters())
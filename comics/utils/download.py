@@ -0,0 +1,91 @@
+import os
+import re
+from urllib.parse import quote
+
+from django.utils.http import http_date
+
+
+ARCHIVE_CONTENT_TYPES = {
+    '.cbz': 'application/vnd.comicbook+zip',
+    '.cbr': 'application/vnd.comicbook-rar',
+}
+# Archives are streamed from disk in chunks of this size.
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def file_etag(st):
+    ''' Returns a strong ETag for a file from its size and mtime '''
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def archive_content_type(path):
+    ext = os.path.splitext(path)[1].lower()
+    return ARCHIVE_CONTENT_TYPES.get(ext, 'application/octet-stream')
+
+
+def content_disposition(path):
+    filename = os.path.basename(path)
+    try:
+        filename.encode('ascii')
+        return 'attachment; filename="{}"'.format(filename.replace('"', '\\"'))
+    except UnicodeEncodeError:
+        return "attachment; filename*=utf-8''{}".format(quote(filename))
+
+
+def parse_range(header, size):
+    '''
+    Returns the (start, end) byte positions (inclusive) of a Range header,
+    or None if the whole file should be sent. Multiple ranges aren't
+    supported, so they also get the whole file, which HTTP allows.
+    Raises RangeNotSatisfiable if the range is outside the file.
+    '''
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # A suffix range, the last N bytes.
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        # An invalid range is ignored.
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def if_range_matches(header, etag, st):
+    ''' Checks an If-Range header against the file's ETag or date '''
+    if not header:
+        return True
+    if header.startswith('"') or header.startswith('W/'):
+        # Only strong ETags can be used with ranges.
+        return header == etag
+    return header == http_date(st.st_mtime)
+
+
+def read_file_range(path, start, length):
+    ''' Yields length bytes of a file from start, a chunk at a time '''
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
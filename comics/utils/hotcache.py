@@ -0,0 +1,217 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+
+from django.conf import settings
+
+from .comicapi.comicarchive import ComicArchive
+
+
+# Written last, so an issue's directory only counts once fully extracted.
+INDEX_FILENAME = 'index.json'
+
+# Issues are extracted into directories with this prefix first.
+TMP_PREFIX = '.tmp-'
+
+# Writing each page touches a temporary directory, so one left untouched
+# this long belongs to a worker killed mid extraction or conversion.
+STALE_TMP_SECONDS = 60 * 60
+
+
+def remove_stale_tmp(directory):
+    ''' Removes the temporary directories of killed workers '''
+    cutoff = time.time() - STALE_TMP_SECONDS
+    try:
+        entries = os.listdir(directory)
+    except OSError:
+        return
+    for entry in entries:
+        if not entry.startswith(TMP_PREFIX):
+            continue
+        path = os.path.join(directory, entry)
+        try:
+            if os.stat(path).st_mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+class HotIssueCache(object):
+    '''
+    Keeps the pages of recently opened issues extracted on local disk, so
+    page reads skip the (possibly network mounted) archive and the
+    decompression. Each issue is extracted to a directory named after its
+    id and the archive's mtime, so a changed archive is extracted again.
+    Issues are evicted least recently read first once over max_bytes.
+    '''
+
+    def __init__(self, directory, max_bytes, max_workers=1):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger('thwip')
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='hotcache')
+        self._lock = threading.Lock()
+        self._extracting = set()
+
+    def issue_dir(self, issue, mtime_ns=None):
+        if mtime_ns is None:
+            mtime_ns = os.stat(issue.file).st_mtime_ns
+        return os.path.join(self.directory, f'{issue.id}-{mtime_ns}')
+
+    def read_index(self, path):
+        try:
+            with open(os.path.join(path, INDEX_FILENAME)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_page_path(self, issue, page):
+        ''' Returns the path of an extracted page, or None '''
+        try:
+            path = self.issue_dir(issue)
+        except OSError:
+            return None
+        index = self.read_index(path)
+        if index is None or not 0 <= int(page) < len(index['pages']):
+            return None
+
+        # The index's mtime is the issue's last access, for eviction.
+        try:
+            os.utime(os.path.join(path, INDEX_FILENAME))
+        except OSError:
+            return None
+        return os.path.join(path, index['pages'][int(page)])
+
+    def page_reader(self, issue):
+        ''' Returns a function reading pages from the extracted issue '''
+        def read_page(page):
+            path = self.get_page_path(issue, page)
+            if path is not None:
+                try:
+                    with open(path, 'rb') as f:
+                        return f.read()
+                except OSError:
+                    pass
+            return ComicArchive(issue.file).getPage(int(page))
+        return read_page
+
+    def open_issue(self, issue):
+        ''' Extracts an issue in the background, unless it already is '''
+        if self.max_bytes <= 0:
+            return None
+        try:
+            path = self.issue_dir(issue)
+        except OSError:
+            return None
+        if os.path.exists(os.path.join(path, INDEX_FILENAME)):
+            return None
+
+        with self._lock:
+            if issue.id in self._extracting:
+                return None
+            self._extracting.add(issue.id)
+
+        return self._executor.submit(self._extract, issue)
+
+    def _extract(self, issue):
+        try:
+            self.extract(issue)
+        except Exception as e:
+            self.logger.error(f'Unable to extract {issue.file} - {e}')
+        finally:
+            with self._lock:
+                self._extracting.discard(issue.id)
+
+    def extract(self, issue):
+        st = os.stat(issue.file)
+        path = self.issue_dir(issue, st.st_mtime_ns)
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Extract next to the final directory and move it into place, so
+        # readers never see a partly extracted issue.
+        tmp_path = tempfile.mkdtemp(dir=self.directory, prefix=TMP_PREFIX)
+        try:
+            pages = []
+            size = 0
+            with zipfile.ZipFile(issue.file) as zf:
+                names = ComicArchive.pageNamesFromList(zf.namelist())
+                for number, name in enumerate(names):
+                    ext = os.path.splitext(name)[1].lower()
+                    filename = f'{number:05}{ext}'
+                    with zf.open(name) as src, \
+                            open(os.path.join(tmp_path, filename), 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                    pages.append(filename)
+                    size += zf.getinfo(name).file_size
+
+            with open(os.path.join(tmp_path, INDEX_FILENAME), 'w') as f:
+                json.dump({'pages': pages, 'size': size}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not os.path.exists(os.path.join(path, INDEX_FILENAME)):
+                raise
+
+        # Drop copies extracted from older versions of the archive.
+        prefix = f'{issue.id}-'
+        for entry in os.listdir(self.directory):
+            if entry.startswith(prefix) and os.path.join(
+                    self.directory, entry) != path:
+                shutil.rmtree(os.path.join(self.directory, entry),
+                              ignore_errors=True)
+
+        self.evict()
+        return path
+
+    def entries(self):
+        for entry in os.listdir(self.directory):
+            path = os.path.join(self.directory, entry)
+            index = self.read_index(path)
+            if index is None:
+                continue
+            try:
+                accessed = os.stat(os.path.join(path, INDEX_FILENAME)).st_mtime
+            except OSError:
+                continue
+            yield path, index['size'], accessed
+
+    def evict(self):
+        '''
+        Removes abandoned extractions, then the least recently read issues
+        until under the cap.
+        '''
+        remove_stale_tmp(self.directory)
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        size = sum(e[1] for e in entries)
+        for path, entry_size, accessed in entries:
+            if size <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            size -= entry_size
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_hot_cache = None
+_hot_cache_lock = threading.Lock()
+
+
+def get_hot_cache():
+    global _hot_cache
+    with _hot_cache_lock:
+        if (_hot_cache is None or
+                _hot_cache.directory != settings.HOT_CACHE_DIR or
+                _hot_cache.max_bytes != settings.HOT_CACHE_MAX_BYTES):
+            if _hot_cache is not None:
+                _hot_cache.shutdown(wait=False)
+            _hot_cache = HotIssueCache(settings.HOT_CACHE_DIR,
+                                       settings.HOT_CACHE_MAX_BYTES)
+    return _hot_cache
@@ -0,0 +1,104 @@
+from django.db import connections
+
+from comics.models import Arc, Issue, Series
+
+from .counters import READ
+from .querysets import issue_list, recent_issues, series_issues, series_list
+
+
+# The queries the indexes were chosen for, by name. Each is a function
+# returning the queryset for sample values taken from the library, so
+# explainqueries can show the plan the database picks. The list endpoints
+# are built with utils.querysets, as the views build them; the rest restate
+# the filter and ordering of the code named in their docstrings, so keep
+# them in step.
+HOT_QUERIES = {}
+
+# Page size of the API's list endpoints.
+PAGE_SIZE = 30
+
+
+def hot_query(name):
+    ''' Registers a function returning a queryset to be explained '''
+    def register(func):
+        HOT_QUERIES[name] = func
+        return func
+    return register
+
+
+def _sample_series():
+    # The largest series is the worst case for per-series queries.
+    return Series.objects.order_by('-issue_count').first() or Series(id=0)
+
+
+def _sample_files():
+    return list(Issue.objects.order_by('?')
+                .values_list('file', flat=True)[:PAGE_SIZE]) or ['']
+
+
+@hot_query('reconcile')
+def reconcile_query():
+    ''' Issues already imported, as importFileList checks '''
+    return (Issue.objects.filter(file__in=_sample_files())
+            .order_by().values_list('file'))
+
+
+@hot_query('read-count')
+def read_count_query():
+    ''' Read issues of a series, as utils.counters counts them '''
+    return (Issue.objects.filter(series=_sample_series(), status=READ)
+            .order_by().values('series'))
+
+
+@hot_query('series-cover')
+def series_cover_query():
+    ''' Earliest issue of a series, as utils.counters picks covers '''
+    return (Issue.objects.filter(series=_sample_series())
+            .order_by('date', 'sort_number', 'number', 'id').values('id')[:1])
+
+
+@hot_query('recent')
+def recent_query():
+    ''' The recent issues endpoint '''
+    return recent_issues()
+
+
+@hot_query('issue-list')
+def issue_list_query():
+    ''' A page of the issue list '''
+    return issue_list()[:PAGE_SIZE]
+
+
+@hot_query('series-list')
+def series_list_query():
+    ''' A page of the series list '''
+    return series_list()[:PAGE_SIZE]
+
+
+@hot_query('series-issue-list')
+def series_issue_list_query():
+    ''' A page of a series' issue list '''
+    return series_issues(_sample_series())[:PAGE_SIZE]
+
+
+@hot_query('series-search')
+def series_search_query():
+    ''' Series name search, as SearchFilter runs it '''
+    return Series.objects.filter(name__icontains='man')[:PAGE_SIZE]
+
+
+@hot_query('arc-search')
+def arc_search_query():
+    ''' Story arc name search, as SearchFilter runs it '''
+    return Arc.objects.filter(name__icontains='night')[:PAGE_SIZE]
+
+
+def explain_query(name, analyze=True):
+    '''
+    Returns the plan of a registered query. Only PostgreSQL can run the
+    query as part of EXPLAIN, so analyze is ignored elsewhere.
+    '''
+    queryset = HOT_QUERIES[name]()
+    if analyze and connections[queryset.db].vendor == 'postgresql':
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
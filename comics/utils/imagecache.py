@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+
+class CacheStats(object):
+    ''' Hit, miss and eviction counters for a cache tier '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def evicted(self, count=1):
+        with self._lock:
+            self.evictions += count
+
+    def as_dict(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions}
+
+
+class DiskCache(object):
+    '''
+    A content-addressed cache of image data on disk, capped at max_bytes.
+    Entries are touched when read, so the least recently used are the
+    first to be evicted once the cache grows past its limit.
+    '''
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger('thwip')
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+        # Size of the cache as of the last scan plus any writes since.
+        # Other processes write to the cache too, so it's only an estimate
+        # until eviction rescans the directory.
+        self._size = None
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha1(
+            '|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self.stats.record(False)
+            return None
+
+        self.stats.record(True)
+        return data
+
+    def set(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so readers never see a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.error(f'Unable to write cache entry {path} - {e}')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self.scan_size()
+            else:
+                self._size += len(data)
+            over_limit = self._size > self.max_bytes
+
+        if over_limit:
+            self.evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def entries(self):
+        for root, dirs, files in os.walk(self.directory):
+            for f in files:
+                path = os.path.join(root, f)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def scan_size(self):
+        return sum(size for path, size, mtime in self.entries())
+
+    def evict(self):
+        ''' Removes the least recently used entries until under 90% of the cap '''
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        size = sum(e[1] for e in entries)
+        target = self.max_bytes * 0.9
+        for path, entry_size, mtime in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+                size -= entry_size
+                self.stats.evicted()
+            except OSError:
+                pass
+
+        with self._lock:
+            self._size = size
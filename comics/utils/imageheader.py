@@ -0,0 +1,172 @@
+from array import array
+import os
+import struct
+import sys
+import zipfile
+
+from PIL import Image
+
+
+# Bytes read to identify an image and, for everything but JPEG, find its
+# size. JPEGs keep reading segment by segment up to MAX_JPEG_HEADER_BYTES,
+# since EXIF data with a thumbnail can come before the frame header.
+HEAD_BYTES = 32
+MAX_JPEG_HEADER_BYTES = 256 * 1024
+
+# JPEG start of frame markers, which hold the image size. C4, C8 and CC
+# fall in the same range but aren't frames.
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class _HeaderStream(object):
+    ''' Reads the bytes already read for the head, then the rest of f '''
+
+    def __init__(self, head, f):
+        self.head = head
+        self.f = f
+        self.position = 0
+
+    def read(self, size):
+        data = self.head[:size]
+        self.head = self.head[size:]
+        if len(data) < size:
+            data += self.f.read(size - len(data))
+        self.position += len(data)
+        return data
+
+
+def _jpeg_size(stream):
+    stream.read(2)
+    while stream.position < MAX_JPEG_HEADER_BYTES:
+        byte = stream.read(1)
+        # Skip to the next marker, along with any fill bytes.
+        while byte and byte != b'\xff':
+            byte = stream.read(1)
+        while byte == b'\xff':
+            byte = stream.read(1)
+        if not byte:
+            return None
+
+        marker = byte[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Markers without a segment.
+            continue
+        if marker in (0xD9, 0xDA):
+            # The image data started before any frame header.
+            return None
+
+        segment = stream.read(2)
+        if len(segment) < 2:
+            return None
+        length = struct.unpack('>H', segment)[0]
+        if marker in JPEG_SOF_MARKERS:
+            frame = stream.read(5)
+            if len(frame) < 5:
+                return None
+            _, height, width = struct.unpack('>BHH', frame)
+            return width, height
+        stream.read(length - 2)
+
+    return None
+
+
+def _webp_size(head):
+    chunk = head[12:16]
+    if chunk == b'VP8 ' and len(head) >= 30:
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(head) >= 25:
+        b0, b1, b2, b3 = head[21:25]
+        width = 1 + (((b1 & 0x3F) << 8) | b0)
+        height = 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6))
+        return width, height
+    if chunk == b'VP8X' and len(head) >= 30:
+        width = 1 + int.from_bytes(head[24:27], 'little')
+        height = 1 + int.from_bytes(head[27:30], 'little')
+        return width, height
+    return None
+
+
+# Image types by file extension, as named by get_image_type.
+IMAGE_EXTENSIONS = {
+    '.jpg': 'jpeg',
+    '.jpeg': 'jpeg',
+    '.png': 'png',
+    '.gif': 'gif',
+    '.webp': 'webp',
+    '.avif': 'avif',
+}
+
+
+def get_image_type(head):
+    ''' Returns the type of an image from its first few bytes '''
+    if head[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    if head[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if head[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'avif'
+    return None
+
+
+def image_type_from_name(name):
+    return IMAGE_EXTENSIONS.get(os.path.splitext(name)[1].lower())
+
+
+def get_image_size(f):
+    '''
+    Returns the (width, height) of a JPEG, PNG, GIF or WebP image from its
+    header, reading as little of the file object as possible. Returns None
+    for anything it can't parse.
+    '''
+    head = f.read(HEAD_BYTES)
+    if head[:2] == b'\xff\xd8':
+        return _jpeg_size(_HeaderStream(head, f))
+    if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', head[6:10])
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return _webp_size(head)
+    return None
+
+
+def read_page_dimensions(path, names):
+    '''
+    Returns the (width, height) of each page in an archive. Each zip member
+    is only decompressed as far as its header, and Pillow (which also reads
+    just the header) is the fallback for anything the parser can't handle.
+    '''
+    dimensions = []
+    with zipfile.ZipFile(path) as zf:
+        for name in names:
+            try:
+                with zf.open(name) as f:
+                    size = get_image_size(f)
+                if size is None:
+                    with zf.open(name) as f:
+                        size = Image.open(f).size
+            except Exception:
+                size = (0, 0)
+            dimensions.append(size)
+    return dimensions
+
+
+def pack_dimensions(dimensions):
+    ''' Packs a list of (width, height) into little-endian 16-bit pairs '''
+    values = array('H', (min(v, 0xFFFF) for size in dimensions for v in size))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def unpack_dimensions(data):
+    values = array('H')
+    values.frombytes(bytes(data or b''))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return list(zip(values[0::2], values[1::2]))
@@ -0,0 +1,173 @@
+from collections import OrderedDict
+import logging
+import threading
+
+from django.conf import settings
+
+from .imagecache import CacheStats, DiskCache
+
+
+class MemoryCache(object):
+    '''
+    An in-process LRU cache of page data, capped at max_bytes. It's the
+    first tier of the page cache, so each process keeps the pages it
+    served most recently without going to disk or Redis.
+    '''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+        self.stats.record(data is not None)
+        return data
+
+    def set(self, key, data):
+        # A page bigger than the whole cache would just empty it.
+        if len(data) > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = data
+            self.size += len(data)
+
+            evicted = 0
+            while self.size > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.size -= len(old)
+                evicted += 1
+
+        if evicted:
+            self.stats.evicted(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+
+
+class RedisCache(object):
+    '''
+    A page cache shared by every worker through Redis. Redis handles its
+    own eviction, so the evictions reported are the server's.
+    '''
+
+    def __init__(self, url, timeout, prefix='thwip:page:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.timeout = timeout
+        self.prefix = prefix
+        self.stats = CacheStats()
+        self.logger = logging.getLogger('thwip')
+
+    def get(self, key):
+        try:
+            data = self.client.get(self.prefix + key)
+        except Exception as e:
+            self.logger.error(f'Unable to read page cache entry {key} - {e}')
+            data = None
+
+        self.stats.record(data is not None)
+        return data
+
+    def set(self, key, data):
+        try:
+            self.client.set(self.prefix + key, data, ex=self.timeout)
+        except Exception as e:
+            self.logger.error(f'Unable to write page cache entry {key} - {e}')
+
+    def delete(self, key):
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception:
+            pass
+
+    def server_evictions(self):
+        try:
+            return self.client.info('stats').get('evicted_keys', 0)
+        except Exception:
+            return None
+
+
+class PageCache(object):
+    '''
+    Page data cached in two tiers: a per-process LRU in front of a tier
+    shared by every worker, either on disk or in Redis. Entries found in
+    the shared tier are copied into the process's own tier.
+    '''
+
+    def __init__(self, memory, shared):
+        self.memory = memory
+        self.shared = shared
+
+    @staticmethod
+    def make_key(issue_id, page, rendition, mtime):
+        # Including the archive's mtime means a changed archive never
+        # serves stale pages.
+        return DiskCache.make_key(issue_id, page, rendition, mtime)
+
+    def get(self, key):
+        data = self.memory.get(key)
+        if data is None:
+            data = self.shared.get(key)
+            if data is not None:
+                self.memory.set(key, data)
+        return data
+
+    def set(self, key, data):
+        self.memory.set(key, data)
+        self.shared.set(key, data)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        self.shared.delete(key)
+
+    def stats(self):
+        shared = self.shared.stats.as_dict()
+        if isinstance(self.shared, RedisCache):
+            shared['evictions'] = self.shared.server_evictions()
+        return {'memory': self.memory.stats.as_dict(), 'shared': shared}
+
+
+def page_cache_config():
+    return (settings.PAGE_CACHE_BACKEND, settings.PAGE_CACHE_DIR,
+            settings.PAGE_CACHE_MAX_BYTES, settings.PAGE_CACHE_MEMORY_BYTES,
+            settings.PAGE_CACHE_REDIS_URL, settings.PAGE_CACHE_TIMEOUT)
+
+
+def create_page_cache():
+    if settings.PAGE_CACHE_BACKEND == 'redis':
+        shared = RedisCache(settings.PAGE_CACHE_REDIS_URL,
+                            settings.PAGE_CACHE_TIMEOUT)
+    else:
+        shared = DiskCache(settings.PAGE_CACHE_DIR,
+                           settings.PAGE_CACHE_MAX_BYTES)
+
+    return PageCache(MemoryCache(settings.PAGE_CACHE_MEMORY_BYTES), shared)
+
+
+_page_cache = None
+_page_cache_config = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    global _page_cache, _page_cache_config
+    with _page_cache_lock:
+        config = page_cache_config()
+        if _page_cache is None or _page_cache_config != config:
+            _page_cache = create_page_cache()
+            _page_cache_config = config
+    return _page_cache
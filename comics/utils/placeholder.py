@@ -0,0 +1,150 @@
+import numpy as np
+from PIL import Image
+from django.conf import settings
+
+from .telemetry import timed
+from .utils import cover_rendition_path
+
+
+# Covers are downsampled to fit this box before anything is computed, which
+# is plenty for a blurred placeholder and a handful of colors.
+PLACEHOLDER_SIZE = 32
+# Cosine components across and down, as in BlurHash. Covers are portrait.
+BLURHASH_COMPONENTS = (4, 5)
+# Dominant colors kept, and the k-means rounds used to find them.
+DOMINANT_COLOR_COUNT = 3
+KMEANS_ROUNDS = 8
+
+BASE83_CHARS = ('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+                'abcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~')
+
+
+def _encode83(value, length):
+    chars = []
+    for i in range(length):
+        chars.append(BASE83_CHARS[(value // 83 ** (length - i - 1)) % 83])
+    return ''.join(chars)
+
+
+def _srgb_to_linear(values):
+    values = values / 255
+    return np.where(values <= 0.04045, values / 12.92,
+                    ((values + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value):
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _quantise_ac(value, max_value):
+    value = np.sign(value) * np.abs(value / max_value) ** 0.5
+    return int(min(max(np.floor(value * 9 + 9.5), 0), 18))
+
+
+def blurhash_encode(pixels, x_components=4, y_components=3):
+    '''
+    Returns the BlurHash of an RGB image, given as a height x width x 3
+    array. Clients decode it to a blurred placeholder of any size.
+    '''
+    height, width = pixels.shape[:2]
+    linear = _srgb_to_linear(pixels[:, :, :3].astype(np.float64))
+    xs = np.pi * np.arange(width) / width
+    ys = np.pi * np.arange(height) / height
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            basis = np.outer(np.cos(ys * j), np.cos(xs * i))
+            norm = 1 if i == 0 and j == 0 else 2
+            factors.append(norm * np.tensordot(basis, linear, axes=2) /
+                           (width * height))
+
+    dc, ac = factors[0], factors[1:]
+    blurhash = _encode83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(float(np.abs(f).max()) for f in ac)
+        quantised_max = int(min(max(np.floor(actual_max * 166 - 0.5), 0), 82))
+        max_value = (quantised_max + 1) / 166
+    else:
+        quantised_max = 0
+        max_value = 1
+    blurhash += _encode83(quantised_max, 1)
+
+    r, g, b = (_linear_to_srgb(v) for v in dc)
+    blurhash += _encode83((r << 16) + (g << 8) + b, 4)
+    for f in ac:
+        r, g, b = (_quantise_ac(v, max_value) for v in f)
+        blurhash += _encode83(r * 19 * 19 + g * 19 + b, 2)
+    return blurhash
+
+
+def dominant_colors(pixels, count=DOMINANT_COLOR_COUNT):
+    '''
+    Returns up to count '#rrggbb' colors of an RGB image array, most common
+    first, found with a few rounds of k-means over its pixels.
+    '''
+    points = pixels[:, :, :3].reshape(-1, 3).astype(np.float64)
+    if not len(points):
+        return []
+
+    # Seed the clusters spread across the pixels sorted by brightness, so
+    # the result is the same every time.
+    order = np.argsort(points.sum(axis=1), kind='stable')
+    seeds = order[np.linspace(0, len(order) - 1, count).astype(int)]
+    centers = points[seeds]
+
+    for _ in range(KMEANS_ROUNDS):
+        distances = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        for k in range(len(centers)):
+            members = points[labels == k]
+            if len(members):
+                centers[k] = members.mean(axis=0)
+
+    sizes = np.bincount(labels, minlength=len(centers))
+    colors = []
+    for k in np.argsort(-sizes, kind='stable'):
+        color = '#{:02x}{:02x}{:02x}'.format(*np.rint(centers[k]).astype(int))
+        if sizes[k] and color not in colors:
+            colors.append(color)
+    return colors
+
+
+@timed('image')
+def create_placeholder(path):
+    '''
+    Returns the BlurHash and comma separated dominant colors of an image
+    file, or blank strings if it can't be read.
+    '''
+    try:
+        with Image.open(path) as img:
+            # JPEGs are decoded at a reduced scale, which is far quicker.
+            img.draft('RGB', (PLACEHOLDER_SIZE * 2, PLACEHOLDER_SIZE * 2))
+            img = img.convert('RGB')
+            img.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+            pixels = np.asarray(img)
+    except Exception:
+        return '', ''
+
+    return (blurhash_encode(pixels, *BLURHASH_COMPONENTS),
+            ','.join(dominant_colors(pixels)))
+
+
+def create_cover_placeholder(cover_hash):
+    ''' Returns the placeholder of a cover from its smallest rendition '''
+    if not cover_hash:
+        return '', ''
+    width = min(settings.COVER_RENDITION_WIDTHS)
+    return create_placeholder(settings.MEDIA_ROOT + '/' +
+                              cover_rendition_path(cover_hash, width, 'jpg'))
+
+
+def create_image_placeholder(image):
+    ''' Returns the placeholder of an image stored under MEDIA_ROOT '''
+    if not image:
+        return '', ''
+    return create_placeholder(settings.MEDIA_ROOT + '/' + str(image))
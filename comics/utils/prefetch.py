@@ -0,0 +1,134 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+
+from django.conf import settings
+
+from .hotcache import get_hot_cache
+from .reader import ImageAPIHandler, get_page_manifest
+
+
+# Reading state is only kept for this many issues, dropping the least
+# recently read first.
+MAX_TRACKED_ISSUES = 1000
+
+
+class PagePrefetcher(object):
+    '''
+    Warms the pages a reader is likely to ask for next into the page cache.
+    Each page request notes the issue's reading direction, cancels anything
+    still queued for that issue and queues the next count pages instead.
+    '''
+
+    def __init__(self, count, max_workers, warm=None):
+        self.count = count
+        self.max_workers = max_workers
+        self.warm = warm or self.warm_page
+        self.logger = logging.getLogger('thwip')
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='prefetch')
+        self._lock = threading.Lock()
+        # Issue id -> (last page requested, direction, generation)
+        self._issues = OrderedDict()
+        # Issue id -> futures queued for the issue
+        self._futures = {}
+
+    def get_pages(self, issue_id, page, page_count):
+        '''
+        Records a page request and returns the pages to warm, in the order
+        they'll be read. Only called with the lock held.
+        '''
+        last, direction, generation = self._issues.pop(issue_id, (None, 1, 0))
+        if last is not None and page != last:
+            direction = 1 if page > last else -1
+        self._issues[issue_id] = (page, direction, generation + 1)
+        while len(self._issues) > MAX_TRACKED_ISSUES:
+            stale_id, _ = self._issues.popitem(last=False)
+            self._cancel(stale_id)
+
+        pages = (page + direction * n for n in range(1, self.count + 1))
+        return [p for p in pages if 0 <= p < page_count]
+
+    def page_requested(self, issue, page, **options):
+        if self.count <= 0:
+            return []
+
+        with self._lock:
+            self._cancel(issue.id)
+            pages = self.get_pages(issue.id, int(page), issue.page_count)
+            generation = self._issues[issue.id][2]
+            futures = [
+                self._executor.submit(self._run, issue, generation, p,
+                                      options)
+                for p in pages
+            ]
+            self._futures[issue.id] = futures
+
+        return futures
+
+    def _cancel(self, issue_id):
+        # Only queued pages can be cancelled; any already being read are
+        # skipped by _run once they see the generation has moved on.
+        for future in self._futures.pop(issue_id, []):
+            future.cancel()
+
+    def _run(self, issue, generation, page, options):
+        with self._lock:
+            state = self._issues.get(issue.id)
+            if state is None or state[2] != generation:
+                return False
+
+        try:
+            self.warm(issue, page, **options)
+        except Exception as e:
+            self.logger.error(
+                f'Unable to prefetch page {page} of {issue.file} - {e}')
+            return False
+
+        return True
+
+    def prefetch_issue(self, issue):
+        '''
+        Warms the manifest and first pages of an issue the reader is likely
+        to open next, and starts extracting it.
+        '''
+        if self.count <= 0:
+            return None
+        return self._executor.submit(self._warm_issue, issue)
+
+    def _warm_issue(self, issue):
+        try:
+            get_hot_cache().open_issue(issue)
+            get_page_manifest(issue)
+            for page in range(min(self.count, issue.page_count)):
+                self.warm(issue, page)
+        except Exception as e:
+            self.logger.error(f'Unable to warm up {issue.file} - {e}')
+            return False
+
+        return True
+
+    @staticmethod
+    def warm_page(issue, page, **options):
+        ImageAPIHandler().getPage(issue, page, **options)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher():
+    global _prefetcher
+    with _prefetcher_lock:
+        if (_prefetcher is None or
+                _prefetcher.count != settings.PAGE_PREFETCH_COUNT or
+                _prefetcher.max_workers != settings.PAGE_PREFETCH_WORKERS):
+            if _prefetcher is not None:
+                _prefetcher.shutdown(wait=False)
+            _prefetcher = PagePrefetcher(settings.PAGE_PREFETCH_COUNT,
+                                         settings.PAGE_PREFETCH_WORKERS)
+    return _prefetcher
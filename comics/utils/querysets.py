@@ -0,0 +1,35 @@
+from comics.models import Arc, Issue, Series
+
+
+# The querysets of the list endpoints. They live here rather than in the
+# views so utils.hotqueries can explain the very queries the API runs.
+
+ISSUE_PREFETCH = ('credits_set', 'credits_set__creator', 'credits_set__role')
+
+
+def issue_list():
+    ''' Every issue, as the issue list returns them '''
+    return (Issue.objects.select_related('series')
+            .prefetch_related(*ISSUE_PREFETCH, 'arcs'))
+
+
+def recent_issues():
+    ''' The last 90 issues imported '''
+    return (Issue.objects.select_related('series')
+            .prefetch_related(*ISSUE_PREFETCH)
+            .order_by('-import_date')[:90])
+
+
+def series_list():
+    ''' Every series, as the series list returns them '''
+    return Series.objects.select_related('publisher', 'cover')
+
+
+def series_issues(series):
+    # Sorted by the numeric value of the issue number, straight from
+    # the (series, sort_number) index.
+    return series.issue_set.order_by('sort_number', 'number')
+
+
+def arc_issues(arc):
+    return arc.issue_set.order_by(*Arc.ISSUE_ORDERING)
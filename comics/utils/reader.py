@@ -1,38 +1,235 @@
 import base64
-import imghdr
 import io
+import json
+import os
+import zipfile
 
-from PIL import Image
+from PIL import Image, features
 
-from .comicapi.comicarchive import ComicArchive
+from .comicapi.comicarchive import ComicArchive, MetaDataStyle
+from .hotcache import get_hot_cache
+from .imageheader import (get_image_type, image_type_from_name,
+                          read_page_dimensions, unpack_dimensions)
+from .pagecache import get_page_cache
+from .utils import MODERN_IMAGE_FORMATS, negotiate_image_format
+
+
+PAGE_FORMATS = {'jpeg': 'JPEG', 'webp': 'WEBP', 'avif': 'AVIF'}
+# Formats a resized page is converted to through the Accept header, best
+# first. Pages are encoded on request, so WebP beats the far slower AVIF.
+NEGOTIATED_PAGE_FORMATS = ('webp', 'avif')
+DEFAULT_PAGE_QUALITY = 80
+# Pages streamed straight from an archive are read in chunks of this size.
+PAGE_CHUNK_SIZE = 64 * 1024
+
+
+def page_rendition(width=None, quality=None, image_format=None):
+    ''' Names the rendition of a page, as used in page cache keys '''
+    if width is None and quality is None and image_format is None:
+        return 'original'
+    return f'{width or "full"}-q{quality}.{image_format}'
+
+
+def get_page_formats():
+    ''' Returns the page formats this Pillow build can write '''
+    return [f for f in PAGE_FORMATS
+            if f not in MODERN_IMAGE_FORMATS or features.check(f)]
+
+
+def negotiate_page_options(options, accept):
+    '''
+    Returns the page options from validated query parameters. A page that
+    is resized or re-encoded anyway is converted to the best format the
+    Accept header asks for, unless the image_format parameter picks one.
+    Otherwise the page is served as it is stored.
+    '''
+    page_options = {
+        'width': options.get('width'),
+        'quality': options.get('quality'),
+        'image_format': options.get('image_format'),
+    }
+    transcode = (page_options['width'] is not None or
+                 page_options['quality'] is not None)
+    if page_options['image_format'] is None and transcode:
+        formats = [f for f in NEGOTIATED_PAGE_FORMATS
+                   if f in get_page_formats()]
+        page_options['image_format'] = negotiate_image_format(accept, formats)
+    return page_options
 
 
 class ImageAPIHandler(object):
 
-    def getContentType(self, image_data):
-        img = 'jpg'
-        imtype = imghdr.what(None, image_data)
-        if imtype is not None:
-            return imtype
+    def getContentType(self, image_data, name=None):
+        # The magic bytes are enough, so there's no need to look at the
+        # rest of the page.
+        imtype = get_image_type(image_data[:16])
+        if imtype is None and name is not None:
+            imtype = image_type_from_name(name)
 
-        return img
+        return imtype or 'jpeg'
 
-    def resizeImage(self, max_height, image_data):
+    def transcodePage(self, image_data, width=None,
+                      quality=DEFAULT_PAGE_QUALITY, image_format='jpeg'):
         i = Image.open(io.BytesIO(image_data))
         w, h = i.size
-        if max_height < h:
-            i.thumbnail((w, max), Image.ANTIALIAS)
-            output = io.BytesIO()
-            i.save(output, format='JPEG')
-            return output.getvalue()
-        else:
-            return image_data
-
-    def get_uri(self, issue_file, page_num):
-        ca = ComicArchive(issue_file)
-        image_data = ca.getPage(int(page_num))
+        # Never upscale, just convert the format.
+        if width is not None and width < w:
+            height = round(h * width / w)
+            # Let the JPEG decoder do most of the downscaling.
+            i.draft('RGB', (width, height))
+            i = i.resize((width, height), Image.LANCZOS)
+        if i.mode not in ('RGB', 'L'):
+            i = i.convert('RGB')
+        output = io.BytesIO()
+        i.save(output, format=PAGE_FORMATS[image_format], quality=quality)
+        return output.getvalue()
+
+    def getPage(self, issue, page_num, width=None, quality=None,
+                image_format=None, read_page=None):
+        """
+        Returns the image data and content type of a page. Pages are kept
+        in the page cache, whether they're resized, converted or not.
+        read_page can be given to read pages from an already open archive.
+        """
+        transcode = not (width is None and quality is None and
+                         image_format is None)
+        if transcode:
+            quality = quality or DEFAULT_PAGE_QUALITY
+            image_format = image_format or 'jpeg'
+
+        try:
+            mtime = os.path.getmtime(issue.file)
+        except OSError:
+            # The archive has been moved or deleted.
+            return None, None
+        cache = get_page_cache()
+        key = cache.make_key(issue.id, int(page_num),
+                             page_rendition(width, quality, image_format),
+                             mtime)
+        image_data = cache.get(key)
+        if image_data is None:
+            if read_page is None:
+                read_page = get_hot_cache().page_reader(issue)
+            image_data = read_page(int(page_num))
+            if image_data is None:
+                return None, None
+            if transcode:
+                image_data = self.transcodePage(image_data, width, quality,
+                                                image_format)
+            cache.set(key, image_data)
+
+        if not transcode:
+            image_format = self.getContentType(image_data)
+        return image_data, 'image/' + image_format
+
+    def streamPages(self, issue, start, end, boundary, **options):
+        """
+        Returns a generator of the pages from start to end (inclusive) as
+        the parts of a multipart/mixed response. Every page is read from one
+        open archive, and pages that aren't resized or converted are
+        streamed straight from it in chunks. The archive is opened before
+        anything is streamed, so OSError and BadZipFile are raised here.
+        """
+        zf = zipfile.ZipFile(issue.file)
+        return self._streamParts(zf, issue, start, end, boundary, **options)
+
+    def _streamParts(self, zf, issue, start, end, boundary, **options):
+        transcode = any(v is not None for v in options.values())
+        with zf:
+            names = ComicArchive.pageNamesFromList(zf.namelist())
+
+            def read_page(page_num):
+                return zf.read(names[page_num])
+
+            for page_num in range(start, min(end, len(names) - 1) + 1):
+                if transcode:
+                    image_data, content_type = self.getPage(
+                        issue, page_num, read_page=read_page, **options)
+                    if image_data is None:
+                        # The archive went away mid stream.
+                        break
+                    chunks = [image_data]
+                    size = len(image_data)
+                else:
+                    info = zf.getinfo(names[page_num])
+                    f = zf.open(info)
+                    first = f.read(PAGE_CHUNK_SIZE)
+                    image_type = self.getContentType(first, names[page_num])
+                    content_type = 'image/' + image_type
+                    chunks = self._readChunks(f, first)
+                    size = info.file_size
+
+                yield (f'--{boundary}\r\n'
+                       f'Content-Type: {content_type}\r\n'
+                       f'Content-Length: {size}\r\n'
+                       f'X-Page: {page_num}\r\n\r\n').encode('ascii')
+                yield from chunks
+                yield b'\r\n'
+
+        yield f'--{boundary}--\r\n'.encode('ascii')
+
+    @staticmethod
+    def _readChunks(f, first):
+        with f:
+            chunk = first
+            while chunk:
+                yield chunk
+                chunk = f.read(PAGE_CHUNK_SIZE)
+
+    def get_uri(self, issue, page_num):
+        image_data, content_type = self.getPage(issue, page_num)
+        if image_data is None:
+            return None
         image_type = self.getContentType(image_data)
         base64_data = base64.b64encode(image_data).decode('ascii')
         uri = f'data:{image_type};base64,{base64_data}'
 
         return uri
+
+
+def get_page_manifest(issue):
+    '''
+    Returns the size, dimensions, spread flag, ComicInfo page type and
+    image format of every page of an issue. The manifest is kept in the page cache.
+    Raises OSError or BadZipFile if the archive can't be read.
+    '''
+    cache = get_page_cache()
+    key = cache.make_key(issue.id, 'all', 'manifest',
+                         os.path.getmtime(issue.file))
+    data = cache.get(key)
+    if data is not None:
+        return json.loads(data)
+
+    ca = ComicArchive(issue.file)
+    names = ca.getPageNameList()
+    sizes = ca.getPageSizeList()
+    # Use the dimensions stored at import, unless the archive has changed
+    # page count since.
+    dimensions = unpack_dimensions(issue.page_dimensions)
+    if len(dimensions) != len(names):
+        dimensions = read_page_dimensions(issue.file, names)
+
+    # ComicInfo page entries refer to pages by their archive index.
+    page_info = {}
+    try:
+        for info in ca.readMetadata(MetaDataStyle.CIX).pages:
+            page_info[int(info.get('Image'))] = info
+    except Exception:
+        pass
+
+    pages = []
+    for index, (size, (width, height)) in enumerate(zip(sizes, dimensions)):
+        info = page_info.get(index, {})
+        double_page = info.get('DoublePage', '').lower() == 'true'
+        pages.append({
+            'index': index,
+            'size': size,
+            'width': width,
+            'height': height,
+            'spread': double_page or width > height,
+            'type': info.get('Type', 'Story'),
+            'format': image_type_from_name(names[index]),
+        })
+
+    cache.set(key, json.dumps(pages).encode('utf-8'))
+    return pages
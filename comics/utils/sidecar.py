@@ -0,0 +1,230 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+import zipfile
+
+from PIL import Image
+from django.conf import settings
+
+from .comicapi.comicarchive import ComicArchive
+from .hotcache import TMP_PREFIX, remove_stale_tmp
+from .reader import (DEFAULT_PAGE_QUALITY, PAGE_FORMATS, get_page_formats,
+                     page_rendition)
+
+
+# Written last, so an issue's directory only counts once fully converted.
+INDEX_FILENAME = 'index.json'
+
+
+class PageSidecar(object):
+    '''
+    Web optimized copies of every page of an issue, resized to each of
+    widths in each of formats, kept next to the library. Each issue is
+    converted to a directory named after its id and the archive's mtime,
+    so a changed archive is converted again. Pages are named after their
+    rendition, so a page request only has to check the file is there.
+    '''
+
+    def __init__(self, directory, widths, formats):
+        self.directory = directory
+        self.widths = tuple(widths)
+        self.formats = tuple(f for f in formats if f in get_page_formats())
+        self.logger = logging.getLogger('thwip')
+
+    def issue_dir(self, issue, mtime_ns=None):
+        if mtime_ns is None:
+            mtime_ns = os.stat(issue.file).st_mtime_ns
+        return os.path.join(self.directory, f'{issue.id}-{mtime_ns}')
+
+    @staticmethod
+    def page_filename(page, width, image_format):
+        rendition = page_rendition(width, DEFAULT_PAGE_QUALITY, image_format)
+        return f'{int(page):05}-{rendition}'
+
+    def get_page_path(self, issue, page, width=None, quality=None,
+                      image_format=None):
+        ''' Returns the path of a converted page, or None '''
+        if (width not in self.widths or image_format not in self.formats or
+                (quality or DEFAULT_PAGE_QUALITY) != DEFAULT_PAGE_QUALITY):
+            return None
+        try:
+            path = os.path.join(self.issue_dir(issue),
+                                self.page_filename(page, width, image_format))
+        except OSError:
+            return None
+        return path if os.path.isfile(path) else None
+
+    def has_issue(self, issue):
+        try:
+            path = self.issue_dir(issue)
+        except OSError:
+            return False
+        return os.path.exists(os.path.join(path, INDEX_FILENAME))
+
+    def convert(self, issue, delay=0):
+        '''
+        Converts every page of an issue, sleeping for delay seconds after
+        each page to leave the CPU to page requests.
+        '''
+        st = os.stat(issue.file)
+        path = self.issue_dir(issue, st.st_mtime_ns)
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Convert next to the final directory and move it into place, so
+        # readers never see a partly converted issue.
+        tmp_path = tempfile.mkdtemp(dir=self.directory, prefix=TMP_PREFIX)
+        try:
+            size = 0
+            with zipfile.ZipFile(issue.file) as zf:
+                names = ComicArchive.pageNamesFromList(zf.namelist())
+                for number, name in enumerate(names):
+                    for filename, data in self.convert_page(number,
+                                                            zf.read(name)):
+                        with open(os.path.join(tmp_path, filename), 'wb') as f:
+                            f.write(data)
+                        size += len(data)
+                    if delay:
+                        time.sleep(delay)
+
+            with open(os.path.join(tmp_path, INDEX_FILENAME), 'w') as f:
+                json.dump({'pages': len(names), 'size': size}, f)
+            if os.path.exists(path):
+                shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        finally:
+            # Gone once moved into place, but left by any failure.
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        # Drop copies converted from older versions of the archive.
+        prefix = f'{issue.id}-'
+        for entry in os.listdir(self.directory):
+            if entry.startswith(prefix) and os.path.join(
+                    self.directory, entry) != path:
+                shutil.rmtree(os.path.join(self.directory, entry),
+                              ignore_errors=True)
+        return path
+
+    def convert_page(self, page, image_data):
+        ''' Yields the filename and data of each rendition of a page '''
+        try:
+            original = Image.open(io.BytesIO(image_data))
+            original.load()
+        except Exception as e:
+            self.logger.error(f'Unable to convert page {page} - {e}')
+            return
+
+        w, h = original.size
+        # Largest first, as each width is scaled from the original, and
+        # never upscaled, to match the page endpoint's own conversion.
+        for width in sorted(self.widths, reverse=True):
+            img = original
+            if width < w:
+                img = img.resize((width, round(h * width / w)), Image.LANCZOS)
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            for image_format in self.formats:
+                output = io.BytesIO()
+                img.save(output, format=PAGE_FORMATS[image_format],
+                         quality=DEFAULT_PAGE_QUALITY)
+                yield (self.page_filename(page, width, image_format),
+                       output.getvalue())
+
+    def prune(self, issue_ids):
+        '''
+        Removes converted issues that aren't in issue_ids, and conversions
+        abandoned by killed workers.
+        '''
+        remove_stale_tmp(self.directory)
+        issue_ids = {str(i) for i in issue_ids}
+        try:
+            entries = os.listdir(self.directory)
+        except OSError:
+            return
+        for entry in entries:
+            # Other workers may still be converting into temp directories.
+            if entry.startswith(TMP_PREFIX):
+                continue
+            if entry.partition('-')[0] not in issue_ids:
+                shutil.rmtree(os.path.join(self.directory, entry),
+                              ignore_errors=True)
+
+
+def _lower_priority(increment):
+    try:
+        os.nice(increment)
+    except (AttributeError, OSError):
+        pass
+
+
+def _convert_issue(directory, widths, formats, delay, issue_id, file):
+    # Runs in a pool process, so it gets plain values rather than models.
+    sidecar = PageSidecar(directory, widths, formats)
+    sidecar.convert(SimpleNamespace(id=issue_id, file=file), delay)
+    return issue_id
+
+
+def convert_library(issues, workers=None, delay=None, force=False):
+    '''
+    Converts the pages of each issue not converted yet, on a pool of
+    worker processes running at a lower priority. Only as many issues as
+    there are workers are queued at once, so any size of library can be
+    converted. Returns the number of issues converted.
+    '''
+    logger = logging.getLogger('thwip')
+    sidecar = get_sidecar()
+    workers = workers or settings.SIDECAR_WORKERS
+    delay = settings.SIDECAR_PAGE_DELAY if delay is None else delay
+    converted = 0
+
+    def finish(done):
+        nonlocal converted
+        for future in done:
+            try:
+                future.result()
+                converted += 1
+            except Exception as e:
+                logger.error(f'Unable to convert pages - {e}')
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_lower_priority,
+                             initargs=(settings.SIDECAR_NICE,)) as executor:
+        pending = set()
+        for issue in issues:
+            if not force and sidecar.has_issue(issue):
+                continue
+            if len(pending) >= workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                finish(done)
+            pending.add(executor.submit(
+                _convert_issue, sidecar.directory, sidecar.widths,
+                sidecar.formats, delay, issue.id, issue.file))
+        finish(wait(pending).done)
+
+    logger.info(f'Converted the pages of {converted} issues.')
+    return converted
+
+
+_sidecar = None
+_sidecar_lock = threading.Lock()
+
+
+def get_sidecar():
+    global _sidecar
+    with _sidecar_lock:
+        if (_sidecar is None or
+                _sidecar.directory != settings.SIDECAR_DIR or
+                _sidecar.widths != tuple(settings.SIDECAR_PAGE_WIDTHS) or
+                _sidecar.formats != tuple(
+                    f for f in settings.SIDECAR_PAGE_FORMATS
+                    if f in get_page_formats())):
+            _sidecar = PageSidecar(settings.SIDECAR_DIR,
+                                   settings.SIDECAR_PAGE_WIDTHS,
+                                   settings.SIDECAR_PAGE_FORMATS)
+    return _sidecar
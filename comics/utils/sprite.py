@@ -0,0 +1,113 @@
+import io
+import logging
+import os
+import threading
+
+from PIL import Image
+from django.conf import settings
+
+from .imagecache import DiskCache
+from .telemetry import timed
+from .utils import (COVER_FORMATS, get_cover_formats, resize_and_crop,
+                    select_cover_rendition)
+
+
+# Covers per row of a sprite. A default page of 30 results is 10 x 3.
+SPRITE_COLUMNS = 10
+# Covers are cropped to 2:3 on import, so every tile is the same shape.
+COVER_ASPECT = 1.5
+SPRITE_BACKGROUND = (0, 0, 0)
+
+
+def sprite_tile_size(width=None):
+    ''' Returns the tile size of the rendition picked for width '''
+    widths = sorted(settings.COVER_RENDITION_WIDTHS)
+    if width is not None:
+        widths = [w for w in widths if w >= width] or widths[-1:]
+    return widths[0], round(widths[0] * COVER_ASPECT)
+
+
+def sprite_layout(count, tile_size):
+    ''' Returns the sprite size and the offset of each of count tiles '''
+    tile_width, tile_height = tile_size
+    columns = max(min(count, SPRITE_COLUMNS), 1)
+    rows = max((count + columns - 1) // columns, 1)
+    offsets = [((n % columns) * tile_width, (n // columns) * tile_height)
+               for n in range(count)]
+    return (columns * tile_width, rows * tile_height), offsets
+
+
+@timed('image')
+def build_sprite(paths, tile_size, image_format='jpg'):
+    '''
+    Returns the encoded sprite of the cover images at paths (under
+    MEDIA_ROOT), laid out by sprite_layout. Missing covers are left blank.
+    '''
+    size, offsets = sprite_layout(len(paths), tile_size)
+    sprite = Image.new('RGB', size, SPRITE_BACKGROUND)
+    for path, offset in zip(paths, offsets):
+        if not path:
+            continue
+        try:
+            with Image.open(os.path.join(settings.MEDIA_ROOT, path)) as img:
+                if img.size != tile_size:
+                    img = resize_and_crop(img, *tile_size)
+                sprite.paste(img.convert('RGB'), offset)
+        except Exception as e:
+            logging.getLogger('thwip').error(
+                f'Unable to add {path} to a sprite - {e}')
+
+    output = io.BytesIO()
+    sprite.save(output, COVER_FORMATS[image_format])
+    return output.getvalue()
+
+
+def get_cover_sprite(covers, signature, page, width=None, image_format='jpg'):
+    '''
+    Returns the cache key of the sprite of a page of results and the map
+    of where each cover is in it, building the sprite if it isn't cached.
+    covers is a list of (slug, issue) for the results on the page, with
+    None for results without an issue. signature identifies the query.
+    '''
+    if image_format not in get_cover_formats():
+        image_format = 'jpg'
+    tile_size = sprite_tile_size(width)
+    paths = [select_cover_rendition(issue, tile_size[0]) if issue else None
+             for slug, issue in covers]
+
+    # The rendition paths hold the cover hashes, so they double as the
+    # version of the sprite's content.
+    version = DiskCache.make_key(*(path or '' for path in paths))
+    key = DiskCache.make_key(signature, page, tile_size[0], image_format,
+                             version)
+
+    cache = get_sprite_cache()
+    if not os.path.exists(cache.path(key)):
+        cache.set(key, build_sprite(paths, tile_size, image_format))
+
+    size, offsets = sprite_layout(len(covers), tile_size)
+    return key, {
+        'width': size[0],
+        'height': size[1],
+        'tile_width': tile_size[0],
+        'tile_height': tile_size[1],
+        'format': image_format,
+        'covers': [{'slug': slug, 'x': x, 'y': y}
+                   for (slug, issue), path, (x, y)
+                   in zip(covers, paths, offsets) if path],
+    }
+
+
+_sprite_cache = None
+_sprite_cache_lock = threading.Lock()
+
+
+def get_sprite_cache():
+    global _sprite_cache
+    with _sprite_cache_lock:
+        if (_sprite_cache is None or
+                _sprite_cache.directory != settings.SPRITE_CACHE_DIR or
+                _sprite_cache.max_bytes != settings.SPRITE_CACHE_MAX_BYTES):
+            _sprite_cache = DiskCache(settings.SPRITE_CACHE_DIR,
+                                      settings.SPRITE_CACHE_MAX_BYTES)
+    return _sprite_cache
@@ -0,0 +1,69 @@
+import functools
+import threading
+import time
+
+
+_local = threading.local()
+
+
+class PhaseTimer(object):
+    '''
+    Accumulates the time spent in each phase of an import. Phases can
+    nest, and the time is only counted against the innermost one, so a
+    ComicVine request made while adding an issue isn't counted as DB time.
+    '''
+
+    PHASES = ('walk', 'probe', 'comicvine', 'image', 'db')
+
+    def __init__(self):
+        self.timings = dict.fromkeys(self.PHASES, 0.0)
+        self._stack = []
+
+    def __enter__(self):
+        self._previous = getattr(_local, 'timer', None)
+        _local.timer = self
+        return self
+
+    def __exit__(self, *exc):
+        _local.timer = self._previous
+
+    def start(self, phase):
+        now = time.monotonic()
+        if self._stack:
+            parent, started = self._stack[-1]
+            self.timings[parent] += now - started
+        self._stack.append((phase, now))
+
+    def stop(self):
+        now = time.monotonic()
+        phase, started = self._stack.pop()
+        self.timings[phase] += now - started
+        if self._stack:
+            parent, _ = self._stack[-1]
+            self._stack[-1] = (parent, now)
+
+    def fields(self, *phases):
+        ''' Returns the timings keyed by their model field names. '''
+        phases = phases or self.PHASES
+        return {f'{phase}_time': self.timings[phase] for phase in phases}
+
+
+def get_current_timer():
+    return getattr(_local, 'timer', None)
+
+
+def timed(phase):
+    ''' Counts the time spent in the decorated function against a phase '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timer = get_current_timer()
+            if timer is None:
+                return func(*args, **kwargs)
+            timer.start(phase)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timer.stop()
+        return wrapper
+    return decorator
@@ -0,0 +1,172 @@
+import io
+import os
+import threading
+import zipfile
+
+from PIL import Image
+from django.conf import settings
+
+from .imagecache import DiskCache
+from .reader import (DEFAULT_PAGE_QUALITY, PAGE_FORMATS, ImageAPIHandler,
+                     get_page_manifest)
+from .telemetry import timed
+
+
+# Deep Zoom defaults: 254 pixel tiles with a 1 pixel overlap on each inner
+# edge, so tiles are at most 256 pixels across.
+TILE_SIZE = 254
+TILE_OVERLAP = 1
+DZI_NAMESPACE = 'http://schemas.microsoft.com/deepzoom/2008'
+
+
+def max_level(width, height):
+    ''' Returns the full size level, each level below being half the size '''
+    return (max(width, height, 1) - 1).bit_length()
+
+
+def level_size(width, height, level):
+    scale = 2 ** (max_level(width, height) - level)
+    return max(-(-width // scale), 1), max(-(-height // scale), 1)
+
+
+def level_grid(size):
+    ''' Returns the columns and rows of tiles of a level '''
+    return -(-size[0] // TILE_SIZE), -(-size[1] // TILE_SIZE)
+
+
+def tile_box(size, column, row):
+    ''' Returns the crop box of a tile, including its overlap '''
+    left = column * TILE_SIZE - (TILE_OVERLAP if column else 0)
+    top = row * TILE_SIZE - (TILE_OVERLAP if row else 0)
+    right = min((column + 1) * TILE_SIZE + TILE_OVERLAP, size[0])
+    bottom = min((row + 1) * TILE_SIZE + TILE_OVERLAP, size[1])
+    return left, top, right, bottom
+
+
+def get_page_size(issue, page):
+    ''' Returns the width and height of a page, or None if it's unknown '''
+    try:
+        pages = get_page_manifest(issue)
+    except (OSError, zipfile.BadZipFile):
+        return None
+    if not 0 <= page < len(pages):
+        return None
+    size = pages[page]['width'], pages[page]['height']
+    return size if all(size) else None
+
+
+def get_dzi(issue, page, image_format='jpeg'):
+    '''
+    Returns the Deep Zoom descriptor of a page as a dict, as used by the
+    JSON form of DZI, or None if the page's size is unknown. The view adds
+    the Url the tiles are found under.
+    '''
+    size = get_page_size(issue, page)
+    if size is None:
+        return None
+    return {'Image': {
+        'xmlns': DZI_NAMESPACE,
+        'Format': image_format,
+        'Overlap': str(TILE_OVERLAP),
+        'TileSize': str(TILE_SIZE),
+        'Size': {'Width': str(size[0]), 'Height': str(size[1])},
+    }}
+
+
+def tile_key(issue, page, level, column, row, image_format, mtime):
+    return DiskCache.make_key(issue.id, page, 'tile', level, column, row,
+                              image_format, mtime)
+
+
+@timed('image')
+def render_level(issue, page, level, size, image_format, mtime):
+    '''
+    Cuts every tile of a level of a page and stores them in the tile
+    cache, so the page is only decoded once per level. Returns the tiles
+    by (column, row).
+    '''
+    image_data, content_type = ImageAPIHandler().getPage(issue, page)
+    if image_data is None:
+        return {}
+
+    img = Image.open(io.BytesIO(image_data))
+    # Lower levels let the JPEG decoder do most of the downscaling.
+    img.draft('RGB', size)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    if img.size != size:
+        img = img.resize(size, Image.LANCZOS)
+
+    cache = get_tile_cache()
+    tiles = {}
+    columns, rows = level_grid(size)
+    for row in range(rows):
+        for column in range(columns):
+            output = io.BytesIO()
+            img.crop(tile_box(size, column, row)).save(
+                output, format=PAGE_FORMATS[image_format],
+                quality=DEFAULT_PAGE_QUALITY)
+            tiles[column, row] = output.getvalue()
+            cache.set(tile_key(issue, page, level, column, row, image_format,
+                               mtime), tiles[column, row])
+    return tiles
+
+
+_render_locks = {}
+_render_locks_lock = threading.Lock()
+
+
+def get_tile(issue, page, level, column, row, image_format='jpeg'):
+    '''
+    Returns a tile of a page, or None if there's no such tile. Tiles are
+    made the first time any tile of their level is asked for.
+    '''
+    size = get_page_size(issue, page)
+    if size is None or level > max_level(*size):
+        return None
+    size = level_size(size[0], size[1], level)
+    columns, rows = level_grid(size)
+    if column >= columns or row >= rows:
+        return None
+
+    cache = get_tile_cache()
+    try:
+        mtime = os.path.getmtime(issue.file)
+    except OSError:
+        return None
+    key = tile_key(issue, page, level, column, row, image_format, mtime)
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    # A viewer asks for all the tiles in view at once, so only one request
+    # renders the level and the rest wait for it.
+    level_key = (issue.id, page, level, image_format, mtime)
+    with _render_locks_lock:
+        lock = _render_locks.setdefault(level_key, threading.Lock())
+    with lock:
+        data = cache.get(key)
+        if data is None:
+            try:
+                tiles = render_level(issue, page, level, size, image_format,
+                                     mtime)
+            finally:
+                with _render_locks_lock:
+                    _render_locks.pop(level_key, None)
+            data = tiles.get((column, row))
+    return data
+
+
+_tile_cache = None
+_tile_cache_lock = threading.Lock()
+
+
+def get_tile_cache():
+    global _tile_cache
+    with _tile_cache_lock:
+        if (_tile_cache is None or
+                _tile_cache.directory != settings.TILE_CACHE_DIR or
+                _tile_cache.max_bytes != settings.TILE_CACHE_MAX_BYTES):
+            _tile_cache = DiskCache(settings.TILE_CACHE_DIR,
+                                    settings.TILE_CACHE_MAX_BYTES)
+    return _tile_cache
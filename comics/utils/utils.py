@@ -1,13 +1,29 @@
+import glob
+import hashlib
+import io
 import logging
 import os
 import re
 import uuid
 
-from PIL import Image
+from PIL import Image, features
 from bs4 import BeautifulSoup
 from django.conf import settings
 
+from .comicapi.issuestring import IssueString
+from .telemetry import timed
 
+
+COVER_FORMATS = {'jpg': 'JPEG', 'webp': 'WEBP', 'avif': 'AVIF'}
+# Formats picked through the Accept header over JPEG, best first.
+MODERN_IMAGE_FORMATS = ('avif', 'webp')
+# Sort key of issue numbers without a numeric part, like 'Annual', which
+# come after the numbered issues of a series.
+UNNUMBERED_SORT_NUMBER = 1e9
+FRACTION_SUFFIX = re.compile(r'^/(\d+)')
+
+
+@timed('image')
 def resize_images(path, folder, width, height):
     if path:
        
@@ -39,19 +55,8 @@ def resize_images(path, folder, width, height):
         new_url = cache_path
 
         try:
-            
             img = Image.open(settings.MEDIA_ROOT + '/images/' + old_filename)
-            # Check Aspect ratio and resize accordingly
-            if crop_width * img.height < crop_height * img.width:
-                height_percent = (float(crop_height) / float(img.size[1]))
-                width_size = int(float(img.size[0]) * float(height_percent))
-                img = img.resize((width_size, crop_height), Image.BICUBIC)
-            else:
-                width_percent = (float(crop_width) / float(img.size[0]))
-                height_size = int(float(img.size[1]) * float(width_percent))
-                img = img.resize((crop_width, height_size), Image.BICUBIC)
-
-            cropped = crop_from_center(img, crop_width, crop_height)
+            cropped = resize_and_crop(img, crop_width, crop_height)
             cropped.save(new_path)
         except Exception:
             # Save as blank instead of None for bad images.
@@ -60,6 +65,171 @@ def resize_images(path, folder, width, height):
     return new_url
 
 
+def get_cover_formats():
+    ''' Returns the cover rendition formats this Pillow build can write '''
+    formats = []
+    for ext in settings.COVER_RENDITION_FORMATS:
+        if ext not in MODERN_IMAGE_FORMATS or features.check(ext):
+            formats.append(ext)
+    return formats
+
+
+def parse_accept(header):
+    ''' Returns the quality value of each media type in an Accept header '''
+    accepted = {}
+    for item in (header or '').split(','):
+        params = item.split(';')
+        media_type = params[0].strip().lower()
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params[1:]:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type] = quality
+    return accepted
+
+
+def negotiate_image_format(accept, formats):
+    '''
+    Returns the first of the formats the Accept header lists, or None.
+    Wildcards don't count, since every client takes the formats comics
+    come in, so a format is only picked when a client asks for it.
+    '''
+    accepted = parse_accept(accept)
+    for ext in formats:
+        if accepted.get(f'image/{ext}', 0) > 0:
+            return ext
+    return None
+
+
+def negotiate_cover_format(image_format, accept):
+    ''' Picks the cover format from the query parameter or Accept header '''
+    if image_format:
+        return image_format
+    modern = [ext for ext in MODERN_IMAGE_FORMATS if ext in get_cover_formats()]
+    return negotiate_image_format(accept, modern) or 'jpg'
+
+
+def cover_rendition_path(cover_hash, width, ext):
+    return f'images/covers/{cover_hash[:2]}/{cover_hash}-{width}.{ext}'
+
+
+@timed('image')
+def create_cover_renditions(image_data, width, height):
+    '''
+    Creates every cover rendition from one decode of the raw bytes of a
+    page and returns their content hash, or a blank string for bad images.
+    '''
+    try:
+        cover_hash = hashlib.sha1(image_data).hexdigest()
+    except TypeError:
+        return ''
+
+    # The width x height cover is always kept, since it's used as the
+    # issue's image, and the other widths are scaled from it.
+    widths = sorted(set(settings.COVER_RENDITION_WIDTHS) | {width})
+    renditions = [(w, ext) for w in widths for ext in get_cover_formats()]
+
+    # The same cover bytes always give the same renditions.
+    if all(os.path.isfile(settings.MEDIA_ROOT + '/' +
+                          cover_rendition_path(cover_hash, w, ext))
+           for w, ext in renditions):
+        return cover_hash
+
+    save_directory = os.path.dirname(
+        settings.MEDIA_ROOT + '/' + cover_rendition_path(cover_hash, width, 'jpg'))
+    os.makedirs(save_directory, 0o755, exist_ok=True)
+
+    # Decoding the page is also the check that it isn't broken, so
+    # there's no need for a separate verify() pass.
+    try:
+        img = Image.open(io.BytesIO(image_data))
+        cover = resize_and_crop(img, width, height)
+        if cover.mode != 'RGB':
+            cover = cover.convert('RGB')
+
+        for w in widths:
+            if w == width:
+                rendition = cover
+            else:
+                h = round(w * height / width)
+                rendition = cover.resize((w, h), Image.LANCZOS)
+            for ext in get_cover_formats():
+                rendition.save(settings.MEDIA_ROOT + '/' +
+                               cover_rendition_path(cover_hash, w, ext),
+                               COVER_FORMATS[ext])
+    except Exception:
+        return ''
+
+    return cover_hash
+
+
+def select_cover_rendition(issue, width=None, ext='jpg'):
+    '''
+    Returns the path (under MEDIA_ROOT) of the smallest cover rendition at
+    least width wide, or the issue's image if it has no renditions.
+    '''
+    if not issue.cover_hash:
+        return issue.image.name or None
+
+    widths = sorted(settings.COVER_RENDITION_WIDTHS)
+    if width is not None:
+        widths = [w for w in widths if w >= width] or widths[-1:]
+    if ext not in get_cover_formats():
+        ext = 'jpg'
+    return cover_rendition_path(issue.cover_hash, widths[0], ext)
+
+
+def delete_cover_renditions(cover_hash):
+    pattern = cover_rendition_path(cover_hash, '*', '*')
+    for path in glob.glob(settings.MEDIA_ROOT + '/' + pattern):
+        os.remove(path)
+
+
+def delete_issue_cover(issue):
+    ''' Deletes an issue's cover unless another issue shares it '''
+    if issue.cover_hash:
+        shared = (
+            type(issue).objects
+            .filter(cover_hash=issue.cover_hash)
+            .exclude(id=issue.id)
+            .exists()
+        )
+        if not shared:
+            delete_cover_renditions(issue.cover_hash)
+    elif issue.image:
+        issue.image.delete(False)
+
+
+def resize_and_crop(img, width, height):
+    ''' Scales an image to fill width x height and crops the overflow '''
+    # Let the JPEG decoder scale down by a power of two while decoding,
+    # which is much faster and uses far less memory than a full decode.
+    img.draft('RGB', (width, height))
+    # Other formats are decoded in full, so shrink them by an integer
+    # factor first to keep the BICUBIC resize cheap.
+    factor = min(img.width // width, img.height // height)
+    if factor >= 2 and hasattr(img, 'reduce'):
+        img = img.reduce(factor)
+
+    # Check Aspect ratio and resize accordingly
+    if width * img.height < height * img.width:
+        height_percent = (float(height) / float(img.size[1]))
+        width_size = int(float(img.size[0]) * float(height_percent))
+        img = img.resize((width_size, height), Image.BICUBIC)
+    else:
+        width_percent = (float(width) / float(img.size[0]))
+        height_size = int(float(img.size[1]) * float(width_percent))
+        img = img.resize((width, height_size), Image.BICUBIC)
+
+    return crop_from_center(img, width, height)
+
+
 def crop_from_center(image, width, height):
     img = image
     center_width = img.size[0] / 2
@@ -86,6 +256,46 @@ def create_series_sortname(title):
     return sort_name
 
 
+def issue_sort_number(number):
+    '''
+    Returns the numeric sort key of an issue number, so '-1', '1/2', '½',
+    '1' and '10.5' sort in that order. Issues without a number get
+    UNNUMBERED_SORT_NUMBER.
+    '''
+    if not number:
+        return UNNUMBERED_SORT_NUMBER
+    issue = IssueString(number)
+    value = issue.asFloat()
+    if value is None:
+        return UNNUMBERED_SORT_NUMBER
+    fraction = FRACTION_SUFFIX.match(issue.suffix)
+    if fraction and int(fraction.group(1)):
+        value /= int(fraction.group(1))
+    return value
+
+
+def create_import_batches(filelist, batch_size):
+    ''' Splits a list of files into batches, keeping each directory together '''
+    directories = {}
+    for path in filelist:
+        directories.setdefault(os.path.dirname(path), []).append(path)
+
+    # Keeping a directory (usually a single series) in one batch stops
+    # parallel workers from racing to create the same series or arc.
+    batches = []
+    batch = []
+    for files in directories.values():
+        if batch and len(batch) + len(files) > batch_size:
+            batches.append(batch)
+            batch = []
+        batch.extend(files)
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
 def cleanup_html(string, remove_html_tables):
     if string is None:
         return ""
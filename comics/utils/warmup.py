@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.db.models import Q
+
+from comics.models import Arc, Issue
+
+from .prefetch import get_prefetcher
+
+
+def reading_progress(leaf, page_count):
+    if page_count <= 0:
+        return 0
+    return (leaf + 1) / page_count
+
+
+def issues_after(queryset, issue, ordering):
+    '''
+    Filters queryset to the issues that come after issue when sorted by
+    the fields of ordering, by comparing each field in turn.
+    '''
+    values = []
+    for field in ordering:
+        value = issue
+        for attr in field.split('__'):
+            value = getattr(value, attr)
+        values.append(value)
+
+    after = Q()
+    for i, field in enumerate(ordering):
+        after |= Q(**dict(zip(ordering[:i], values[:i])),
+                   **{f'{field}__gt': values[i]})
+    return queryset.filter(after).exclude(id=issue.id).order_by(*ordering)
+
+
+def get_next_issues(issue):
+    '''
+    Returns the issues likely to be read after this one: the next issue in
+    its series and the next in each of its story arcs, in the order their
+    issue lists use.
+    '''
+    next_issues = []
+    series_next = issues_after(
+        Issue.objects.filter(series_id=issue.series_id), issue,
+        ('sort_number', 'number')).first()
+    if series_next is not None:
+        next_issues.append(series_next)
+
+    for arc in issue.arcs.all():
+        arc_next = issues_after(arc.issue_set.all(), issue,
+                                Arc.ISSUE_ORDERING).first()
+        if arc_next is not None and arc_next not in next_issues:
+            next_issues.append(arc_next)
+
+    return next_issues
+
+
+def warm_next_issues(issue, previous_leaf, previous_status):
+    '''
+    Warms up the next issues once a progress update takes the reader past
+    PAGE_WARMUP_THRESHOLD of the issue, or marks it read.
+    '''
+    threshold = settings.PAGE_WARMUP_THRESHOLD
+    was_near_end = (previous_status == 2 or
+                    reading_progress(previous_leaf, issue.page_count) >= threshold)
+    near_end = (issue.status == 2 or
+                reading_progress(issue.leaf, issue.page_count) >= threshold)
+    if was_near_end or not near_end:
+        return []
+
+    prefetcher = get_prefetcher()
+    return [prefetcher.prefetch_issue(next_issue)
+            for next_issue in get_next_issues(issue)]
@@ -1,14 +1,90 @@
-from django.http import Http404
-from rest_framework import mixins, viewsets, filters
+import os
+import uuid
+import zipfile
+
+from celery.result import AsyncResult
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework import mixins, renderers, viewsets, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from comics.models import (Arc, Issue, Publisher, Series)
+from comics.models import (Arc, ImportRun, Issue, Publisher)
 from comics.serializers import (ArcSerializer, ComicPageSerializer,
-                                IssueSerializer, PublisherSerializer,
-                                ReaderSerializer, SeriesSerializer)
+                                CoverOptionsSerializer,
+                                ImportRunSerializer, IssueSerializer,
+                                ManifestSerializer, PageOptionsSerializer,
+                                PublisherSerializer,
+                                ReaderSerializer, SeriesSerializer,
+                                TileOptionsSerializer)
 from comics.tasks import import_comic_files_task
 from comics.tasks import import_comic_files_novine_task
+from comics.utils import download
+from comics.utils.counters import update_issue_counters
+from comics.utils.hotcache import get_hot_cache
+from comics.utils.imageheader import get_image_type
+from comics.utils.pagecache import get_page_cache
+from comics.utils.prefetch import get_prefetcher
+from comics.utils.querysets import (arc_issues, issue_list, recent_issues,
+                                    series_issues, series_list)
+from comics.utils.reader import (ImageAPIHandler, get_page_formats,
+                                 negotiate_page_options)
+from comics.utils.sidecar import get_sidecar
+from comics.utils.sprite import get_cover_sprite, get_sprite_cache
+from comics.utils.tiles import get_dzi, get_tile
+from comics.utils.utils import negotiate_cover_format, select_cover_rendition
+from comics.utils.warmup import warm_next_issues
+
+
+class PassthroughRenderer(renderers.BaseRenderer):
+    """
+    Lets actions returning files or images be requested with any Accept
+    header. The actions build their own responses, so this only renders
+    errors.
+    """
+    media_type = '*/*'
+    format = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return renderers.JSONRenderer().render(data)
+
+
+BINARY_RENDERERS = api_settings.DEFAULT_RENDERER_CLASSES + [PassthroughRenderer]
+
+
+def cover_sprite_response(view, request, queryset, get_issue):
+    """
+    Returns the cover sprite map of a page of the queryset's results.
+    get_issue returns the issue whose cover stands for a result.
+    """
+    options = CoverOptionsSerializer(data=request.query_params)
+    options.is_valid(raise_exception=True)
+    page = view.paginate_queryset(queryset)
+    if page is None:
+        raise Http404()
+
+    try:
+        signature = str(queryset.query)
+    except EmptyResultSet:
+        signature = ''
+    key, sprite = get_cover_sprite(
+        [(obj.slug, get_issue(obj)) for obj in page], signature,
+        view.paginator.page.number, options.validated_data.get('width'),
+        options.validated_data.get('image_format', 'jpg'))
+    sprite['image'] = request.build_absolute_uri(
+        reverse('api:sprite-detail', kwargs={'pk': key}))
+    return Response(sprite)
+
 
 class ArcViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -18,10 +94,7 @@ class ArcViewSet(viewsets.ReadOnlyModelViewSet):
     retrieve:
     Returns the information of an individual story arc.
     """
-    queryset = (
-        Arc.objects
-        .prefetch_related('issue_set')
-    )
+    queryset = Arc.objects.all()
     serializer_class = ArcSerializer
     filter_backends = (filters.SearchFilter,)
     search_fields = ('name',)
@@ -32,15 +105,10 @@ class ArcViewSet(viewsets.ReadOnlyModelViewSet):
         """
         Returns a list of issues for a story arc.
         """
-        arc = self.get_object()
-        # Ordering the query set by date and then series name
-        # since the Comic Vine api doesn't appear to provide
-        # the story arc reading order.
         queryset = (
-            arc.issue_set
+            self.get_issue_queryset(self.get_object())
             .select_related('series')
             .prefetch_related('credits_set', 'credits_set__creator', 'credits_set__role', 'arcs')
-            .order_by('date', 'series', 'number')
         )
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -50,6 +118,20 @@ class ArcViewSet(viewsets.ReadOnlyModelViewSet):
         else:
             raise Http404()
 
+    @action(detail=True, url_path='issue_list/sprite')
+    def issue_sprite(self, request, slug=None):
+        """
+        Returns a map of the covers for a page of a story arc's issues,
+        in a single sprite image. Takes the same page parameter as
+        issue_list, and the width and image_format of the covers.
+        """
+        queryset = self.get_issue_queryset(self.get_object())
+        return cover_sprite_response(self, request, queryset,
+                                     lambda issue: issue)
+
+    def get_issue_queryset(self, arc):
+        return arc_issues(arc)
+
 
 class IssueViewSet(mixins.UpdateModelMixin,
                    mixins.ListModelMixin,
@@ -65,14 +147,26 @@ class IssueViewSet(mixins.UpdateModelMixin,
     update:
     Update the leaf and status for an issues.
     """
-    queryset = (
-        Issue.objects
-        .select_related('series')
-        .prefetch_related('credits_set', 'credits_set__creator', 'credits_set__role', 'arcs')
-    )
+    queryset = issue_list()
     serializer_class = IssueSerializer
     lookup_field = 'slug'
 
+    def perform_update(self, serializer):
+        previous_leaf = serializer.instance.leaf
+        previous_status = serializer.instance.status
+        issue = serializer.save()
+        if issue.status != previous_status:
+            update_issue_counters(Issue.objects.filter(id=issue.id))
+        # The reader is close to the end, so get the next issue ready.
+        warm_next_issues(issue, previous_leaf, previous_status)
+
+    def get_queryset(self):
+        # Page requests only need the archive path, so skip the prefetching.
+        if self.action in ('get_page', 'page', 'pages', 'page_dzi',
+                           'page_tile', 'manifest', 'cover', 'download'):
+            return Issue.objects.all()
+        return super().get_queryset()
+
     @action(detail=True, url_path='get-page/(?P<page>[0-9]+)')
     def get_page(self, request, slug=None, page=None):
         """
@@ -81,46 +175,275 @@ class IssueViewSet(mixins.UpdateModelMixin,
         issue = self.get_object()
         page_json = ComicPageSerializer(issue, many=False, context={
                                         'page_number': self.kwargs['page']})
+        if page_json.data['page'] is None:
+            raise Http404()
+        get_prefetcher().page_requested(issue, page)
         return Response(page_json.data)
 
+    @action(detail=True, url_path='page/(?P<page>[0-9]+)',
+            renderer_classes=BINARY_RENDERERS)
+    def page(self, request, slug=None, page=None):
+        """
+        Returns the image of a page from an issue. The width, quality and
+        image_format (jpeg, webp or avif) query parameters return a resized
+        or converted page. Without image_format, a resized or re-encoded
+        page is converted to WebP or AVIF if the Accept header asks for
+        them.
+        """
+        issue = self.get_object()
+        options = PageOptionsSerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+
+        page_options = negotiate_page_options(
+            options.validated_data, request.META.get('HTTP_ACCEPT'))
+        hot_cache = get_hot_cache()
+        hot_cache.open_issue(issue)
+        # Warm the next pages with the same options the reader is using.
+        get_prefetcher().page_requested(issue, page, **page_options)
+
+        # Original pages already extracted, and pages already converted by
+        # convertpages, can be sent straight from disk, which lets the
+        # server use sendfile.
+        content_type = None
+        if not any(page_options.values()):
+            path = hot_cache.get_page_path(issue, page)
+        else:
+            path = get_sidecar().get_page_path(issue, page, **page_options)
+            content_type = f'image/{page_options["image_format"]}'
+        if path is not None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        else:
+            image_data, content_type = ImageAPIHandler().getPage(
+                issue, page, **page_options)
+            if image_data is None:
+                raise Http404()
+            response = HttpResponse(image_data, content_type=content_type)
+
+        response['Cache-Control'] = 'private, max-age=86400'
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    @action(detail=True, url_path='page/(?P<page>[0-9]+)/dzi')
+    def page_dzi(self, request, slug=None, page=None):
+        """
+        Returns the Deep Zoom descriptor of a page, in the JSON form of
+        DZI, so viewers can zoom into large pages a tile at a time. The
+        image_format query parameter picks the tiles' format.
+        """
+        issue = self.get_object()
+        options = TileOptionsSerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+
+        dzi = get_dzi(issue, int(page),
+                      options.validated_data.get('image_format', 'jpeg'))
+        if dzi is None:
+            raise Http404()
+        # Tiles are at {Url}{level}/{column}_{row}.{Format}
+        dzi['Image']['Url'] = request.build_absolute_uri(
+            reverse('api:issue-page', kwargs={'slug': slug, 'page': page})
+            + 'tiles/')
+        return Response(dzi)
+
+    def page_tile(self, request, slug=None, page=None, level=None,
+                  column=None, row=None, image_format=None):
+        """
+        Returns a Deep Zoom tile of a page. Tiles are made a level at a
+        time, the first time one of them is asked for.
+        """
+        issue = self.get_object()
+        if image_format not in get_page_formats():
+            raise Http404()
+        tile = get_tile(issue, int(page), int(level), int(column), int(row),
+                        image_format)
+        if tile is None:
+            raise Http404()
+
+        response = HttpResponse(tile, content_type=f'image/{image_format}')
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+
+    @action(detail=True, url_path='pages/(?P<start>[0-9]+)-(?P<end>[0-9]+)',
+            renderer_classes=BINARY_RENDERERS)
+    def pages(self, request, slug=None, start=None, end=None):
+        """
+        Returns a range of pages from an issue, like pages/0-9, as one
+        streamed multipart/mixed response. Takes the same query parameters
+        as the page endpoint.
+        """
+        issue = self.get_object()
+        options = PageOptionsSerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+
+        start, end = int(start), int(end)
+        if start > end:
+            raise ValidationError('The start page must come before the end page.')
+        if end - start >= settings.PAGE_BATCH_MAX_PAGES:
+            raise ValidationError(
+                f'At most {settings.PAGE_BATCH_MAX_PAGES} pages can be requested.')
+        if start >= issue.page_count:
+            raise Http404()
+
+        boundary = uuid.uuid4().hex
+        page_options = negotiate_page_options(
+            options.validated_data, request.META.get('HTTP_ACCEPT'))
+        # Open the archive before the response starts, so a missing one is
+        # still a 404.
+        try:
+            parts = ImageAPIHandler().streamPages(issue, start, end, boundary,
+                                                  **page_options)
+        except (OSError, zipfile.BadZipFile):
+            raise Http404()
+        response = StreamingHttpResponse(
+            parts, content_type=f'multipart/mixed; boundary={boundary}')
+        response['Cache-Control'] = 'private, max-age=86400'
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    @action(detail=True, renderer_classes=BINARY_RENDERERS)
+    def cover(self, request, slug=None):
+        """
+        Returns the issue's cover. The width and image_format (jpg, webp or
+        avif) query parameters pick the closest cover rendition. Without
+        image_format, the format comes from the Accept header.
+        """
+        issue = self.get_object()
+        options = CoverOptionsSerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+
+        image_format = negotiate_cover_format(
+            options.validated_data.get('image_format'),
+            request.META.get('HTTP_ACCEPT'))
+        path = select_cover_rendition(
+            issue, options.validated_data.get('width'), image_format)
+        try:
+            f = open(os.path.join(settings.MEDIA_ROOT, path), 'rb')
+        except (OSError, TypeError):
+            raise Http404()
+
+        response = FileResponse(f)
+        response['Cache-Control'] = 'private, max-age=86400'
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    @action(detail=True, renderer_classes=BINARY_RENDERERS)
+    def download(self, request, slug=None):
+        """
+        Returns the issue's archive for offline reading. Supports Range
+        requests, so interrupted downloads can be resumed.
+        """
+        issue = self.get_object()
+        try:
+            st = os.stat(issue.file)
+        except OSError:
+            raise Http404()
+
+        etag = download.file_etag(st)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(st.st_mtime))
+        if response is not None:
+            return response
+
+        content_type = download.archive_content_type(issue.file)
+        byte_range = None
+        if download.if_range_matches(request.META.get('HTTP_IF_RANGE'),
+                                     etag, st):
+            try:
+                byte_range = download.parse_range(
+                    request.META.get('HTTP_RANGE'), st.st_size)
+            except download.RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{st.st_size}'
+                return response
+
+        if byte_range is None:
+            response = FileResponse(open(issue.file, 'rb'),
+                                    content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                download.read_file_range(issue.file, start, end - start + 1),
+                status=206, content_type=content_type)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(st.st_mtime)
+        response['Content-Disposition'] = download.content_disposition(issue.file)
+        return response
+
     @action(detail=True)
     def reader(self, request, slug=None):
         """
         Returns information from the issue needed for the Thwip reader.
         """
         issue = self.get_object()
+        get_hot_cache().open_issue(issue)
         page_json = ReaderSerializer(
             issue, many=False, context={"request": request})
         return Response(page_json.data)
 
+    @action(detail=True)
+    def manifest(self, request, slug=None):
+        """
+        Returns the URL, size, dimensions, spread flag and page type of
+        every page in an issue, along with the reader information.
+        """
+        issue = self.get_object()
+        get_hot_cache().open_issue(issue)
+        try:
+            manifest = ManifestSerializer(
+                issue, many=False, context={"request": request})
+            data = manifest.data
+        except (OSError, zipfile.BadZipFile):
+            raise Http404()
+        return Response(data)
+
     @action(detail=False, url_path='import-comics')
     def import_comics(self, request):
         """
         Updated the user's comic archive collection.
         """
-        import_comic_files_task.apply_async()
-        return Response(data={"import_comics": "Started imports."})
+        result = import_comic_files_task.apply_async()
+        return Response(data={"import_comics": "Started imports.",
+                              "task_id": result.id})
 
     @action(detail=False, url_path='import-comics-no-vine')
     def import_comics_no_vine(self, request):
         """
         Updated the user's comic archive collection.
         """
-        import_comic_files_novine_task.apply_async()
-        return Response(data={"import_comics_novine": "Started imports."})
+        result = import_comic_files_novine_task.apply_async()
+        return Response(data={"import_comics_novine": "Started imports.",
+                              "task_id": result.id})
+
+    @action(detail=False, url_path=r'import-progress/(?P<task_id>[-\w]+)')
+    def import_progress(self, request, task_id=None):
+        """
+        Returns the progress, timings and throughput of an import.
+        """
+        data = {'task_id': task_id, 'state': AsyncResult(task_id).state}
+        run = ImportRun.objects.filter(task_id=task_id).first()
+        if run is not None:
+            data['run'] = ImportRunSerializer(run).data
+        return Response(data)
 
+    @action(detail=False, url_path='page-cache-stats')
+    def page_cache_stats(self, request):
+        """
+        Returns the hits, misses and evictions of each tier of the page
+        cache, counted by the process serving the request since it started.
+        With the Redis backend, the shared tier's evictions are the Redis
+        server's own count.
+        """
+        return Response(get_page_cache().stats())
 
     @action(detail=False)
     def recent(self, request):
         """
         Returns the last 90 comic archives imported.
         """
-        queryset = (
-            Issue.objects
-            .select_related('series')
-            .prefetch_related('credits_set', 'credits_set__creator', 'credits_set__role')
-            .order_by('-import_date')[:90]
-        )
+        queryset = recent_issues()
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = IssueSerializer(
@@ -138,10 +461,7 @@ class PublisherViewSet(viewsets.ReadOnlyModelViewSet):
     retrieve:
     Returns the information of an individual publisher.
     """
-    queryset = (
-        Publisher.objects
-        .prefetch_related('series_set')
-    )
+    queryset = Publisher.objects.all()
     serializer_class = PublisherSerializer
     lookup_field = 'slug'
 
@@ -151,10 +471,7 @@ class PublisherViewSet(viewsets.ReadOnlyModelViewSet):
         Returns a list of series for a publisher.
         """
         publisher = self.get_object()
-        queryset = (
-            publisher.series_set
-            .prefetch_related('issue_set')
-        )
+        queryset = publisher.series_set.select_related('cover')
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = SeriesSerializer(
@@ -172,10 +489,7 @@ class SeriesViewSet(viewsets.ReadOnlyModelViewSet):
     retrieve:
     Returns the information of an individual comic series.
     """
-    queryset = (
-        Series.objects
-        .prefetch_related('issue_set')
-    )
+    queryset = series_list()
     serializer_class = SeriesSerializer
     filter_backends = (filters.SearchFilter,)
     search_fields = ('name',)
@@ -188,7 +502,7 @@ class SeriesViewSet(viewsets.ReadOnlyModelViewSet):
         """
         series = self.get_object()
         queryset = (
-            series.issue_set
+            self.get_issue_queryset(series)
             .prefetch_related('credits_set', 'credits_set__creator', 'credits_set__role', 'arcs')
         )
         page = self.paginate_queryset(queryset)
@@ -198,3 +512,53 @@ class SeriesViewSet(viewsets.ReadOnlyModelViewSet):
             return self.get_paginated_response(serializer.data)
         else:
             raise Http404()
+
+    @action(detail=False)
+    def sprite(self, request):
+        """
+        Returns a map of the covers for a page of the series list, in a
+        single sprite image. Takes the same page and search parameters as
+        the list, and the width and image_format of the covers.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        return cover_sprite_response(self, request, queryset,
+                                     lambda series: series.cover)
+
+    @action(detail=True, url_path='issue_list/sprite')
+    def issue_sprite(self, request, slug=None):
+        """
+        Returns a map of the covers for a page of a series' issues, in a
+        single sprite image. Takes the same page parameter as issue_list,
+        and the width and image_format of the covers.
+        """
+        queryset = self.get_issue_queryset(self.get_object())
+        return cover_sprite_response(self, request, queryset,
+                                     lambda issue: issue)
+
+    def get_issue_queryset(self, series):
+        return series_issues(series)
+
+
+class SpriteViewSet(viewsets.ViewSet):
+    """
+    retrieve:
+    Returns a cover sprite image, as linked from a sprite map. Sprites
+    never change, since their key covers their content.
+    """
+    lookup_value_regex = '[0-9a-f]{40}'
+    renderer_classes = BINARY_RENDERERS
+
+    def retrieve(self, request, pk=None):
+        path = get_sprite_cache().path(pk)
+        try:
+            f = open(path, 'rb')
+            # Reading a sprite counts as a use, for eviction.
+            os.utime(path)
+        except OSError:
+            raise Http404()
+
+        image_type = get_image_type(f.read(16)) or 'jpeg'
+        f.seek(0)
+        response = FileResponse(f, content_type=f'image/{image_type}')
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
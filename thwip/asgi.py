@@ -0,0 +1,23 @@
+"""
+ASGI config for thwip project.
+
+Pages and covers are served asynchronously by comics.asgi, and every
+other request is handed to the WSGI application. Run it with any ASGI
+server, for example:
+
+    uvicorn thwip.asgi:application
+"""
+
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "thwip.settings")
+
+# Sets up Django, so it has to come before importing the comics app.
+django_application = get_wsgi_application()
+
+from comics.asgi import PageServingApplication  # noqa: E402
+
+application = PageServingApplication(WsgiToAsgi(django_application))
@@ -154,6 +154,14 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Needed for the import chord to collect the batch results.
+CELERY_RESULT_BACKEND = 'redis://localhost'
+
+# Number of comic archives handled by each import batch task.
+IMPORT_BATCH_SIZE = 100
+# Seconds without progress before a running import is treated as
+# interrupted and can be resumed by the next import.
+IMPORT_LOCK_TIMEOUT = 15 * 60
 
 
 # Static files (CSS, JavaScript, Images)
@@ -164,6 +172,57 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Widths and formats of the cover renditions made at import time.
+COVER_RENDITION_WIDTHS = (160, 320, 640)
+COVER_RENDITION_FORMATS = ('jpg', 'webp')
+
+# Pages are cached in each process, up to PAGE_CACHE_MEMORY_BYTES, and in
+# a tier shared by every worker. The shared tier is either 'disk', kept in
+# PAGE_CACHE_DIR up to PAGE_CACHE_MAX_BYTES, or 'redis', where entries
+# expire after PAGE_CACHE_TIMEOUT seconds.
+PAGE_CACHE_BACKEND = 'disk'
+PAGE_CACHE_MEMORY_BYTES = 64 * 1024 ** 2
+PAGE_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'pages')
+PAGE_CACHE_MAX_BYTES = 2 * 1024 ** 3
+PAGE_CACHE_REDIS_URL = 'redis://localhost:6379/1'
+PAGE_CACHE_TIMEOUT = 24 * 60 * 60
+# Pages warmed into the cache ahead of the reader on each page request,
+# and the threads each process uses to warm them.
+PAGE_PREFETCH_COUNT = 3
+PAGE_PREFETCH_WORKERS = 2
+# Once a reader is this far through an issue, the next issue in its series
+# and story arcs is warmed up too.
+PAGE_WARMUP_THRESHOLD = 0.8
+# Pages of recently opened issues are extracted here, on local disk, up to
+# the size limit. A limit of 0 turns the extraction off.
+HOT_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'issues')
+HOT_CACHE_MAX_BYTES = 10 * 1024 ** 3
+# Most pages returned by a single page range request.
+PAGE_BATCH_MAX_PAGES = 20
+# Threads each ASGI process uses for archive reads and database access
+# when serving pages and covers.
+ASGI_PAGE_WORKERS = 16
+# Cover sprites for pages of series and issue lists are kept here, up to
+# the size limit.
+SPRITE_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'sprites')
+SPRITE_CACHE_MAX_BYTES = 512 * 1024 ** 2
+# Deep zoom tiles of pages are kept here, up to the size limit.
+TILE_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'tiles')
+TILE_CACHE_MAX_BYTES = 2 * 1024 ** 3
+# Web optimized copies of every page, made by the convertpages command, are
+# kept here at each width and format. Page requests for one of them are
+# served straight from disk. The conversion runs SIDECAR_WORKERS processes
+# at a lower priority, pausing SIDECAR_PAGE_DELAY seconds after each page,
+# and the Celery task converts at most SIDECAR_TASK_RATE_LIMIT issues per
+# worker.
+SIDECAR_DIR = os.path.join(BASE_DIR, 'cache', 'sidecar')
+SIDECAR_PAGE_WIDTHS = (800, 1600)
+SIDECAR_PAGE_FORMATS = ('webp', 'jpeg')
+SIDECAR_WORKERS = 2
+SIDECAR_NICE = 10
+SIDECAR_PAGE_DELAY = 0
+SIDECAR_TASK_RATE_LIMIT = '30/m'
+
 if DEBUG:
     INTERNAL_IPS = ('127.0.0.1', 'localhost',)
     MIDDLEWARE += (